@@ -0,0 +1,62 @@
+import sys
+import timeit
+
+from curvify.backends import available_backends
+
+from .common import SIZES, TRUE_PARAMS, make_data, make_solver
+
+# Evaluation of the models by each backend of backends.py. Besides the time,
+# the effective memory bandwidth: x read and y written once, 16 bytes per
+# point (the temporaries of numpy are not counted).
+# Speedup table: python -m benchmarks.bench_backends [n_points]
+
+MODELS = ["Exponential", "Damped Sine", "Gaussian", "Fourier Series (n=2)"]
+BYTES_PER_POINT = 16
+
+
+class EvaluateBackend:
+    params = [available_backends(), MODELS, SIZES]
+    param_names = ["backend", "model", "n_points"]
+    timeout = 300
+
+    def setup(self, backend, model, n_points):
+        self.solver = make_solver(model)
+        self.solver.set_backend(backend)
+        self.x, _ = make_data(model, n_points)
+        self.params = TRUE_PARAMS[model]
+
+    def time_evaluate(self, backend, model, n_points):
+        self.solver.evaluate(self.x, self.params)
+
+    def track_bandwidth(self, backend, model, n_points):
+        duration = min(timeit.repeat(
+            lambda: self.solver.evaluate(self.x, self.params), number=1, repeat=5))
+        return BYTES_PER_POINT * n_points / duration / 1e9
+
+    track_bandwidth.unit = "GB/s"
+
+
+def main(n_points: int):
+    backends = available_backends()
+    print(f"{n_points} points, times in ms (speedup vs numpy), effective bandwidth in GB/s")
+    print(f"{'Model':<22}" + "".join(f"{backend:>26}" for backend in backends))
+    for model in MODELS:
+        x, _ = make_data(model, n_points)
+        params = TRUE_PARAMS[model]
+        times = {}
+        for backend in backends:
+            solver = make_solver(model)
+            solver.set_backend(backend)
+            solver.evaluate(x, params)  # Warm up (thread pool, numexpr cache)
+            times[backend] = min(timeit.repeat(
+                lambda: solver.evaluate(x, params), number=1, repeat=7))
+        cells = []
+        for backend in backends:
+            speedup = times["numpy"] / times[backend]
+            bandwidth = BYTES_PER_POINT * n_points / times[backend] / 1e9
+            cells.append(f"{1e3 * times[backend]:.1f} (x{speedup:.2f}) {bandwidth:.2f}")
+        print(f"{model:<22}" + "".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7)
@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+import numpy as np
+
+from curvify.csv_reader import read_columns, sniff_format
+
+from .common import CSV_SIZES, make_data
+
+
+class CsvLoading:
+    # Same steps as CSVDialog: sniffing the format from a preview, then
+    # parsing the selected columns (without the cache of the dialog)
+    params = [CSV_SIZES]
+    param_names = ["n_points"]
+    timeout = 300
+
+    def setup_cache(self):
+        directory = tempfile.mkdtemp(prefix="curvify_bench_")
+        for n_points in CSV_SIZES:
+            x, y = make_data("Damped Sine", n_points)
+            noise = np.random.default_rng(1).normal(size=n_points)
+            np.savetxt(os.path.join(directory, f"{n_points}.csv"),
+                       np.column_stack((x, y, noise)), delimiter=",",
+                       header="x,y,noise", comments="", fmt="%.9g")
+        return directory
+
+    def setup(self, directory, n_points):
+        self.path = os.path.join(directory, f"{n_points}.csv")
+        self.csv_format = sniff_format(self.path)
+
+    def time_sniff_format(self, directory, n_points):
+        sniff_format(self.path)
+
+    def time_read_columns(self, directory, n_points):
+        read_columns(self.path, self.csv_format, [0, 1])
+
+    def peakmem_read_columns(self, directory, n_points):
+        read_columns(self.path, self.csv_format, [0, 1])
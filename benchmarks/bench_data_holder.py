@@ -0,0 +1,62 @@
+from curvify.data_holder import DataHolder
+
+from .common import SIZES, make_data, make_solver
+
+
+class DataHolderSuite:
+    params = [SIZES]
+    param_names = ["n_points"]
+    timeout = 300
+
+    def setup(self, n_points):
+        self.x, self.y = make_data("Damped Sine", n_points)
+        self.x_shuffled, self.y_shuffled = make_data("Damped Sine", n_points, shuffled=True)
+        self.data_holder = DataHolder(make_solver("Damped Sine"))
+        self.data_holder.set_data(self.x, self.y)
+        self.data_holder.set_selected_range((10, 90))
+
+    def time_set_data_sorted(self, n_points):
+        self.data_holder.set_data(self.x, self.y)
+
+    def time_set_data_unsorted(self, n_points):
+        self.data_holder.set_data(self.x_shuffled, self.y_shuffled)
+
+    def time_set_selected_range(self, n_points):
+        self.data_holder.set_selected_range((20, 80))
+
+    def time_update_curve(self, n_points):
+        self.data_holder.update_curve()
+
+    def time_get_residuals(self, n_points):
+        self.data_holder.get_residuals()
+
+    def peakmem_set_data_unsorted(self, n_points):
+        self.data_holder.set_data(self.x_shuffled, self.y_shuffled)
+
+
+class CompactStorage:
+    # Storage of the data in float64 or float32, the memory held by the
+    # DataHolder and the fit of the selected data
+    params = [["float64", "float32"], SIZES]
+    param_names = ["dtype", "n_points"]
+    timeout = 300
+
+    def setup(self, dtype, n_points):
+        self.x, self.y = make_data("Damped Sine", n_points, shuffled=True)
+        self.data_holder = DataHolder(make_solver("Damped Sine"), dtype)
+        self.data_holder.set_data(self.x, self.y)
+        self.data_holder.solver.use_fit_cache = False  # Repeats would time cache hits
+
+    def time_set_data(self, dtype, n_points):
+        self.data_holder.set_data(self.x, self.y)
+
+    def peakmem_set_data(self, dtype, n_points):
+        self.data_holder.set_data(self.x, self.y)
+
+    def track_nbytes(self, dtype, n_points):
+        return self.data_holder.nbytes()
+
+    track_nbytes.unit = "bytes"
+
+    def time_fit(self, dtype, n_points):
+        self.data_holder.solver.fit(*self.data_holder.get_selected_data(), update_params=False)
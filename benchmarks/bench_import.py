@@ -0,0 +1,25 @@
+# Import times, each measured in a new interpreter
+
+
+def timeraw_import_curvify():
+    return "import curvify"
+
+
+def timeraw_import_core():
+    return "import curvify.core"
+
+
+def timeraw_import_gui():
+    return "import curvify.gui"
+
+
+def timeraw_first_fit():
+    # Import of the core and first fit, which loads scipy
+    return """
+import numpy as np
+from curvify.core import Solver
+solver = Solver()
+solver.update_model("a * np.exp(-b * x) + c")
+x = np.linspace(0, 5, 1000)
+solver.fit(x, 2 * np.exp(-0.5 * x) + 1)
+"""
@@ -0,0 +1,45 @@
+from .common import SIZES, make_data, make_solver
+
+
+class PlotRendering:
+    # Offscreen rendering of PlotWidget (QT_QPA_PLATFORM=offscreen, see
+    # common.py). The redraw is normally deferred by a timer, it is run
+    # directly here.
+    params = [SIZES]
+    param_names = ["n_points"]
+    timeout = 300
+
+    def setup(self, n_points):
+        from PySide6.QtWidgets import QApplication
+        from curvify.data_holder import DataHolder
+        from curvify.plot_widget import PlotWidget
+        self.app = QApplication.instance() or QApplication([])
+        solver = make_solver("Damped Sine")
+        self.data_holder = DataHolder(solver)
+        self.data_holder.set_data(*make_data("Damped Sine", n_points))
+        self.data_holder.set_selected_range((10, 90))
+        self.data_holder.update_curve()
+        self.plot_widget = PlotWidget(None, self.data_holder)
+        self.plot_widget.resize(800, 600)
+        self.plot_widget.show()
+        self.redraw_now()
+
+    def teardown(self, n_points):
+        self.plot_widget.close()
+        self.plot_widget.deleteLater()
+
+    def redraw_now(self):
+        self.plot_widget.redraw_timer.stop()
+        self.plot_widget.redraw_()
+
+    def time_update_plot(self, n_points):
+        # Data, selection and model changed: full redraw
+        self.plot_widget.update_plot()
+        self.redraw_now()
+
+    def time_update_model_plot(self, n_points):
+        # Only the parameters changed: curve and residuals blitted
+        self.data_holder.solver.params[0].value *= 1.0001
+        self.data_holder.update_curve()
+        self.plot_widget.update_model_plot()
+        self.redraw_now()
@@ -0,0 +1,109 @@
+import numpy as np
+
+from curvify.fit_cache import fit_cache
+from curvify.model_families import model_families
+from curvify.model_selection import compare_models
+from curvify.models_library import models_library
+from curvify.solver import Solver
+
+from .common import FIT_SIZES, SIZES, TRUE_PARAMS, make_data, make_solver
+
+MODELS = list(models_library)
+
+
+class UpdateModel:
+    params = [MODELS]
+    param_names = ["model"]
+
+    def time_update_model(self, model):
+        # Compiles the model (parsing, derivatives, checks)
+        from curvify.compiled_model import model_cache
+        model_cache.clear()
+        make_solver(model)
+
+    def time_update_model_cached(self, model):
+        # Model already compiled, e.g. switching back to a previous model
+        make_solver(model)
+
+
+class Evaluate:
+    params = [MODELS, SIZES]
+    param_names = ["model", "n_points"]
+    timeout = 300
+
+    def setup(self, model, n_points):
+        self.solver = make_solver(model)
+        self.x, _ = make_data(model, n_points)
+        self.params = TRUE_PARAMS[model]
+
+    def time_evaluate(self, model, n_points):
+        self.solver.evaluate(self.x, self.params)
+
+
+class Fit:
+    # Fits from the default starting point (initial guess of the model)
+    params = [MODELS, FIT_SIZES]
+    param_names = ["model", "n_points"]
+    timeout = 600
+
+    def setup(self, model, n_points):
+        self.x, self.y = make_data(model, n_points)
+        self.solver = make_solver(model)
+        self.solver.use_fit_cache = False  # Repeats would time cache hits
+
+    def time_fit(self, model, n_points):
+        self.solver.fit(self.x, self.y, update_params=False)
+
+    def track_r_squared(self, model, n_points):
+        ok, results = self.solver.fit(self.x, self.y, update_params=False)
+        return results["R2"] if ok else float("nan")
+
+
+class CoarseToFine:
+    # Fits of subsamples then Gauss-Newton steps on the full data, against
+    # the direct fit (Solver.coarse_to_fine)
+    params = [["Exponential", "Damped Sine", "Gaussian"], [10**6, 10**7], [False, True]]
+    param_names = ["model", "n_points", "coarse_to_fine"]
+    timeout = 600
+
+    def setup(self, model, n_points, coarse_to_fine):
+        self.x, self.y = make_data(model, n_points)
+
+    def time_fit(self, model, n_points, coarse_to_fine):
+        solver = make_solver(model)
+        solver.use_fit_cache = False
+        solver.coarse_to_fine = coarse_to_fine
+        solver.fit(self.x, self.y, update_params=False)
+
+
+class FourierOrder:
+    # Fourier series kernel (harmonic recurrence) and its jacobian
+    params = [[1, 5, 10, 30]]
+    param_names = ["order"]
+
+    def setup(self, order):
+        self.solver = Solver()
+        self.solver.update_model(model_families["Fourier (order n)"].expression(order))
+        self.x = np.linspace(0, 10, 10**6)
+        self.params = np.random.default_rng(0).normal(size=len(self.solver.get_params()))
+        self.jacobian = self.solver.compiled_model_.get_jacobian()
+
+    def time_evaluate(self, order):
+        self.solver.model(self.x, *self.params)
+
+    def time_jacobian(self, order):
+        self.jacobian(self.x, *self.params)
+
+
+class CompareModels:
+    # Fits every model of the library to the same data (Auto-select model)
+    params = [[10**3, 10**4, 10**5]]
+    param_names = ["n_points"]
+    timeout = 600
+
+    def setup(self, n_points):
+        self.x, self.y = make_data("Damped Sine", n_points)
+
+    def time_compare_models(self, n_points):
+        fit_cache.clear()
+        compare_models(self.x, self.y)
@@ -0,0 +1,58 @@
+import argparse
+import subprocess
+import sys
+
+# Startup time regression check, based on python -X importtime:
+#   python benchmarks/check_import_time.py [--budget-ms 300]
+# Fails if a heavy dependency is imported by a module that should not need
+# it, or if importing the module takes longer than its budget.
+
+# Module imported, dependencies it must not load, budget (milliseconds)
+CHECKS = [
+    ("curvify", ["numpy", "scipy", "pandas", "matplotlib", "PySide6"], 50),
+    ("curvify.core", ["scipy", "pandas", "matplotlib", "PySide6"], 400),
+    ("curvify.gui", ["scipy", "pandas", "matplotlib"], 1500),
+]
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    # Self and cumulative import time of each module, in microseconds
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        if not self_time.strip().isdigit():
+            continue  # Header
+        times[name.strip()] = (int(self_time), int(cumulative))
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Checks the import time of curvify")
+    parser.add_argument(
+        "--scale", type=float, default=1.0,
+        help="Multiplies the budgets, e.g. for slow machines")
+    args = parser.parse_args()
+    failed = False
+    for module, forbidden, budget_ms in CHECKS:
+        times = import_times(module)
+        total_ms = times[module][1] / 1e3
+        loaded = sorted(name for name in forbidden if name in times)
+        slowest = sorted(times.items(), key=lambda item: -item[1][0])[:5]
+        status = "ok"
+        if loaded or total_ms > budget_ms * args.scale:
+            status = "FAILED"
+            failed = True
+        print(f"{module}: {total_ms:.0f} ms (budget {budget_ms * args.scale:.0f} ms) {status}")
+        if loaded:
+            print(f"  imports {', '.join(loaded)}")
+        print("  slowest: " + ", ".join(f"{name} {t[0] / 1e3:.0f} ms" for name, t in slowest))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+# Rendering benchmarks run without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Number of points of the synthetic datasets
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+# Fits and CSV parsing of 1e7 points take minutes per benchmark
+FIT_SIZES = [10**3, 10**4, 10**5, 10**6]
+CSV_SIZES = [10**3, 10**4, 10**5, 10**6]
+
+X_RANGE = (0.1, 10.0)
+NOISE = 0.05
+
+# Parameters used to generate the data of each models library entry
+TRUE_PARAMS: dict[str, dict[str, float]] = {
+    "Linear": {"a": 2.0, "b": 1.0},
+    "Quadratic": {"a": 0.5, "b": -2.0, "c": 1.0},
+    "Cubic": {"a": 0.1, "b": -0.5, "c": 1.0, "d": 2.0},
+    "Polynomial": {"a": 0.01, "b": -0.1, "c": 0.5, "d": 1.0, "e": 2.0},
+    "Exponential": {"a": 2.0, "b": -0.3, "c": 1.0},
+    "Exponential with offset": {"a": 2.0, "b": -0.3, "c": 1.0, "d": 0.5},
+    "Logarithmic": {"a": 2.0, "b": 1.5, "c": 1.0, "d": 0.5},
+    "Power Law": {"a": 2.0, "b": 0.7, "c": 1.0},
+    "Sine": {"a": 2.0, "b": 1.5, "c": 0.3, "d": 1.0},
+    "Damped Sine": {"a": 3.0, "b": 2.0, "c": 0.2, "d": 0.5, "e": 1.0},
+    "Hyperbola": {"a": 5.0, "b": 1.0, "c": 0.5},
+    "Rational": {"a": 2.0, "b": 1.0, "c": 0.5, "d": 3.0},
+    "Logistic": {"a": 4.0, "b": 1.5, "c": 5.0, "d": 1.0},
+    "Gompertz": {"a": 4.0, "b": 5.0, "c": 0.8, "d": 0.5},
+    "Gaussian": {"a": 3.0, "b": 5.0, "c": 1.5, "d": 0.5},
+    "Lorentzian": {"a": 3.0, "b": 5.0, "c": 1.0, "d": 0.5},
+    "Weibull": {"a": 3.0, "b": -1.0, "c": 4.0, "d": 1.5},
+    "Fourier Series (n=2)": {
+        "a0": 1.0, "a1": 2.0, "b1": -1.0, "a2": 0.5, "b2": 0.3, "f0": 1.3},
+    "Fourier (general)": {
+        "f0": 0.2, "a0": 1.0, "a1": 2.0, "b1": -1.0, "a2": 0.5, "b2": 0.3,
+        "a3": 0.2, "b3": -0.2, "a4": 0.1, "b4": 0.1, "a5": 0.05, "b5": -0.05},
+}
+
+
+def make_solver(model_name: str = "Damped Sine"):
+    from curvify.models_library import models_library
+    from curvify.solver import Solver
+    solver = Solver()
+    solver.update_model(models_library[model_name])
+    return solver
+
+
+def make_data(model_name: str, n_points: int, shuffled: bool = False,
+              seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    # Noisy samples of a models library entry
+    rng = np.random.default_rng(seed)
+    x = np.linspace(*X_RANGE, n_points)
+    if shuffled:
+        rng.shuffle(x)
+    y = make_solver(model_name).evaluate(x, TRUE_PARAMS[model_name])
+    return x, y + rng.normal(0.0, NOISE, n_points)
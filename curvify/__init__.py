@@ -1,4 +1,26 @@
-from .gui import curvify
 __all__ = [
-    "curvify"
-]
\ No newline at end of file
+    "curvify",
+    "DataHolder",
+    "Param",
+    "Solver",
+    "StreamingDataHolder",
+    "batch_fit",
+    "compile_model",
+    "find_model",
+    "compare_models",
+    "load_data",
+    "models_library",
+]
+
+
+def __getattr__(name):
+    # The GUI (and Qt) is only imported when it is actually used, so that
+    # headless code (curvify.solver, curvify.batch...) stays lightweight.
+    # The other names come from curvify.core, also imported on first use.
+    if name == "curvify":
+        from .gui import curvify
+        return curvify
+    if name in __all__:
+        from . import core
+        return getattr(core, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
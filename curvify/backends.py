@@ -0,0 +1,164 @@
+import ast
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
+
+import numpy as np
+
+from .parallel import default_workers
+
+if TYPE_CHECKING:
+    from .compiled_model import CompiledModel
+
+# Evaluation backends of the compiled models, for large arrays. numpy
+# computes an expression as a chain of full size temporary arrays on one
+# core, the other backends work on cache sized blocks:
+# - "numexpr": the expression is translated for numexpr (optional
+#   dependency, multi-threaded virtual machine)
+# - "threads": numpy on blocks of CHUNK_SIZE points, in a thread pool (numpy
+#   releases the GIL)
+# Both fall back to numpy for small arrays, array parameters (multi_series)
+# and expressions they can't evaluate. See benchmarks/bench_backends.py.
+BACKENDS = ("numpy", "numexpr", "threads")
+
+# Below this number of points the model is evaluated by numpy
+MIN_BACKEND_SIZE = 100_000
+
+# Points per block of the threads backend (512 kB of float64, L2 sized)
+CHUNK_SIZE = 2**16
+
+# numpy functions and their numexpr name
+NUMEXPR_FUNCTIONS = {
+    "exp": "exp", "expm1": "expm1", "log": "log", "log10": "log10", "log1p": "log1p",
+    "sqrt": "sqrt", "abs": "abs", "absolute": "abs",
+    "sin": "sin", "cos": "cos", "tan": "tan",
+    "arcsin": "arcsin", "arccos": "arccos", "arctan": "arctan", "arctan2": "arctan2",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "arcsinh": "arcsinh", "arccosh": "arccosh", "arctanh": "arctanh",
+}
+
+NUMEXPR_OPERATORS = {
+    ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**", ast.Mod: "%",
+}
+
+NUMEXPR_CONSTANTS = {"pi": np.pi, "e": np.e}
+
+
+class NotTranslatable(Exception):
+    pass
+
+
+def available_backends() -> list[str]:
+    return [backend for backend in BACKENDS
+            if backend != "numexpr" or importlib.util.find_spec("numexpr") is not None]
+
+
+def to_numexpr(node: ast.expr) -> str:
+    # numexpr source of an expression of the models (np.exp(-c * x)...)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return repr(float(node.value))
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) \
+            and node.value.id == "np" and node.attr in NUMEXPR_CONSTANTS:
+        return repr(NUMEXPR_CONSTANTS[node.attr])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        sign = "-" if isinstance(node.op, ast.USub) else "+"
+        return f"({sign}{to_numexpr(node.operand)})"
+    if isinstance(node, ast.BinOp) and type(node.op) in NUMEXPR_OPERATORS:
+        operator = NUMEXPR_OPERATORS[type(node.op)]
+        return f"({to_numexpr(node.left)} {operator} {to_numexpr(node.right)})"
+    if isinstance(node, ast.Call) and not node.keywords:
+        args = node.args
+        if isinstance(node.func, ast.Name) and node.func.id == "abs" and len(args) == 1:
+            return f"abs({to_numexpr(args[0])})"
+        if isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) \
+                and node.func.value.id == "np":
+            name = node.func.attr
+            if name in NUMEXPR_FUNCTIONS:
+                return f"{NUMEXPR_FUNCTIONS[name]}({', '.join(to_numexpr(arg) for arg in args)})"
+            if name == "power" and len(args) == 2:
+                return f"({to_numexpr(args[0])} ** {to_numexpr(args[1])})"
+            if name == "polyval" and len(args) == 2 and isinstance(args[0], (ast.List, ast.Tuple)):
+                # Horner scheme
+                variable = to_numexpr(args[1])
+                result = to_numexpr(args[0].elts[0])
+                for coefficient in args[0].elts[1:]:
+                    result = f"({result} * {variable} + {to_numexpr(coefficient)})"
+                return result
+    raise NotTranslatable(ast.unparse(node))
+
+
+def positional_args(param_names: tuple[str, ...], args: tuple, kwargs: dict) -> tuple:
+    # The models are called with f(x, *params) or f(x, **params)
+    return args + tuple(kwargs[name] for name in param_names[len(args):]) if kwargs else args
+
+
+def make_numexpr_function(model: "CompiledModel") -> Callable | None:
+    try:
+        source = to_numexpr(model.tree.body)
+    except NotTranslatable:
+        return None
+    import numexpr
+    names = ("x",) + model.param_names
+    numpy_function = model.function
+
+    def numexpr_function(x, *args, **kwargs):
+        args = positional_args(model.param_names, args, kwargs)
+        if np.size(x) < MIN_BACKEND_SIZE or any(np.ndim(arg) for arg in args):
+            return numpy_function(x, *args)
+        x = np.asarray(x, dtype=float)
+        local_dict = dict(zip(names, (x,) + tuple(np.float64(arg) for arg in args)))
+        try:
+            y = numexpr.evaluate(source, local_dict=local_dict, global_dict={})
+        except (KeyError, TypeError, ValueError, NotImplementedError):
+            return numpy_function(x, *args)
+        y = np.asarray(y, dtype=float)
+        if y.shape != x.shape:
+            y = np.broadcast_to(y, x.shape).copy()
+        return y
+    return numexpr_function
+
+
+thread_pool_: ThreadPoolExecutor | None = None
+
+
+def thread_pool() -> ThreadPoolExecutor:
+    global thread_pool_
+    if thread_pool_ is None:
+        thread_pool_ = ThreadPoolExecutor(default_workers(), thread_name_prefix="curvify-eval")
+    return thread_pool_
+
+
+def make_threads_function(model: "CompiledModel") -> Callable | None:
+    numpy_function = model.function
+
+    def threads_function(x, *args, **kwargs):
+        args = positional_args(model.param_names, args, kwargs)
+        x = np.asarray(x)
+        if x.ndim != 1 or x.size < MIN_BACKEND_SIZE or any(np.ndim(arg) for arg in args):
+            return numpy_function(x, *args)
+        y = np.empty(x.shape)
+        # np.errstate is not inherited by the threads of the pool
+        errors = np.geterr()
+
+        def evaluate_chunk(start: int):
+            with np.errstate(**errors):
+                y[start:start + CHUNK_SIZE] = numpy_function(x[start:start + CHUNK_SIZE], *args)
+        list(thread_pool().map(evaluate_chunk, range(0, x.size, CHUNK_SIZE)))
+        return y
+    return threads_function
+
+
+def make_backend_function(model: "CompiledModel", backend: str) -> Callable | None:
+    # f(x, *params) evaluated by the backend, None if it can't evaluate the
+    # model (point by point models, expressions numexpr doesn't support...)
+    if model.evaluation_mode != "array":
+        return None
+    if backend == "numexpr":
+        if importlib.util.find_spec("numexpr") is None:
+            return None
+        return make_numexpr_function(model)
+    if backend == "threads":
+        return make_threads_function(model)
+    return None
@@ -0,0 +1,264 @@
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+
+import numpy as np
+
+from .compiled_model import compile_model
+from .models_library import models_library
+from .parallel import process_pool
+from .solver import Solver
+
+# Headless fitting of the same model to many files, without Qt or matplotlib
+
+# Series of a batched fit with a lower R² are refitted one by one
+# (fit_series), the batched solver may stop in a poor local minimum
+BATCH_MIN_R2 = 0.9
+
+
+def resolve_model(model: str) -> str:
+    # Accepts either a models_library name or an expression
+    return models_library.get(model, model)
+
+
+def expand_paths(patterns: list[str]) -> list[str]:
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        # Unmatched patterns are kept so that the error shows up in the output
+        paths.extend(matches if matches else [pattern])
+    return list(dict.fromkeys(paths))
+
+
+def result_columns(param_names: tuple[str, ...]) -> list[str]:
+    columns = ["file", "series", "ok", "n_points", "R2", "RMSE"]
+    for name in param_names:
+        columns += [name, f"{name}_error"]
+    columns.append("message")
+    return columns
+
+
+def fit_series(solver: Solver, initial_values: dict[str, float],
+               x: np.ndarray, y: np.ndarray) -> dict:
+    for param in solver.get_params():
+        param.value = initial_values.get(param.name, 1.0)
+        # The other parameters start from the initial guess of the model
+        param.initialized = param.name in initial_values
+        param.error = None
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    record = {"n_points": len(x)}
+    if len(x) <= len(solver.get_params()):
+        record.update(ok=False, message="Not enough points")
+        return record
+    ok, results = solver.fit(x, y)
+    record["ok"] = ok
+    if not ok:
+        record["message"] = "Fit failed"
+        return record
+    record["R2"] = float(results["R2"])
+    record["RMSE"] = float(results["RMSE"])
+    for param in solver.get_params():
+        record[param.name] = param.value
+        record[f"{param.name}_error"] = param.error
+    return record
+
+
+def fit_file(path: str, expression: str, x_column: str, y_columns: list[str] | None,
+             delimiter: str, initial_values: dict[str, float]) -> list[dict]:
+    # Runs in a worker process, returns one record per fitted series
+    import pandas as pd  # Imported on first use (startup time)
+    solver = Solver()
+    solver.update_model(expression)
+    try:
+        usecols = [x_column] + y_columns if y_columns else None
+        df = pd.read_csv(path, sep=delimiter, usecols=usecols)
+        if y_columns is None:
+            y_columns = [column for column in df.columns if column != x_column
+                         and pd.api.types.is_numeric_dtype(df[column])]
+        x = df[x_column].to_numpy(dtype=float)
+    except Exception as e:
+        return [{"file": path, "ok": False, "message": f"Failed to load data: {e}"}]
+
+    batch_records = {}
+    if len(y_columns) > 1 and np.all(np.isfinite(x)):
+        batch_records = fit_series_batch(solver, initial_values, x, df, y_columns)
+
+    records = []
+    for y_column in y_columns:
+        record = batch_records.get(y_column)
+        if record is None:
+            try:
+                y = df[y_column].to_numpy(dtype=float)
+                record = fit_series(solver, initial_values, x, y)
+            except Exception as e:
+                record = {"ok": False, "message": str(e)}
+        records.append({"file": path, "series": y_column, **record})
+    return records
+
+
+def fit_series_batch(solver: Solver, initial_values: dict[str, float], x: np.ndarray,
+                     df, y_columns: list[str]) -> dict[str, dict]:
+    # Fits all the complete columns in one batched solve. The series that
+    # are missing from the result (failed or poorly fitted) are fitted one
+    # by one.
+    try:
+        y = df[y_columns].to_numpy(dtype=float).T
+    except (ValueError, TypeError):
+        return {}
+    complete = np.all(np.isfinite(y), axis=1)
+    if np.count_nonzero(complete) < 2 or len(x) <= len(solver.get_params()):
+        return {}
+    for param in solver.get_params():
+        param.value = initial_values.get(param.name, 1.0)
+        # The other parameters start from the initial guess of each series
+        param.initialized = param.name in initial_values
+    ok, results = solver.fit_batch(x, y[complete])
+    if not ok:
+        return {}
+    records = {}
+    for i, y_column in enumerate(np.array(y_columns)[complete]):
+        if not results["success"][i] or not results["R2"][i] >= BATCH_MIN_R2:
+            continue
+        record = {"n_points": len(x), "ok": True,
+                  "R2": float(results["R2"][i]), "RMSE": float(results["RMSE"][i])}
+        for j, name in enumerate(results["params"]):
+            record[name] = float(results["params"][name][i])
+            record[f"{name}_error"] = float(results["params_error"][i, j])
+        records[y_column] = record
+    return records
+
+
+class JsonlWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self.file = sys.stdout if path == "-" else open(path, "w")
+
+    def write(self, record: dict):
+        # NaN and infinite values (failed fits) are written as null, they
+        # are not valid JSON
+        record = {key: None if isinstance(value, float) and not np.isfinite(value) else value
+                  for key, value in record.items()}
+        self.file.write(json.dumps(record, allow_nan=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class CsvWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write(self, record: dict):
+        self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # Records are buffered and written as row groups
+    def __init__(self, path: str, columns: list[str], row_group_size: int = 1000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        fields = []
+        for column in columns:
+            if column in ("file", "series", "message"):
+                fields.append(pa.field(column, pa.string()))
+            elif column == "ok":
+                fields.append(pa.field(column, pa.bool_()))
+            elif column == "n_points":
+                fields.append(pa.field(column, pa.int64()))
+            else:
+                fields.append(pa.field(column, pa.float64()))
+        self.pa = pa
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.records: list[dict] = []
+
+    def write(self, record: dict):
+        self.records.append(record)
+        if len(self.records) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            table = self.pa.Table.from_pylist(self.records, schema=self.schema)
+            self.writer.write_table(table)
+            self.records = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+writers = {
+    ".jsonl": JsonlWriter,
+    ".json": JsonlWriter,
+    ".csv": CsvWriter,
+    ".parquet": ParquetWriter,
+}
+
+
+def make_writer(path: str, columns: list[str]):
+    if path == "-":
+        return JsonlWriter(path, columns)
+    suffix = Path(path).suffix.lower()
+    if suffix not in writers:
+        raise ValueError(f"Unsupported output format {suffix}, "
+                         f"use one of {', '.join(writers)}")
+    return writers[suffix](path, columns)
+
+
+def batch_fit(model: str, patterns: list[str], x_column: str,
+              y_columns: list[str] | None = None, output: str = "-",
+              workers: int | None = None, delimiter: str = ",",
+              initial_values: dict[str, float] | None = None) -> int:
+    # Fits the model to every file, results are written as soon as a file
+    # is done. Returns the number of failed series.
+    expression = resolve_model(model)
+    compiled_model = compile_model(expression)
+    if compiled_model is None:
+        raise ValueError(f"Invalid model: {expression}")
+    paths = expand_paths(patterns)
+    initial_values = initial_values or {}
+    workers = workers or os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError(f"Invalid number of workers: {workers}")
+    columns = result_columns(compiled_model.param_names)
+    writer = make_writer(output, columns)
+
+    n_series, n_failed = 0, 0
+    start_time = time.perf_counter()
+    args = (expression, x_column, y_columns, delimiter, initial_values)
+    executor = None
+    try:
+        if workers == 1:
+            results = (fit_file(path, *args) for path in paths)
+        else:
+            executor = process_pool(workers)
+            futures = [executor.submit(fit_file, path, *args) for path in paths]
+            results = (future.result() for future in as_completed(futures))
+        for records in results:
+            for record in records:
+                writer.write({column: record.get(column) for column in columns})
+                n_series += 1
+                n_failed += not record["ok"]
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start_time
+    print(f"Fitted {n_series} series from {len(paths)} files in {elapsed:.2f} s "
+          f"({n_failed} failed)", file=sys.stderr)
+    return n_failed
@@ -1,14 +1,107 @@
 import argparse
-from .gui import curvify
+import atexit
+import sys
+
+
+def parse_initial_value(value: str) -> tuple[str, float]:
+    # NAME=VALUE, argparse reports the errors as usage errors
+    name, _, number = value.partition("=")
+    try:
+        return name.strip(), float(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid initial value: {value}")
+
+
+def parse_workers(value: str) -> int:
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        raise argparse.ArgumentTypeError(f"Invalid number of workers: {value}")
+    return workers
+
+
+def fit_command(args) -> int:
+    from .batch import batch_fit
+    try:
+        n_failed = batch_fit(
+            args.model, args.files, args.x, args.y, output=args.output,
+            workers=args.workers, delimiter=args.delimiter,
+            initial_values=dict(args.p0))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return 1 if n_failed else 0
+
 
 def main():
     parser = argparse.ArgumentParser(description="Launches Curvify interface.")
     parser.add_argument("--csv", type=str, help="Path to the CSV file")
+    parser.add_argument(
+        "--data", type=str,
+        help="Path to a data file (.csv, .npy, .npz, .parquet, .h5, .hdf5)")
+    parser.add_argument(
+        "--stream", type=str,
+        help="Live source of 'x,y' lines: a growing file, - for stdin, "
+             "udp://host:port or tcp://host:port (listens on the port)")
+    parser.add_argument(
+        "--window", type=int, default=1_000_000,
+        help="Number of points kept from the stream")
+    parser.add_argument(
+        "--profile", type=str, nargs="?", const="", default=None, metavar="TRACE",
+        help="Time the hot paths and show them in the status bar; the timeline "
+             "is written to TRACE (Chrome trace JSON) on exit if given")
+    parser.add_argument(
+        "--backend", type=str, choices=["numpy", "numexpr", "threads"], default="numpy",
+        help="Evaluation of the model on large arrays (numexpr must be installed)")
+    parser.add_argument(
+        "--dtype", type=str, choices=["float64", "float32"], default="float64",
+        help="Storage of the data: float32 halves the memory, the fits are "
+             "still computed in float64")
+    subparsers = parser.add_subparsers(dest="command")
+
+    fit_parser = subparsers.add_parser(
+        "fit", help="Fit a model to many files without the interface")
+    fit_parser.add_argument(
+        "model", type=str, help="Model expression or models library name")
+    fit_parser.add_argument(
+        "files", type=str, nargs="+", help="CSV files or glob patterns")
+    fit_parser.add_argument("--x", type=str, required=True, help="X column")
+    fit_parser.add_argument(
+        "--y", type=str, nargs="+",
+        help="Y column(s), defaults to every other numeric column")
+    fit_parser.add_argument(
+        "-o", "--output", type=str, default="-",
+        help="Output file (.jsonl, .csv or .parquet), defaults to JSONL on stdout")
+    fit_parser.add_argument(
+        "-j", "--workers", type=parse_workers, default=None,
+        help="Number of worker processes, defaults to the number of CPUs")
+    fit_parser.add_argument(
+        "--delimiter", type=str, default=",", help="CSV delimiter")
+    fit_parser.add_argument(
+        "--p0", type=parse_initial_value, nargs="+", default=[], metavar="NAME=VALUE",
+        help="Initial parameter values")
+
     args = parser.parse_args()
-    if args.csv:
-        curvify(csv_file=args.csv)
+    if args.profile is not None:
+        from .profiling import profiler
+        profiler.enable()
+        if args.profile:
+            atexit.register(profiler.export_chrome_trace, args.profile)
+    if args.command == "fit":
+        sys.exit(fit_command(args))
+
+    from .gui import curvify
+    options = {"backend": args.backend, "dtype": args.dtype}
+    if args.stream:
+        curvify(stream=args.stream, stream_window=args.window, **options)
+    elif args.csv:
+        curvify(csv_file=args.csv, **options)
+    elif args.data:
+        curvify(data_file=args.data, **options)
     else:
-        curvify()
+        curvify(**options)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,138 @@
+from typing import Callable
+
+import numpy as np
+
+# Coarse-to-fine fits of large data (Solver.coarse_to_fine). Stratified
+# subsamples of increasing size are fitted first, each one started from the
+# parameters of the previous one. The full data is then only used for a few
+# Gauss-Newton steps (refine): one evaluation of the model and its jacobian
+# per step, by chunks, and a (n_params, n_params) system instead of the
+# factorization of the (n_points, n_params) jacobian done by the optimizers.
+# The standard errors come from the same normal equations, with the
+# residual variance of the full data, like curve_fit.
+
+# Below this number of points the data is fitted directly
+COARSE_MIN_POINTS = 200_000
+
+# Points of the first stage, multiplied by STAGE_GROWTH at each stage
+COARSE_SIZE = 10_000
+STAGE_GROWTH = 10
+
+# Strata of the curvature estimate (block means of y)
+CURVATURE_BLOCKS = 1000
+
+# Gauss-Newton steps on the full data before falling back to a full fit
+MAX_REFINE_STEPS = 5
+
+# Points per evaluation of the jacobian in refine (bounds the memory)
+REFINE_CHUNK = 1 << 20
+
+# Condition number of the scaled normal equations above which the
+# parameters are taken as not identifiable (e.g. (a * x + b) / (c * x + d))
+# and the full data is fitted by the optimizers instead
+MAX_CONDITION = 1e10
+
+
+def stage_sizes(n_points: int) -> list[int]:
+    # Sizes of the subsamples, all at least STAGE_GROWTH times smaller than
+    # the data
+    sizes = []
+    size = COARSE_SIZE
+    while size * STAGE_GROWTH <= n_points:
+        sizes.append(size)
+        size *= STAGE_GROWTH
+    return sizes
+
+
+def random_in_strata(edges: np.ndarray, counts: np.ndarray,
+                     rng: np.random.Generator) -> np.ndarray:
+    # counts[i] random indices in [edges[i], edges[i + 1]) (with repetitions)
+    starts = np.repeat(edges[:-1], counts)
+    sizes = np.repeat(np.diff(edges), counts)
+    return starts + (rng.random(len(starts)) * sizes).astype(np.intp)
+
+
+def subsample_stages(x: np.ndarray, y: np.ndarray, sizes: list[int],
+                     seed: int = 0) -> list[np.ndarray]:
+    # Indices of a subsample of each size, in increasing x. Half of the
+    # points are spread along x (one random point per stratum of equal
+    # counts), the other half goes to the strata where y bends the most
+    # (second differences of the block means of y). The first and last
+    # points and the extrema of y are always kept.
+    n = len(x)
+    order = None if np.all(x[1:] >= x[:-1]) else np.argsort(x, kind='stable')
+    y_sorted = y if order is None else y[order]
+    n_blocks = min(CURVATURE_BLOCKS, n)
+    edges = (np.arange(n_blocks + 1) * n) // n_blocks
+    curvature = np.zeros(n_blocks)
+    if n_blocks >= 3:
+        means = np.add.reduceat(y_sorted, edges[:-1]) / np.diff(edges)
+        curvature[1:-1] = np.abs(means[:-2] - 2 * means[1:-1] + means[2:])
+        curvature[0], curvature[-1] = curvature[1], curvature[-2]
+        curvature[~np.isfinite(curvature)] = 0
+    extrema = [0, n - 1, int(np.argmin(y_sorted)), int(np.argmax(y_sorted))]
+
+    rng = np.random.default_rng(seed)
+    stages = []
+    for size in sizes:
+        size = min(size, n)
+        n_uniform = size - size // 2
+        uniform_edges = (np.arange(n_uniform + 1) * n) // n_uniform
+        samples = [np.array(extrema), random_in_strata(uniform_edges, np.ones(n_uniform, int), rng)]
+        total = curvature.sum()
+        if total > 0:
+            counts = np.floor(curvature / total * (size // 2)).astype(int)
+            samples.append(random_in_strata(edges, counts, rng))
+        indices = np.sort(np.concatenate(samples))
+        indices = indices[np.concatenate(([True], indices[1:] != indices[:-1]))]
+        stages.append(indices if order is None else order[indices])
+    return stages
+
+
+def refine(function: Callable, jacobian: Callable, x: np.ndarray, y: np.ndarray,
+           params: np.ndarray, free: list[int],
+           lower_bounds: list[float], upper_bounds: list[float], tolerance: float,
+           check: Callable[[np.ndarray, float], None] | None = None
+           ) -> tuple[np.ndarray, np.ndarray, int] | None:
+    # Gauss-Newton steps from params until every step is below tolerance
+    # times the standard error of its parameter. Returns the parameters, the
+    # standard errors (0 for the locked parameters) and the number of steps,
+    # None if it doesn't converge (the caller fits the full data instead).
+    # check(params, cost) is called at each step, it may raise to abort.
+    params = np.array(params, dtype=float)
+    degrees_of_freedom = len(y) - len(free)
+    if degrees_of_freedom <= 0:
+        return None
+    for step in range(1, MAX_REFINE_STEPS + 1):
+        normal = np.zeros((len(free), len(free)))
+        gradient = np.zeros(len(free))
+        cost = 0.0
+        for start in range(0, len(y), REFINE_CHUNK):
+            chunk = slice(start, start + REFINE_CHUNK)
+            residuals = y[chunk] - function(x[chunk], *params)
+            columns = jacobian(x[chunk], *params)[:, free]
+            normal += columns.T @ columns
+            gradient += columns.T @ residuals
+            cost += float(residuals @ residuals)
+        if check is not None:
+            check(params.copy(), cost)
+        if not (np.isfinite(cost) and np.all(np.isfinite(normal))):
+            return None
+        # Scaled to a unit diagonal, the parameters may differ by orders of magnitude
+        scale = np.sqrt(np.diagonal(normal))
+        if not np.all(scale > 0):
+            return None
+        scaled = normal / np.outer(scale, scale)
+        if np.linalg.cond(scaled) > MAX_CONDITION:
+            return None
+        inverse = np.linalg.inv(scaled) / np.outer(scale, scale)
+        delta = inverse @ gradient
+        errors = np.zeros(len(params))
+        errors[free] = np.sqrt(np.abs(np.diagonal(inverse)) * cost / degrees_of_freedom)
+        params[free] += delta
+        if np.any(params[free] < np.asarray(lower_bounds)[free]) \
+                or np.any(params[free] > np.asarray(upper_bounds)[free]):
+            return None
+        if np.all(np.abs(delta) <= tolerance * errors[free]):
+            return params, errors, step
+    return None
@@ -0,0 +1,327 @@
+import ast
+import copy
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from .backends import make_backend_function
+from .derivatives import NotDifferentiable, eliminate_common_subexpressions, free_names, gradient
+from .model_families import fourier, fourier_basis
+from .models_library import normalize_model
+from .profiling import profiler
+
+# Single letter (except x) optionally followed by digits: a, b, f0, a12...
+PARAM_NAME_PATTERN = re.compile(r'[a-wyz]\d*')
+
+# Sample points used to check whether a model broadcasts over numpy arrays
+PROBE_X = np.linspace(0.5, 1.5, 7)
+
+ALLOWED_BUILTINS = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "pow": pow,
+    "round": round,
+    "sum": sum,
+    "len": len,
+    "float": float,
+    "int": int,
+}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+    ast.IfExp, ast.Call, ast.keyword, ast.Name, ast.Attribute, ast.Constant,
+    ast.List, ast.Tuple, ast.Subscript, ast.Slice, ast.Load,
+    ast.operator, ast.unaryop, ast.cmpop, ast.boolop,
+)
+
+
+def model_namespace() -> dict:
+    return {"np": np, "fourier": fourier, "fourier_basis": fourier_basis,
+            "__builtins__": ALLOWED_BUILTINS}
+
+
+@dataclass(eq=False)
+class CompiledModel:
+    expression: str
+    key: str  # Normalized expression
+    param_names: tuple[str, ...]
+    tree: ast.Expression
+    function: Callable  # f(x, *params), always returns an array shaped like x
+    evaluation_mode: str  # "array" or "scalar"
+    derivatives_: list[ast.expr] | None = field(default=None, repr=False)
+    gradient_: Callable | None = field(default=None, repr=False)
+    jacobian_: Callable | None = field(default=None, repr=False)
+    derivatives_built_: bool = field(default=False, repr=False)
+    partial_jacobians_: dict = field(default_factory=dict, repr=False)
+    backend_functions_: dict = field(default_factory=dict, repr=False)
+
+    def get_function(self, backend: str = "numpy") -> Callable:
+        # function evaluated by another backend (see backends.py), function
+        # itself when the backend can't evaluate the model
+        if backend == "numpy":
+            return self.function
+        if backend not in self.backend_functions_:
+            self.backend_functions_[backend] = \
+                make_backend_function(self, backend) or self.function
+        return self.backend_functions_[backend]
+
+    def get_derivatives(self) -> list[ast.expr] | None:
+        # Expression trees of the partial derivatives with respect to each
+        # parameter, None if the expression can't be differentiated
+        self.build_derivatives_()
+        return self.derivatives_
+
+    def get_gradient(self) -> Callable | None:
+        # g(x, *params) -> tuple of the partial derivatives, each one
+        # broadcastable against x and the parameters
+        self.build_derivatives_()
+        return self.gradient_
+
+    def get_jacobian(self) -> Callable | None:
+        # Analytic jacobian J(x, *params) of shape (len(x), n_params)
+        self.build_derivatives_()
+        return self.jacobian_
+
+    def get_partial_jacobian(self, indices: tuple[int, ...]) -> Callable | None:
+        # Same as get_jacobian for a subset of the parameters (columns in
+        # the given order), cheaper than computing all the derivatives
+        derivatives = self.get_derivatives()
+        if derivatives is None:
+            return None
+        indices = tuple(indices)
+        if indices not in self.partial_jacobians_:
+            selected = [copy.deepcopy(derivatives[i]) for i in indices]
+            self.partial_jacobians_[indices] = make_jacobian(
+                build_gradient_function(selected, self.param_names))
+        return self.partial_jacobians_[indices]
+
+    def is_linear_in(self, names) -> bool:
+        # True if the model is linear with respect to all the given parameters
+        derivatives = self.get_derivatives()
+        if derivatives is None:
+            return False
+        names = set(names)
+        return all(not (free_names(derivative) & names)
+                   for name, derivative in zip(self.param_names, derivatives)
+                   if name in names)
+
+    def build_derivatives_(self):
+        if self.derivatives_built_:
+            return
+        self.derivatives_built_ = True
+        self.derivatives_, self.gradient_ = build_derivatives(self)
+        if self.gradient_ is not None:
+            self.jacobian_ = make_jacobian(self.gradient_)
+
+
+def parse_model(expression: str) -> tuple[ast.Expression, tuple[str, ...]] | None:
+    # Parses and validates the expression, returns the tree and the
+    # parameter names in order of appearance
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError:
+        return None
+    names: list[ast.Name] = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            return None
+        if isinstance(node, ast.Attribute):
+            # Only numpy attributes are allowed (np.exp, np.pi...)
+            root = node
+            while isinstance(root, ast.Attribute):
+                if root.attr.startswith("_"):
+                    return None
+                root = root.value
+            if not isinstance(root, ast.Name) or root.id != "np":
+                return None
+        elif isinstance(node, ast.Name):
+            names.append(node)
+    names.sort(key=lambda node: (node.lineno, node.col_offset))
+    param_names: list[str] = []
+    for node in names:
+        if node.id in ("x", "np", "fourier") or node.id in ALLOWED_BUILTINS:
+            continue
+        if not PARAM_NAME_PATTERN.fullmatch(node.id):
+            return None
+        param_names.append(node.id)
+    param_names = list(dict.fromkeys(param_names))  # Makes the params unique
+    return tree, tuple(param_names)
+
+
+def find_evaluation_mode(model, n_params: int) -> str | None:
+    # Returns "array" if the model can be called on a whole array,
+    # "scalar" if it only works point by point, None if it can't be evaluated
+    args = [np.float64(1.0)] * n_params
+    with np.errstate(all='ignore'):
+        try:
+            array_result = np.broadcast_to(
+                np.asarray(model(PROBE_X, *args), dtype=float), PROBE_X.shape)
+        except Exception:
+            array_result = None
+        try:
+            scalar_result = np.array(
+                [model(xi, *args) for xi in PROBE_X], dtype=float)
+        except Exception:
+            scalar_result = None
+    if scalar_result is None:
+        return None if array_result is None else "array"
+    if array_result is None:
+        return "scalar"
+    if np.allclose(array_result, scalar_result, equal_nan=True):
+        return "array"
+    return "scalar"
+
+
+def make_array_model(model, evaluation_mode: str):
+    # Wraps the model so that it always returns an array with the shape of x
+    if evaluation_mode == "scalar":
+        model = np.vectorize(model, otypes=[float])
+
+    def array_model(x, *args, **kwargs):
+        y = np.asarray(model(x, *args, **kwargs), dtype=float)
+        if y.shape != np.shape(x):
+            y = np.broadcast_to(y, np.shape(x)).copy()
+        return y
+    return array_model
+
+
+def build_function(body: ast.expr, param_names: tuple[str, ...]):
+    # Turns the expression into "lambda x, a, b, ...: <expression>"
+    args = [ast.arg(arg=name) for name in ("x",) + param_names]
+    function_tree = ast.Expression(body=ast.Lambda(
+        args=ast.arguments(posonlyargs=[], args=args, kwonlyargs=[],
+                           kw_defaults=[], defaults=[]),
+        body=body,
+    ))
+    ast.fix_missing_locations(function_tree)
+    code = compile(function_tree, "<model>", "eval")
+    return eval(code, model_namespace())
+
+
+def build_gradient_function(derivatives: list[ast.expr], param_names: tuple[str, ...]):
+    # Same as build_function, but for the tuple of partial derivatives, which
+    # share a lot of subexpressions (exp, sin...) that are computed only once:
+    # def gradient(x, a, b, ...):
+    #     _t0 = ...
+    #     return (da, db, ...)
+    assignments, derivatives = eliminate_common_subexpressions(derivatives)
+    args = [ast.arg(arg=name) for name in ("x",) + param_names]
+    function_def = ast.FunctionDef(
+        name="gradient",
+        args=ast.arguments(posonlyargs=[], args=args, kwonlyargs=[],
+                           kw_defaults=[], defaults=[]),
+        body=assignments + [ast.Return(value=ast.Tuple(elts=derivatives, ctx=ast.Load()))],
+        decorator_list=[], type_params=[],
+    )
+    module = ast.Module(body=[function_def], type_ignores=[])
+    ast.fix_missing_locations(module)
+    namespace = model_namespace()
+    exec(compile(module, "<gradient>", "exec"), namespace)
+    return namespace["gradient"]
+
+
+def build_model(expression: str) -> CompiledModel | None:
+    parsed = parse_model(expression)
+    if parsed is None:
+        return None
+    tree, param_names = parsed
+    try:
+        function = build_function(tree.body, param_names)
+    except Exception:
+        return None
+    evaluation_mode = find_evaluation_mode(function, len(param_names))
+    if evaluation_mode is None:
+        return None
+    return CompiledModel(
+        expression=expression,
+        key=normalize_model(expression),
+        param_names=param_names,
+        tree=tree,
+        function=make_array_model(function, evaluation_mode),
+        evaluation_mode=evaluation_mode,
+    )
+
+
+def make_jacobian(gradient_function):
+    def jacobian(x, *args):
+        x = np.asarray(x)
+        # Filled row by row, returned as a column-major (len(x), n_params) array
+        columns = gradient_function(x, *args)
+        result = np.empty((len(columns), x.size))
+        for i, column in enumerate(columns):
+            result[i] = np.broadcast_to(column, x.shape).ravel()
+        return result.T
+    return jacobian
+
+
+def build_derivatives(model: CompiledModel) -> tuple[list[ast.expr] | None, Callable | None]:
+    if model.evaluation_mode != "array" or not model.param_names:
+        return None, None
+    try:
+        derivatives = gradient(model.tree, model.param_names)
+        gradient_function = build_gradient_function(derivatives, model.param_names)
+    except (NotDifferentiable, SyntaxError, ValueError) as e:
+        print(f"No analytic jacobian: {e}")
+        return None, None
+
+    # Checks the derivatives against finite differences on the probe points
+    jacobian = make_jacobian(gradient_function)
+    args = [np.float64(1.0)] * len(model.param_names)
+    with np.errstate(all='ignore'):
+        try:
+            analytic = jacobian(PROBE_X, *args)
+        except Exception as e:
+            print(f"No analytic jacobian: {e}")
+            return None, None
+        numeric = np.empty_like(analytic)
+        step = 1e-6
+        for i in range(len(args)):
+            args_plus, args_minus = list(args), list(args)
+            args_plus[i] += step
+            args_minus[i] -= step
+            numeric[:, i] = (model.function(PROBE_X, *args_plus)
+                             - model.function(PROBE_X, *args_minus)) / (2 * step)
+    finite = np.isfinite(analytic) & np.isfinite(numeric)
+    if not np.allclose(analytic[finite], numeric[finite], rtol=1e-4, atol=1e-6):
+        print("No analytic jacobian: derivatives don't match finite differences")
+        return None, None
+    return derivatives, gradient_function
+
+
+class ModelCache:
+    # LRU cache of compiled models, keyed by the normalized expression
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.models_: OrderedDict[str, CompiledModel] = OrderedDict()
+
+    def get(self, expression: str) -> CompiledModel | None:
+        key = normalize_model(expression)
+        model = self.models_.get(key)
+        if model is not None:
+            self.models_.move_to_end(key)
+            return model
+        with profiler.span("compile_model", expression=expression):
+            model = build_model(expression)
+        if model is None:
+            return None
+        self.models_[key] = model
+        if len(self.models_) > self.max_size:
+            self.models_.popitem(last=False)
+        return model
+
+    def clear(self):
+        self.models_.clear()
+
+    def __len__(self):
+        return len(self.models_)
+
+
+model_cache = ModelCache()
+
+
+def compile_model(expression: str) -> CompiledModel | None:
+    return model_cache.get(expression)
@@ -0,0 +1,23 @@
+# Qt-free part of curvify: models, fitting and data, for scripts and worker
+# processes. Importing it loads numpy only, scipy is imported by the first
+# fit and pandas by the first batch fit. See benchmarks/check_import_time.py.
+from .batch import batch_fit
+from .compiled_model import compile_model
+from .data_holder import DataHolder, StreamingDataHolder
+from .loaders import load_data
+from .model_selection import compare_models
+from .models_library import find_model, models_library
+from .solver import Param, Solver
+
+__all__ = [
+    "DataHolder",
+    "Param",
+    "Solver",
+    "StreamingDataHolder",
+    "batch_fit",
+    "compile_model",
+    "find_model",
+    "compare_models",
+    "load_data",
+    "models_library",
+]
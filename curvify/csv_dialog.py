@@ -1,22 +1,59 @@
 import sys
+import threading
 import numpy as np
-import pandas as pd
 from PySide6.QtWidgets import (
     QApplication, QDialog, QVBoxLayout,
-    QLabel, QComboBox, QPushButton
+    QLabel, QComboBox, QPushButton, QProgressBar
 )
-from PySide6.QtCore import Signal
+from PySide6.QtCore import Signal, QThread, QSignalBlocker
+
+from .csv_reader import CsvFormat, ReadCancelled, read_cache, sniff_format
+
+
+class CSVLoadWorker(QThread):
+    # Parses the selected columns outside of the Qt main thread
+    progress = Signal(int)  # Percent of the file read
+    loaded = Signal(object, object)  # x, y
+    failed = Signal(str)
+
+    def __init__(self, path: str, csv_format: CsvFormat, x_index: int, y_index: int,
+                 parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.csv_format = csv_format
+        self.indices = [x_index, y_index]
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            x, y = read_cache.read(
+                self.path, self.csv_format, self.indices,
+                progress=lambda fraction: self.progress.emit(int(100 * fraction)),
+                cancel_event=self.cancel_event)
+        except ReadCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit(x, y)
+
+    def cancel(self):
+        self.cancel_event.set()
 
 
 class CSVDialog(QDialog):
     data_selected = Signal(np.ndarray, np.ndarray)  # Signal to return x and y
 
+    # Only a preview is read to fill the columns, the selected columns are
+    # parsed when the user clicks on Import, in a CSVLoadWorker
     def __init__(self, csv_path, parent=None):
         super().__init__(parent)
-        self.csv_path = csv_path
+        self.csv_path = str(csv_path)
+        self.csv_format: CsvFormat | None = None
+        self.load_worker: CSVLoadWorker | None = None
         self.setWindowTitle("CSV import")
         self.setup_ui()
-        self.load_csv()
+        self.sniff_csv()
 
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -45,42 +82,86 @@ class CSVDialog(QDialog):
         self.ok_button.clicked.connect(self.on_ok)
         layout.addWidget(self.ok_button)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
         self.setLayout(layout)
         self.adjustSize()
 
+    def sniff_csv(self):
+        try:
+            self.csv_format = sniff_format(self.csv_path)
+        except Exception as e:
+            print(f"Failed to load CSV: {e}")
+            return
+        with QSignalBlocker(self.delimiter_combo):
+            if self.delimiter_combo.findText(self.csv_format.delimiter) < 0:
+                self.delimiter_combo.addItem(self.csv_format.delimiter)
+            self.delimiter_combo.setCurrentText(self.csv_format.delimiter)
+        self.update_columns()
+
     def load_csv(self):
+        # Delimiter changed by the user
         delimiter = self.delimiter_combo.currentText()
         try:
-            df = pd.read_csv(self.csv_path, delimiter=delimiter)
-            self.df = df
-            self.x_col_combo.clear()
-            self.y_col_combo.clear()
-            self.x_col_combo.addItems(df.columns)
-            self.y_col_combo.addItems(df.columns)
-            self.x_col_combo.setCurrentIndex(0)
-            self.y_col_combo.setCurrentIndex(1)
+            self.csv_format = sniff_format(self.csv_path, delimiter)
         except Exception as e:
             print(f"Failed to load CSV: {e}")
+            return
+        self.update_columns()
+
+    def update_columns(self):
+        columns = self.csv_format.columns
+        self.x_col_combo.clear()
+        self.y_col_combo.clear()
+        self.x_col_combo.addItems(columns)
+        self.y_col_combo.addItems(columns)
+        self.x_col_combo.setCurrentIndex(0)
+        self.y_col_combo.setCurrentIndex(min(1, len(columns) - 1))
 
     def on_ok(self):
-        x_col = self.x_col_combo.currentText()
-        y_col = self.y_col_combo.currentText()
-        try:
-            x_ok = pd.api.types.is_numeric_dtype(self.df[x_col])
-            y_ok = pd.api.types.is_numeric_dtype(self.df[y_col])
-            if not x_ok or not y_ok:
-                print("X and Y columns must be numeric")
-                self.reject()
-                return
-            X = self.df[x_col].to_numpy()
-            Y = self.df[y_col].to_numpy()
-        except Exception as e:
-            print(f"Failed to load data")
+        x_index = self.x_col_combo.currentIndex()
+        y_index = self.y_col_combo.currentIndex()
+        if self.csv_format is None or x_index < 0 or y_index < 0:
+            print("Failed to load data")
             self.reject()
             return
-        self.data_selected.emit(X, Y)
+        self.set_loading(True)
+        self.load_worker = CSVLoadWorker(
+            self.csv_path, self.csv_format, x_index, y_index, self)
+        self.load_worker.progress.connect(self.progress_bar.setValue)
+        self.load_worker.loaded.connect(self.on_loaded)
+        self.load_worker.failed.connect(self.on_failed)
+        self.load_worker.start()
+
+    def set_loading(self, loading: bool):
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(loading)
+        for widget in (self.ok_button, self.delimiter_combo,
+                       self.x_col_combo, self.y_col_combo):
+            widget.setEnabled(not loading)
+
+    def on_loaded(self, x: np.ndarray, y: np.ndarray):
+        self.data_selected.emit(x, y)
         self.accept()
 
+    def on_failed(self, message: str):
+        self.load_worker.wait()
+        self.load_worker = None
+        # Typically a column that is not numeric
+        print(f"Failed to load data: {message}")
+        self.set_loading(False)
+
+    def done(self, result: int):
+        # Closing the dialog stops the parsing, if it is not finished
+        if self.load_worker is not None:
+            self.load_worker.cancel()
+            self.load_worker.wait()
+            self.load_worker = None
+        super().done(result)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,160 @@
+import csv
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from .profiling import profiled
+
+# Reads selected columns of large CSV files, without Qt. The delimiter and
+# the header are guessed from the beginning of the file, then only the
+# requested columns are parsed, as float64.
+
+PREVIEW_SIZE = 64 * 1024  # Bytes read to guess the format
+DELIMITERS = ",;\t|"
+CHUNK_SIZE = 1 << 20  # Rows per chunk for the pandas fallback
+
+
+class ReadCancelled(Exception):
+    pass
+
+
+@dataclass
+class CsvFormat:
+    delimiter: str
+    has_header: bool
+    columns: list[str]  # Header names, or "Column 1", "Column 2"... without header
+
+
+def read_preview(path: str) -> str:
+    with open(path, "rb") as file:
+        data = file.read(PREVIEW_SIZE)
+    if len(data) == PREVIEW_SIZE:
+        # Drops the last line, which may be incomplete
+        data = data[:data.rfind(b"\n") + 1] or data
+    return data.decode("utf-8-sig", errors="replace")
+
+
+def read_columns_names(preview: str, delimiter: str, has_header: bool) -> list[str]:
+    first_row = next(csv.reader(preview.splitlines(), delimiter=delimiter), [])
+    if has_header:
+        return [name.strip() for name in first_row]
+    return [f"Column {i + 1}" for i in range(len(first_row))]
+
+
+def sniff_format(path: str, delimiter: str | None = None) -> CsvFormat:
+    # Guesses the format from a preview. The delimiter can be forced.
+    preview = read_preview(path)
+    sniffer = csv.Sniffer()
+    if delimiter is None:
+        try:
+            delimiter = sniffer.sniff(preview, delimiters=DELIMITERS).delimiter
+        except csv.Error:
+            delimiter = ","
+    try:
+        has_header = sniffer.has_header(preview)
+    except csv.Error:
+        has_header = True
+    return CsvFormat(delimiter, has_header, read_columns_names(preview, delimiter, has_header))
+
+
+@profiled("read_csv")
+def read_columns(path: str, csv_format: CsvFormat, indices: list[int],
+                 progress: Callable[[float], None] | None = None,
+                 cancel_event: threading.Event | None = None) -> list[np.ndarray]:
+    # Parses the columns at the given indices as float64 arrays. progress
+    # receives the fraction of the file already read.
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        read = read_columns_pandas_
+    else:
+        read = read_columns_pyarrow_
+    size = max(1, os.path.getsize(path))
+    with open(path, "rb") as file:
+        def report():
+            if cancel_event is not None and cancel_event.is_set():
+                raise ReadCancelled()
+            if progress is not None:
+                progress(min(1.0, file.tell() / size))
+        return read(file, csv_format, indices, report)
+
+
+def read_columns_pyarrow_(file, csv_format: CsvFormat, indices: list[int],
+                          report: Callable[[], None]) -> list[np.ndarray]:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    # Internal column names, unique even if the header has duplicates
+    names = [f"c{i}" for i in range(len(csv_format.columns))]
+    read_options = pv.ReadOptions(
+        column_names=names, skip_rows=int(csv_format.has_header))
+    parse_options = pv.ParseOptions(delimiter=csv_format.delimiter)
+    convert_options = pv.ConvertOptions(
+        include_columns=[names[i] for i in indices],
+        column_types={names[i]: pa.float64() for i in indices})
+    reader = pv.open_csv(file, read_options=read_options,
+                         parse_options=parse_options, convert_options=convert_options)
+    batches = []
+    for batch in reader:
+        batches.append(batch)
+        report()
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return [table.column(names[i]).to_numpy() for i in indices]
+
+
+def read_columns_pandas_(file, csv_format: CsvFormat, indices: list[int],
+                         report: Callable[[], None]) -> list[np.ndarray]:
+    import pandas as pd
+    chunks = []
+    reader = pd.read_csv(file, sep=csv_format.delimiter, header=None,
+                         skiprows=int(csv_format.has_header), usecols=indices,
+                         dtype={i: np.float64 for i in indices}, chunksize=CHUNK_SIZE)
+    for chunk in reader:
+        chunks.append(chunk)
+        report()
+    df = pd.concat(chunks) if chunks else pd.DataFrame(columns=indices)
+    return [df[i].to_numpy(dtype=np.float64) for i in indices]
+
+
+class ReadCache:
+    # Parsed columns per file and delimiter. A file is read again if its
+    # modification time or size changed.
+    def __init__(self, max_files: int = 4):
+        self.max_files = max_files
+        self.entries_: OrderedDict[tuple, dict[int, np.ndarray]] = OrderedDict()
+        self.lock_ = threading.Lock()
+
+    def key_(self, path: str, csv_format: CsvFormat) -> tuple:
+        stat = os.stat(path)
+        return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size,
+                csv_format.delimiter, csv_format.has_header)
+
+    def read(self, path: str, csv_format: CsvFormat, indices: list[int],
+             progress: Callable[[float], None] | None = None,
+             cancel_event: threading.Event | None = None) -> list[np.ndarray]:
+        # Only the columns that are not cached yet are parsed
+        key = self.key_(path, csv_format)
+        with self.lock_:
+            columns = self.entries_.get(key, {})
+        missing = [i for i in dict.fromkeys(indices) if i not in columns]
+        if missing:
+            arrays = read_columns(path, csv_format, missing, progress, cancel_event)
+            columns = {**columns, **dict(zip(missing, arrays))}
+        with self.lock_:
+            self.entries_[key] = columns
+            self.entries_.move_to_end(key)
+            while len(self.entries_) > self.max_files:
+                self.entries_.popitem(last=False)
+        if progress is not None:
+            progress(1.0)
+        return [columns[i] for i in indices]
+
+    def clear(self):
+        with self.lock_:
+            self.entries_.clear()
+
+
+read_cache = ReadCache()
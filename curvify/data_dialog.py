@@ -0,0 +1,68 @@
+import numpy as np
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout,
+    QLabel, QComboBox, QPushButton
+)
+from PySide6.QtCore import Signal
+
+from .loaders import get_loader
+
+
+class DataDialog(QDialog):
+    # Column selection for the binary formats of the loaders module
+    data_selected = Signal(np.ndarray, np.ndarray)  # Signal to return x and y
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = str(path)
+        self.loader = get_loader(self.path)
+        self.setWindowTitle("Data import")
+        self.setup_ui()
+        self.list_columns()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        self.path_label = QLabel(f"File: {self.path}")
+        layout.addWidget(self.path_label)
+
+        self.x_col_combo = QComboBox()
+        self.y_col_combo = QComboBox()
+        layout.addWidget(QLabel("X column:"))
+        layout.addWidget(self.x_col_combo)
+        layout.addWidget(QLabel("Y column:"))
+        layout.addWidget(self.y_col_combo)
+
+        self.ok_button = QPushButton("Import data")
+        self.ok_button.clicked.connect(self.on_ok)
+        layout.addWidget(self.ok_button)
+
+        self.setLayout(layout)
+        self.adjustSize()
+
+    def list_columns(self):
+        try:
+            columns = self.loader.list_columns(self.path)
+        except Exception as e:
+            print(f"Failed to load data: {e}")
+            return
+        self.x_col_combo.addItems(columns)
+        self.y_col_combo.addItems(columns)
+        self.x_col_combo.setCurrentIndex(0)
+        self.y_col_combo.setCurrentIndex(min(1, len(columns) - 1))
+
+    def on_ok(self):
+        x_col = self.x_col_combo.currentText()
+        y_col = self.y_col_combo.currentText()
+        try:
+            x, y = self.loader.load(self.path, x_col, y_col)
+        except Exception as e:
+            print(f"Failed to load data: {e}")
+            self.reject()
+            return
+        if x.dtype.kind not in "iuf" or y.dtype.kind not in "iuf":
+            print("X and Y columns must be numeric")
+            self.reject()
+            return
+        self.data_selected.emit(x, y)
+        self.accept()
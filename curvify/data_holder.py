@@ -1,74 +1,265 @@
 import numpy as np
 
+from .profiling import profiled
 from .solver import Solver
+from .uncertainty import confidence_band
+
+
+# Points copied at once when sorting the data (bounds the temporary memory)
+GATHER_CHUNK = 1 << 20
+
+# Storage types of the data: float32 halves the memory, the fits are
+# computed in float64 (see Solver.fit)
+STORAGE_DTYPES = ("float64", "float32")
+
+
+def read_only_view(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def gather(out: np.ndarray, source: np.ndarray, order: np.ndarray | None):
+    # out[:] = source[order], converted to the type of out, by chunks
+    if order is None:
+        out[:] = source
+        return
+    for start in range(0, len(order), GATHER_CHUNK):
+        out[start:start + GATHER_CHUNK] = source[order[start:start + GATHER_CHUNK]]
 
 
 class DataHolder():
-    def __init__(self, solver: Solver):
+    # The data is stored sorted by x, so that the selected range is a
+    # contiguous slice found with a binary search. The arrays are read-only
+    # views: on the arrays given to set_data when they are already sorted
+    # and of the storage type (no copy), otherwise on a single (2, n) buffer
+    # owned by the holder. Everything handed out is a view on them.
+    def __init__(self, solver: Solver, dtype: str = "float64"):
         self.solver = solver
-        self.x = np.zeros((0))
-        self.y = np.zeros((0))
-        self.selected_mask = np.zeros((0), dtype=bool)  # Store a boolean mask
+        self.dtype = np.dtype(dtype)
+        self.x = np.zeros((0), dtype=self.dtype)
+        self.y = np.zeros((0), dtype=self.dtype)
+        self.owns_data = False  # x and y are views on a buffer of the holder
+        self.x_min, self.x_max = 0.0, 0.0  # Extrema of the finite x
+        self.n_valid = 0  # Points with a finite x (the NaN are sorted last)
+        self.selected_slice = slice(0, 0)
         self.selected_percent_min = 0
         self.selected_percent_max = 100
-        self.update_selected_mask_()
+        self.selected_bounds = (0.0, 0.0)  # x range of the selection
+        self.data_version = 0  # Incremented each time the data is replaced
+        self.update_selected_range_()
 
         self.curve_x = np.zeros((0))
         self.curve_y = np.zeros((0))
+        # Parameters used for the curve and the residuals, None for the
+        # current parameters of the solver
+        self.curve_params: dict[str, float] | None = None
+        # Parameter samples of the uncertainty estimation and confidence band
+        # of the curve, empty when there is none
+        self.uncertainty_samples: np.ndarray | None = None
+        self.curve_band = (np.zeros((0)), np.zeros((0)))
 
+    @profiled("data.set_data")
     def set_data(self, x: np.ndarray, y: np.ndarray):
         if len(x) == 0:
             print(f"Ignoring empty data")
             return
-        self.x = x.copy()
-        self.y = y.copy()
-        self.update_selected_mask_()
+        # Converted once here (integers, objects from pandas...)
+        try:
+            x, y = np.asarray(x), np.asarray(y)
+            if x.dtype.kind not in "iuf":
+                x = x.astype(np.float64)
+            if y.dtype.kind not in "iuf":
+                y = y.astype(np.float64)
+        except (TypeError, ValueError) as e:
+            print(f"Ignoring non numeric data: {e}")
+            return
+        order = None if np.all(x[1:] >= x[:-1]) else np.argsort(x, kind='stable')
+        if order is None and x.dtype == self.dtype and y.dtype == self.dtype:
+            # Already sorted: kept without a copy, e.g. a memory mapped file
+            self.x, self.y = read_only_view(x), read_only_view(y)
+            self.owns_data = False
+        else:
+            buffer = np.empty((2, len(x)), dtype=self.dtype)
+            gather(buffer[0], x, order)
+            gather(buffer[1], y, order)
+            buffer.flags.writeable = False  # The fit cache remembers the hashes of read-only data
+            self.x, self.y = read_only_view(buffer[0]), read_only_view(buffer[1])
+            self.owns_data = True
+        self.n_valid = int(np.searchsorted(self.x, np.nan, side='left'))
+        if self.n_valid > 0:
+            self.x_min, self.x_max = float(self.x[0]), float(self.x[self.n_valid - 1])
+        else:
+            self.x_min, self.x_max = 0.0, 0.0
+        self.data_version += 1
+        self.uncertainty_samples = None
+        self.update_selected_range_()
 
+    @profiled("data.selection")
     def set_selected_range(self, min_max: tuple[int, int]):
         self.selected_percent_min = min_max[0]
         self.selected_percent_max = min_max[1]
-        self.update_selected_mask_()
+        self.update_selected_range_()
 
-    def update_selected_mask_(self):
+    def update_selected_range_(self):
         if len(self.x) == 0:
             return
-        # Create a boolean mask
-        min_val, max_val = self.x.min(), self.x.max()
+        min_val, max_val = self.x_min, self.x_max
         lower_bound = min_val + self.selected_percent_min / \
             99 * (max_val - min_val)
         upper_bound = min_val + self.selected_percent_max / \
             99 * (max_val - min_val)
-        self.selected_mask = (self.x >= lower_bound) & (self.x <= upper_bound)
+        self.selected_bounds = (lower_bound, upper_bound)
+        self.selected_slice = self.index_range(lower_bound, upper_bound)
+
+    def index_range(self, lower_bound: float, upper_bound: float) -> slice:
+        # Points with lower_bound <= x <= upper_bound
+        start = int(np.searchsorted(self.x, lower_bound, side='left'))
+        stop = int(np.searchsorted(self.x, upper_bound, side='right'))
+        return slice(start, max(start, min(stop, self.n_valid)))
 
-    def update_curve(self):
-        if len(self.x) < 2 or not self.solver.is_valid():
+    @profiled("data.update_curve")
+    def update_curve(self, params: dict[str, float] | None = None):
+        self.curve_params = params
+        selected_x = self.x[self.selected_slice]
+        if len(selected_x) < 2 or not self.solver.is_valid():
             return
-        min_selected_x = self.x[self.selected_mask].min()
-        max_selected_x = self.x[self.selected_mask].max()
-        x_array = np.linspace(min_selected_x, max_selected_x, 100)
+        x_array = np.linspace(selected_x[0], selected_x[-1], 100)
         self.curve_x = x_array
-        self.curve_y = self.solver.evaluate(x_array)
+        self.curve_y = self.solver.evaluate(x_array, params)
+        if self.uncertainty_samples is not None and params is None:
+            self.curve_band = confidence_band(self.solver, x_array, self.uncertainty_samples)
+        else:
+            self.curve_band = (np.zeros((0)), np.zeros((0)))
 
+    def set_uncertainty(self, samples: np.ndarray | None):
+        # Parameter samples around the current parameters, None to remove
+        # the confidence band. Call update_curve to recompute the band.
+        self.uncertainty_samples = samples
+
+    # The selected data and residuals are views on the stored arrays, which
+    # are replaced but never modified in place
     def get_selected_data(self) -> tuple[np.ndarray, np.ndarray]:
-        return self.x[self.selected_mask].copy(), self.y[self.selected_mask].copy()
+        return self.x[self.selected_slice], self.y[self.selected_slice]
 
     def get_not_selected_data(self) -> tuple[np.ndarray, np.ndarray]:
+        # A copy when there are points on both sides of the selection (the
+        # plot uses decimation.Decimator instead)
         if len(self.x) == 0:
             return np.array([]), np.array([])
-        return self.x[~self.selected_mask].copy(), self.y[~self.selected_mask].copy()
+        before = slice(0, self.selected_slice.start)
+        after = slice(self.selected_slice.stop, None)
+        if self.selected_slice.start == 0:
+            return self.x[after], self.y[after]
+        if self.selected_slice.stop >= len(self.x):
+            return self.x[before], self.y[before]
+        return (np.concatenate((self.x[before], self.x[after])),
+                np.concatenate((self.y[before], self.y[after])))
 
+    # The curve arrays are replaced by update_curve, never modified
     def get_curve_data(self) -> tuple[np.ndarray, np.ndarray]:
-        return self.curve_x.copy(), self.curve_y.copy()
+        return read_only_view(self.curve_x), read_only_view(self.curve_y)
+
+    def get_curve_band(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # x, lower and upper curves, empty if there is no band
+        lower, upper = self.curve_band
+        if len(lower) == 0:
+            return np.zeros((0)), lower, upper
+        return read_only_view(self.curve_x), lower, upper
 
+    @profiled("data.residuals")
     def get_residuals(self) -> tuple[np.ndarray, np.ndarray]:
         if len(self.x) == 0:
             return np.array([]), np.array([])
-        return self.x[self.selected_mask].copy(), self.y[self.selected_mask] - self.solver.evaluate(self.x[self.selected_mask])
+        x, y = self.get_selected_data()
+        return x, y - self.solver.evaluate(x, self.curve_params)
 
     def __len__(self):
         return len(self.x)
 
+    def nbytes(self) -> int:
+        # Memory of the data, shared with the caller if not owns_data
+        return self.x.nbytes + self.y.nbytes
+
     def x_range(self) -> tuple[float, float]:
         if len(self.x) == 0:
             return (0, 0)
-        return (self.x.min(), self.x.max())
+        return (self.x_min, self.x_max)
+
+
+class StreamingDataHolder(DataHolder):
+    # Bounded window over a live source: appended points are kept sorted by
+    # x, the oldest (smallest x) are dropped past `capacity` points. The
+    # window is a contiguous slice of a buffer of twice the capacity: appending
+    # writes after the window, and when the buffer is full the window is
+    # moved to a new buffer, so the views handed out before (plot, fits
+    # running in other threads) are never modified.
+    def __init__(self, solver: Solver, capacity: int = 1_000_000, dtype: str = "float64"):
+        self.capacity = capacity
+        self.buffer_x = np.zeros((0), dtype=dtype)
+        self.buffer_y = np.zeros((0), dtype=dtype)
+        self.start = 0  # Window of the buffers
+        self.stop = 0
+        super().__init__(solver, dtype)
+
+    def set_data(self, x: np.ndarray, y: np.ndarray):
+        # Replaces the window with the last `capacity` points
+        self.start, self.stop = 0, 0
+        self.buffer_x = np.zeros((0), dtype=self.dtype)
+        self.buffer_y = np.zeros((0), dtype=self.dtype)
+        self.append(x, y)
+
+    @profiled("data.append")
+    def append(self, x: np.ndarray, y: np.ndarray):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        finite = ~np.isnan(x)
+        x, y = x[finite], y[finite]
+        if len(x) == 0:
+            return
+        if np.any(x[1:] < x[:-1]):
+            order = np.argsort(x, kind='stable')
+            x, y = x[order], y[order]
+        if self.stop > self.start and x[0] < self.buffer_x[self.stop - 1]:
+            # Late points (rare for a live source): merged into a new window
+            x = np.concatenate((self.buffer_x[self.start:self.stop], x))
+            y = np.concatenate((self.buffer_y[self.start:self.stop], y))
+            order = np.argsort(x, kind='stable')
+            self.start = self.stop
+            self.move_window_(x[order], y[order])
+        else:
+            x, y = x[-self.capacity:], y[-self.capacity:]
+            # Drops the oldest points
+            overflow = self.stop - self.start + len(x) - self.capacity
+            if overflow > 0:
+                self.start += overflow
+            if self.stop + len(x) > len(self.buffer_x):
+                self.move_window_(x, y)
+            else:
+                self.buffer_x[self.stop:self.stop + len(x)] = x
+                self.buffer_y[self.stop:self.stop + len(y)] = y
+                self.stop += len(x)
+        self.update_window_()
+
+    def move_window_(self, x: np.ndarray, y: np.ndarray):
+        # New buffers holding the window followed by x, y, cut to the last
+        # `capacity` points
+        x = np.concatenate((self.buffer_x[self.start:self.stop], x))[-self.capacity:]
+        y = np.concatenate((self.buffer_y[self.start:self.stop], y))[-self.capacity:]
+        self.buffer_x = np.empty(2 * self.capacity, dtype=self.dtype)
+        self.buffer_y = np.empty(2 * self.capacity, dtype=self.dtype)
+        self.buffer_x[:len(x)] = x
+        self.buffer_y[:len(y)] = y
+        self.start, self.stop = 0, len(x)
+
+    def nbytes(self) -> int:
+        return self.buffer_x.nbytes + self.buffer_y.nbytes
+
+    def update_window_(self):
+        self.x = read_only_view(self.buffer_x[self.start:self.stop])
+        self.y = read_only_view(self.buffer_y[self.start:self.stop])
+        self.owns_data = True
+        self.n_valid = len(self.x)
+        self.x_min, self.x_max = float(self.x[0]), float(self.x[-1])
+        self.data_version += 1
+        self.update_selected_range_()
@@ -0,0 +1,185 @@
+import numpy as np
+
+from .data_holder import DataHolder
+from .profiling import profiled
+
+# Level of detail for plotting: only the points that can be told apart at
+# the current view and canvas width are drawn. Each pixel column keeps the
+# min and max of its points, so spikes and outliers stay visible, plus a
+# few regularly spaced points so that dense clouds still look filled.
+# The fit always uses the full resolution data of the DataHolder.
+
+# Block size of the finest level of the pyramid
+BASE_BLOCK_SIZE = 16
+
+
+class MinMaxPyramid:
+    # Indices of the min and max of y over blocks of 16, 32, 64... points,
+    # for y sorted by x. Takes about n / 4 indices in memory, stored in
+    # int32 below 2**31 points.
+    def __init__(self, y: np.ndarray):
+        self.y = y
+        self.levels: list[tuple[int, np.ndarray, np.ndarray]] = []
+        n_blocks = len(y) // BASE_BLOCK_SIZE
+        if n_blocks == 0:
+            return
+        index_dtype = np.int32 if len(y) < 2**31 else np.intp
+        blocks = y[:n_blocks * BASE_BLOCK_SIZE].reshape(n_blocks, BASE_BLOCK_SIZE)
+        offsets = np.arange(n_blocks, dtype=index_dtype) * BASE_BLOCK_SIZE
+        min_indices = offsets + np.argmin(blocks, axis=1).astype(index_dtype)
+        max_indices = offsets + np.argmax(blocks, axis=1).astype(index_dtype)
+        block_size = BASE_BLOCK_SIZE
+        self.levels.append((block_size, min_indices, max_indices))
+        while len(min_indices) > 1:
+            n_pairs = len(min_indices) // 2
+            min_indices = self.merge_(min_indices[:2 * n_pairs], np.less_equal)
+            max_indices = self.merge_(max_indices[:2 * n_pairs], np.greater_equal)
+            block_size *= 2
+            self.levels.append((block_size, min_indices, max_indices))
+
+    def nbytes(self) -> int:
+        return sum(min_indices.nbytes + max_indices.nbytes
+                   for _, min_indices, max_indices in self.levels)
+
+    def merge_(self, indices: np.ndarray, keep_first) -> np.ndarray:
+        first, second = indices[0::2], indices[1::2]
+        return np.where(keep_first(self.y[first], self.y[second]), first, second)
+
+    def query(self, start: int, stop: int, n_buckets: int) -> np.ndarray:
+        # Indices of the min and max points of about n_buckets buckets
+        # covering [start, stop)
+        count = stop - start
+        level = None
+        for block_size, min_indices, max_indices in self.levels:
+            if count / block_size <= n_buckets:
+                level = (block_size, min_indices, max_indices)
+                break
+        if level is None:
+            if not self.levels:
+                return np.arange(start, stop)
+            level = self.levels[-1]
+        block_size, min_indices, max_indices = level
+        first_block = -(-start // block_size)  # Rounded up
+        last_block = min(stop // block_size, len(min_indices))
+        if last_block <= first_block:
+            return minmax_indices(self.y, start, stop)
+        parts = [
+            minmax_indices(self.y, start, first_block * block_size),
+            min_indices[first_block:last_block],
+            max_indices[first_block:last_block],
+            minmax_indices(self.y, last_block * block_size, stop),
+        ]
+        return np.concatenate(parts)
+
+
+def minmax_indices(y: np.ndarray, start: int, stop: int) -> np.ndarray:
+    if stop <= start:
+        return np.zeros(0, dtype=np.intp)
+    segment = y[start:stop]
+    return start + np.array([np.argmin(segment), np.argmax(segment)], dtype=np.intp)
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, n_buckets: int,
+                    density: int) -> tuple[np.ndarray, np.ndarray]:
+    # Same decimation without a pyramid, for values that change every time
+    # (residuals). x must be sorted.
+    if len(x) <= n_buckets * (2 + density):
+        return x, y
+    bucket_size = -(-len(x) // n_buckets)
+    n_full = len(x) // bucket_size
+    blocks = y[:n_full * bucket_size].reshape(n_full, bucket_size)
+    offsets = np.arange(n_full) * bucket_size
+    indices = [
+        offsets + np.argmin(blocks, axis=1),
+        offsets + np.argmax(blocks, axis=1),
+        minmax_indices(y, n_full * bucket_size, len(y)),
+        np.arange(0, len(x), max(1, bucket_size // density)),
+    ]
+    indices = np.unique(np.concatenate(indices))
+    return x[indices], y[indices]
+
+
+class Decimator:
+    def __init__(self, data_holder: DataHolder, density: int = 4):
+        self.data_holder = data_holder
+        self.density = density  # Regularly spaced points per pixel column
+        self.data_version_ = -1
+
+    @profiled("decimation.pyramid")
+    def update_(self):
+        # Rebuilds the pyramid when the data changed. The data of the
+        # DataHolder is already sorted by x.
+        if self.data_version_ == self.data_holder.data_version:
+            return
+        self.data_version_ = self.data_holder.data_version
+        self.x, self.y = self.data_holder.x, self.data_holder.y
+        self.pyramid = MinMaxPyramid(self.y)
+
+    def nbytes(self) -> int:
+        # Memory of the pyramid, the data belongs to the DataHolder
+        return self.pyramid.nbytes() if self.data_version_ >= 0 else 0
+
+    def index_range_(self, x_min: float, x_max: float) -> tuple[int, int]:
+        view = self.data_holder.index_range(x_min, x_max)
+        return view.start, view.stop
+
+    def selected_range_(self) -> tuple[int, int]:
+        selected = self.data_holder.selected_slice
+        return selected.start, selected.stop
+
+    @profiled("decimation")
+    def decimate_(self, ranges: list[tuple[int, int]],
+                  n_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+        ranges = [(start, stop) for start, stop in ranges if stop > start]
+        total = sum(stop - start for start, stop in ranges)
+        if total == 0:
+            return np.array([]), np.array([])
+        parts = []
+        for start, stop in ranges:
+            count = stop - start
+            # Buckets are shared according to the number of points
+            buckets = max(1, round(n_buckets * count / total))
+            if count <= buckets * (2 + self.density):
+                parts.append(np.arange(start, stop))
+                continue
+            parts.append(self.pyramid.query(start, stop, buckets))
+            parts.append(np.arange(start, stop, max(1, count // (buckets * self.density))))
+        indices = np.unique(np.concatenate(parts))
+        return self.x[indices], self.y[indices]
+
+    def get_selected_data(self, x_range: tuple[float, float],
+                          n_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+        if len(self.data_holder) == 0:
+            return np.array([]), np.array([])
+        self.update_()
+        view_start, view_stop = self.index_range_(*x_range)
+        start, stop = self.selected_range_()
+        return self.decimate_(
+            [(max(start, view_start), min(stop, view_stop))], n_buckets)
+
+    def get_not_selected_data(self, x_range: tuple[float, float],
+                              n_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+        if len(self.data_holder) == 0:
+            return np.array([]), np.array([])
+        self.update_()
+        view_start, view_stop = self.index_range_(*x_range)
+        start, stop = self.selected_range_()
+        return self.decimate_([
+            (view_start, min(start, view_stop)),
+            (max(stop, view_start), view_stop),
+        ], n_buckets)
+
+    def get_residuals(self, x_range: tuple[float, float],
+                      n_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+        if len(self.data_holder) == 0 or not self.data_holder.solver.is_valid():
+            return np.array([]), np.array([])
+        self.update_()
+        view_start, view_stop = self.index_range_(*x_range)
+        start, stop = self.selected_range_()
+        start, stop = max(start, view_start), min(stop, view_stop)
+        if stop <= start:
+            return np.array([]), np.array([])
+        x = self.x[start:stop]
+        residuals = self.y[start:stop] - self.data_holder.solver.evaluate(
+            x, self.data_holder.curve_params)
+        return minmax_decimate(x, residuals, n_buckets, self.density)
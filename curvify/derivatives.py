@@ -0,0 +1,298 @@
+import ast
+import copy
+
+
+class NotDifferentiable(Exception):
+    pass
+
+
+def constant(value: float) -> ast.expr:
+    return ast.Constant(value=value)
+
+
+def is_constant(node: ast.expr, value: float | None = None) -> bool:
+    if not isinstance(node, ast.Constant) or isinstance(node.value, bool):
+        return False
+    if not isinstance(node.value, (int, float)):
+        return False
+    return value is None or node.value == value
+
+
+def np_call(function: str, *args: ast.expr) -> ast.expr:
+    return ast.Call(
+        func=ast.Attribute(value=ast.Name(id="np", ctx=ast.Load()),
+                           attr=function, ctx=ast.Load()),
+        args=list(args), keywords=[])
+
+
+# Node builders, with the trivial simplifications that keep the
+# derivative expressions small (0 * u = 0, 1 * u = u...)
+
+def add(a: ast.expr, b: ast.expr) -> ast.expr:
+    if is_constant(a, 0):
+        return b
+    if is_constant(b, 0):
+        return a
+    return ast.BinOp(left=a, op=ast.Add(), right=b)
+
+
+def sub(a: ast.expr, b: ast.expr) -> ast.expr:
+    if is_constant(b, 0):
+        return a
+    if is_constant(a, 0):
+        return neg(b)
+    return ast.BinOp(left=a, op=ast.Sub(), right=b)
+
+
+def mul(a: ast.expr, b: ast.expr) -> ast.expr:
+    if is_constant(a, 0) or is_constant(b, 0):
+        return constant(0)
+    if is_constant(a, 1):
+        return b
+    if is_constant(b, 1):
+        return a
+    return ast.BinOp(left=a, op=ast.Mult(), right=b)
+
+
+def div(a: ast.expr, b: ast.expr) -> ast.expr:
+    if is_constant(a, 0):
+        return constant(0)
+    if is_constant(b, 1):
+        return a
+    return ast.BinOp(left=a, op=ast.Div(), right=b)
+
+
+def power(a: ast.expr, b: ast.expr) -> ast.expr:
+    if is_constant(b, 1):
+        return a
+    if is_constant(b, 0):
+        return constant(1)
+    return ast.BinOp(left=a, op=ast.Pow(), right=b)
+
+
+def neg(a: ast.expr) -> ast.expr:
+    if is_constant(a, 0):
+        return a
+    return ast.UnaryOp(op=ast.USub(), operand=a)
+
+
+def depends_on(node: ast.AST, name: str) -> bool:
+    return any(isinstance(child, ast.Name) and child.id == name
+               for child in ast.walk(node))
+
+
+def free_names(node: ast.AST) -> set[str]:
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+
+def is_np_function(node: ast.expr) -> str | None:
+    # Returns "exp" for np.exp, None if the node is not a numpy function
+    if (isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Name) and node.value.id == "np"):
+        return node.attr
+    return None
+
+
+# Derivative of np.<function>(u) with respect to u
+def d_exp(u): return np_call("exp", u)
+def d_expm1(u): return np_call("exp", u)
+def d_exp2(u): return mul(np_call("exp2", u), np_call("log", constant(2)))
+def d_log(u): return div(constant(1), u)
+def d_log10(u): return div(constant(1), mul(u, np_call("log", constant(10))))
+def d_log2(u): return div(constant(1), mul(u, np_call("log", constant(2))))
+def d_log1p(u): return div(constant(1), add(constant(1), u))
+def d_sqrt(u): return div(constant(0.5), np_call("sqrt", u))
+def d_square(u): return mul(constant(2), u)
+def d_sin(u): return np_call("cos", u)
+def d_cos(u): return neg(np_call("sin", u))
+def d_tan(u): return div(constant(1), power(np_call("cos", u), constant(2)))
+def d_arcsin(u): return div(constant(1), np_call("sqrt", sub(constant(1), power(u, constant(2)))))
+def d_arccos(u): return neg(d_arcsin(u))
+def d_arctan(u): return div(constant(1), add(constant(1), power(u, constant(2))))
+def d_sinh(u): return np_call("cosh", u)
+def d_cosh(u): return np_call("sinh", u)
+def d_tanh(u): return sub(constant(1), power(np_call("tanh", u), constant(2)))
+def d_abs(u): return np_call("sign", u)
+
+
+UNARY_DERIVATIVES = {
+    "exp": d_exp, "expm1": d_expm1, "exp2": d_exp2,
+    "log": d_log, "log10": d_log10, "log2": d_log2, "log1p": d_log1p,
+    "sqrt": d_sqrt, "square": d_square,
+    "sin": d_sin, "cos": d_cos, "tan": d_tan,
+    "arcsin": d_arcsin, "arccos": d_arccos, "arctan": d_arctan,
+    "sinh": d_sinh, "cosh": d_cosh, "tanh": d_tanh,
+    "abs": d_abs, "absolute": d_abs,
+}
+
+
+def expand_polyval(node: ast.Call) -> ast.expr:
+    # np.polyval([c0, c1, ..., cn], x) -> c0 * x**n + ... + cn
+    coefs, x = node.args
+    if not isinstance(coefs, (ast.List, ast.Tuple)):
+        raise NotDifferentiable("np.polyval needs a literal list of coefficients")
+    degree = len(coefs.elts) - 1
+    result = constant(0)
+    for i, coef in enumerate(coefs.elts):
+        result = add(result, mul(coef, power(x, constant(degree - i))))
+    return result
+
+
+def expand_fourier(node: ast.Call) -> ast.expr:
+    # fourier(x, f0, [a0, a1, b1, ...]) -> a0 + a1 * cos(w0 x) + b1 * sin(w0 x) + ...
+    x, f0, coefs = node.args
+    if not isinstance(coefs, (ast.List, ast.Tuple)) or len(coefs.elts) % 2 == 0:
+        raise NotDifferentiable("fourier needs an odd literal list of coefficients")
+    w0 = mul(mul(constant(2), ast.Attribute(
+        value=ast.Name(id="np", ctx=ast.Load()), attr="pi", ctx=ast.Load())), f0)
+    result = coefs.elts[0]
+    for i in range(1, len(coefs.elts) // 2 + 1):
+        angle = mul(mul(constant(i), w0), x)
+        result = add(result, mul(coefs.elts[2 * i - 1], np_call("cos", angle)))
+        result = add(result, mul(coefs.elts[2 * i], np_call("sin", angle)))
+    return result
+
+
+def is_fourier_kernel(node: ast.expr) -> bool:
+    # fourier(x, f0, [a0, a1, b1, ...]), differentiated with fourier_basis
+    # (see differentiate_fourier). Expanded instead when the first argument
+    # depends on the parameters.
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id == "fourier" and len(node.args) == 3 and not node.keywords
+            and isinstance(node.args[2], (ast.List, ast.Tuple))
+            and len(node.args[2].elts) % 2 == 1
+            and free_names(node.args[0]) <= {"x", "np"})
+
+
+def differentiate_fourier(node: ast.Call, name: str) -> ast.expr:
+    # The derivatives with respect to the coefficients are the rows of
+    # fourier_basis(x, f0, n), computed once for all the parameters (common
+    # subexpression). With respect to f0:
+    # sum(k 2 pi x (bk cos(k w0 x) - ak sin(k w0 x)))
+    x, f0, coefs = node.args
+    coefs = coefs.elts
+    basis = ast.Call(func=ast.Name(id="fourier_basis", ctx=ast.Load()),
+                     args=[x, f0, constant(len(coefs) // 2)], keywords=[])
+
+    def row(i: int) -> ast.expr:
+        return ast.Subscript(value=copy.deepcopy(basis), slice=constant(i), ctx=ast.Load())
+
+    result = constant(0)
+    for i, coef in enumerate(coefs):
+        result = add(result, mul(differentiate(coef, name), row(i)))
+    d_f0 = differentiate(f0, name)
+    if not is_constant(d_f0, 0):
+        harmonics = constant(0)
+        for k in range(1, len(coefs) // 2 + 1):
+            harmonic = sub(mul(coefs[2 * k], row(2 * k - 1)), mul(coefs[2 * k - 1], row(2 * k)))
+            harmonics = add(harmonics, mul(constant(k), harmonic))
+        w = mul(mul(constant(2), ast.Attribute(
+            value=ast.Name(id="np", ctx=ast.Load()), attr="pi", ctx=ast.Load())), x)
+        result = add(result, mul(mul(w, harmonics), d_f0))
+    return result
+
+
+class Expander(ast.NodeTransformer):
+    # Rewrites the helpers that have no direct derivative rule
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        if node.keywords:
+            return node
+        if is_np_function(node.func) == "polyval" and len(node.args) == 2:
+            return expand_polyval(node)
+        if is_np_function(node.func) == "power" and len(node.args) == 2:
+            return power(*node.args)
+        if isinstance(node.func, ast.Name) and node.func.id == "fourier" \
+                and len(node.args) == 3 and not is_fourier_kernel(node):
+            return expand_fourier(node)
+        return node
+
+
+def expand(tree: ast.expr) -> ast.expr:
+    return Expander().visit(copy.deepcopy(tree))
+
+
+def differentiate(node: ast.expr, name: str) -> ast.expr:
+    # Derivative of an (expanded) expression with respect to the variable name
+    if not depends_on(node, name):
+        return constant(0)
+    if isinstance(node, ast.Name):
+        return constant(1)
+    if isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, ast.USub):
+            return neg(differentiate(node.operand, name))
+        if isinstance(node.op, ast.UAdd):
+            return differentiate(node.operand, name)
+    if isinstance(node, ast.BinOp):
+        a, b = node.left, node.right
+        da, db = differentiate(a, name), differentiate(b, name)
+        if isinstance(node.op, ast.Add):
+            return add(da, db)
+        if isinstance(node.op, ast.Sub):
+            return sub(da, db)
+        if isinstance(node.op, ast.Mult):
+            return add(mul(da, b), mul(a, db))
+        if isinstance(node.op, ast.Div):
+            return sub(div(da, b), div(mul(a, db), power(b, constant(2))))
+        if isinstance(node.op, ast.Pow):
+            if is_constant(db, 0):
+                # u**n -> n * u**(n-1) * du
+                return mul(mul(b, power(a, sub(b, constant(1)))), da)
+            if is_constant(da, 0):
+                # n**u -> n**u * log(n) * du
+                return mul(mul(node, np_call("log", a)), db)
+            # u**v -> u**v * (dv * log(u) + v * du / u)
+            return mul(node, add(mul(db, np_call("log", a)), div(mul(b, da), a)))
+    if is_fourier_kernel(node):
+        return differentiate_fourier(node, name)
+    if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords:
+        function = is_np_function(node.func)
+        if function is None and isinstance(node.func, ast.Name) and node.func.id == "abs":
+            function = "abs"
+        if function in UNARY_DERIVATIVES:
+            u = node.args[0]
+            return mul(UNARY_DERIVATIVES[function](u), differentiate(u, name))
+    raise NotDifferentiable(f"Can't differentiate {ast.unparse(node)} with respect to {name}")
+
+
+def gradient(tree: ast.Expression, param_names: tuple[str, ...]) -> list[ast.expr]:
+    # Partial derivatives of the model with respect to each parameter
+    body = expand(tree.body)
+    return [differentiate(body, name) for name in param_names]
+
+
+class CommonSubexpressions(ast.NodeTransformer):
+    # Replaces the subexpressions used several times by temporary variables
+    def __init__(self, counts: dict[str, int]):
+        self.counts = counts
+        self.names: dict[str, str] = {}
+        self.assignments: list[ast.Assign] = []
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call)):
+            return super().generic_visit(node)
+        key = ast.dump(node)
+        if key in self.names:
+            return ast.Name(id=self.names[key], ctx=ast.Load())
+        node = super().generic_visit(node)
+        if self.counts.get(key, 0) < 2:
+            return node
+        name = f"_t{len(self.names)}"
+        self.names[key] = name
+        self.assignments.append(ast.Assign(
+            targets=[ast.Name(id=name, ctx=ast.Store())], value=node))
+        return ast.Name(id=name, ctx=ast.Load())
+
+
+def eliminate_common_subexpressions(
+        expressions: list[ast.expr]) -> tuple[list[ast.Assign], list[ast.expr]]:
+    counts: dict[str, int] = {}
+    for expression in expressions:
+        for node in ast.walk(expression):
+            if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Call)):
+                key = ast.dump(node)
+                counts[key] = counts.get(key, 0) + 1
+    transformer = CommonSubexpressions(counts)
+    expressions = [transformer.visit(copy.deepcopy(expression))
+                   for expression in expressions]
+    return transformer.assignments, expressions
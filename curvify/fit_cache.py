@@ -0,0 +1,139 @@
+import copy
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from .models_library import normalize_model
+
+# Memoization of Solver.fit. A fit is identified by the model, the content
+# of the data, and the bounds, locks and starting values of the parameters.
+# The results are stored for the starting values of the fit and for the
+# fitted values (fitting again from a solution gives the same solution).
+# Cached solutions also seed the fits of nearby configurations (same model
+# and data, other starting values).
+
+# Largest writable array hashed on each fit (bytes, about 10 ms). The fits
+# of larger writable arrays are not cached.
+HASH_MAX_BYTES = 1 << 22
+
+
+def hash_array(array: np.ndarray) -> str:
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((array.dtype.str, array.shape)).encode())
+    digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+class ArrayHashes:
+    # Content hashes of read-only arrays, remembered by memory location so
+    # that the views of the same data (DataHolder.get_selected_data returns
+    # a new view each time) are hashed once. Only arrays whose memory can't
+    # be written are remembered: the array and the array owning its memory
+    # (a read-only view of a writable array can still change through that
+    # array, e.g. data given to DataHolder without a copy). The others are
+    # hashed every time, or not at all above HASH_MAX_BYTES (None).
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self.hashes_: OrderedDict[tuple, tuple[weakref.ref, str]] = OrderedDict()
+        self.lock_ = threading.Lock()
+
+    def get(self, array: np.ndarray) -> str | None:
+        base = array
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        if array.flags.writeable or base.flags.writeable:
+            return hash_array(array) if array.nbytes <= HASH_MAX_BYTES else None
+        key = (array.__array_interface__["data"][0], array.shape, array.strides, array.dtype.str)
+        with self.lock_:
+            entry = self.hashes_.get(key)
+            if entry is not None and entry[0]() is base:
+                self.hashes_.move_to_end(key)
+                return entry[1]
+        digest = hash_array(array)
+        with self.lock_:
+            self.hashes_[key] = (weakref.ref(base), digest)
+            if len(self.hashes_) > self.max_size:
+                self.hashes_.popitem(last=False)
+        return digest
+
+
+array_hashes = ArrayHashes()
+
+
+def fit_key(solver, x: np.ndarray, y: np.ndarray) -> tuple | None:
+    # (configuration, starting values), None when the data is not hashed.
+    # Starting values are part of the key for the parameters that are locked
+    # or initialized, the others are estimated from the data.
+    x_hash, y_hash = array_hashes.get(np.asarray(x)), array_hashes.get(np.asarray(y))
+    if x_hash is None or y_hash is None:
+        return None
+    params = solver.get_params()
+    configuration = (
+        normalize_model(solver.compiled_model_.expression), x_hash, y_hash,
+        tuple((param.name, param.locked, param.min_value, param.max_value) for param in params),
+        (solver.fit_method, solver.use_analytic_jacobian, solver.use_initial_guess,
+         solver.coarse_to_fine, solver.coarse_to_fine_tolerance))
+    start = tuple(param.value if param.locked or param.initialized else None
+                  for param in params)
+    return configuration, start
+
+
+def start_key(key: tuple, solver, values: dict[str, float]) -> tuple:
+    # Key of the same configuration for other starting values, e.g. the
+    # fitted values (the data is not hashed again)
+    return key[0], tuple(values[param.name] for param in solver.get_params())
+
+
+class FitCache:
+    # LRU of fit results. Shared by the solvers of a process, the fits of
+    # the interface run in a worker thread.
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.results_: OrderedDict[tuple, dict] = OrderedDict()
+        self.lock_ = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> dict | None:
+        with self.lock_:
+            results = self.results_.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results_.move_to_end(key)
+            return copy.deepcopy(results)
+
+    def put(self, keys: list[tuple], results: dict):
+        # keys: the same fit for several starting values
+        with self.lock_:
+            results = copy.deepcopy(results)
+            for key in keys:
+                self.results_[key] = results
+                self.results_.move_to_end(key)
+            while len(self.results_) > self.max_size:
+                self.results_.popitem(last=False)
+
+    def seed(self, key: tuple) -> dict[str, float] | None:
+        # Fitted values of the most recent fit of the same configuration
+        # (model, data, locks and bounds) from other starting values
+        configuration, _ = key
+        with self.lock_:
+            for other, results in reversed(self.results_.items()):
+                if other[0] == configuration:
+                    return dict(results["params"])
+        return None
+
+    def clear(self):
+        with self.lock_:
+            self.results_.clear()
+
+    def __len__(self):
+        return len(self.results_)
+
+
+fit_cache = FitCache()
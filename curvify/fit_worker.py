@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+
+from .solver import Solver
+
+
+class FitWorker(QThread):
+    # Runs Solver.fit outside of the Qt main thread. The solver parameters
+    # are not modified, the results are applied by the receiver of
+    # fit_finished (see Solver.apply_fit_results).
+    progress = Signal(int, float, object)  # Model calls, cost, parameters
+    fit_finished = Signal(bool, object)  # Success, results
+
+    def __init__(self, solver: Solver, x: np.ndarray, y: np.ndarray, parent=None,
+                 global_fit: bool = False):
+        super().__init__(parent)
+        self.solver = solver
+        self.x = x
+        self.y = y
+        # Multi-start fit (Solver.fit_global), progress then reports the
+        # number of local fits done and the best cost
+        self.global_fit = global_fit
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        fit = self.solver.fit_global if self.global_fit else self.solver.fit
+        ok, results = fit(
+            self.x, self.y, update_params=False,
+            progress=self.progress.emit, cancel_event=self.cancel_event)
+        self.fit_finished.emit(ok, results)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+
+class UncertaintyWorker(QThread):
+    # Runs Solver.estimate_uncertainty outside of the Qt main thread
+    progress = Signal(int, int)  # Samples done, number of samples
+    uncertainty_finished = Signal(bool, object)  # Success, results
+
+    def __init__(self, solver: Solver, x: np.ndarray, y: np.ndarray, parent=None,
+                 method: str = "residuals", n_samples: int = 500):
+        super().__init__(parent)
+        self.solver = solver
+        self.x = x
+        self.y = y
+        self.method = method
+        self.n_samples = n_samples
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        ok, results = self.solver.estimate_uncertainty(
+            self.x, self.y, method=self.method, n_samples=self.n_samples,
+            progress=self.progress.emit, cancel_event=self.cancel_event)
+        self.uncertainty_finished.emit(ok, results)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
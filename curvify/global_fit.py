@@ -0,0 +1,192 @@
+import threading
+import time
+from dataclasses import replace
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable
+
+import numpy as np
+
+from .parallel import default_workers, process_pool
+
+# Multi-start fitting: local fits from many starting points spread over the
+# parameter bounds, the best minimum is kept. Runs the local fits in a
+# process pool, the data is sent once to each worker process.
+
+# Half width of the sampling interval of an unbounded parameter, relative to
+# its starting value (at least 1)
+UNBOUNDED_RANGE = 10.0
+
+# Below this number of points times starts, the fits run in this process
+# (starting worker processes would take longer than the fits)
+MIN_PARALLEL_SIZE = 1_000_000
+
+
+def sampling_bounds(values: np.ndarray, lower_bounds: np.ndarray,
+                    upper_bounds: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Finite box to sample from: the bounds when finite, otherwise an
+    # interval around the starting value
+    half_width = UNBOUNDED_RANGE * np.maximum(np.abs(values), 1.0)
+    lower = np.where(np.isfinite(lower_bounds), lower_bounds, values - half_width)
+    upper = np.where(np.isfinite(upper_bounds), upper_bounds, values + half_width)
+    # One sided bounds: the interval starts from the bound
+    lower = np.where(np.isfinite(upper_bounds) & ~np.isfinite(lower_bounds),
+                     np.minimum(lower, upper - 2 * half_width), lower)
+    upper = np.where(np.isfinite(lower_bounds) & ~np.isfinite(upper_bounds),
+                     np.maximum(upper, lower + 2 * half_width), upper)
+    return lower, upper
+
+
+def sample_starts(lower: np.ndarray, upper: np.ndarray, n_starts: int,
+                  sampling: str = "sobol", seed: int | None = 0) -> np.ndarray:
+    # n_starts points of the box, shape (n_starts, len(lower))
+    from scipy.stats import qmc  # Imported on first use (startup time)
+    if sampling == "sobol":
+        sampler = qmc.Sobol(len(lower), scramble=True, seed=seed)
+        unit = sampler.random_base2(int(np.ceil(np.log2(max(n_starts, 1)))))[:n_starts]
+    elif sampling == "lhs":
+        unit = qmc.LatinHypercube(len(lower), seed=seed).random(n_starts)
+    else:
+        raise ValueError(f"Unknown sampling {sampling}, use 'sobol' or 'lhs'")
+    return qmc.scale(unit, lower, upper) if np.all(upper > lower) \
+        else lower + unit * (upper - lower)
+
+
+def make_solver(expression: str, params: list, fit_method: str):
+    # Copy of a solver for the sampled starts: values are used as given
+    from .solver import Solver
+    solver = Solver()
+    solver.update_model(expression)
+    solver.params = [replace(param, initialized=True) for param in params]
+    solver.fit_method = fit_method
+    # Local fits from sampled starts would fill the cache and replace the
+    # warm start of the model
+    solver.use_fit_cache = False
+    return solver
+
+
+def fit_from(solver, x: np.ndarray, y: np.ndarray, start: dict[str, float],
+             cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+    for param in solver.params:
+        param.value = start.get(param.name, param.value)
+    return solver.fit(x, y, update_params=False, cancel_event=cancel_event)
+
+
+# State of a worker process, set once by init_worker
+worker_state = {}
+
+
+def init_worker(expression: str, params: list, x: np.ndarray, y: np.ndarray, fit_method: str):
+    worker_state.update(solver=make_solver(expression, params, fit_method), x=x, y=y)
+
+
+def fit_start(start: dict[str, float]) -> tuple[bool, dict]:
+    return fit_from(worker_state["solver"], worker_state["x"], worker_state["y"], start)
+
+
+def fit_cost(results: dict, n_points: int) -> float:
+    return float(results["RMSE"]) ** 2 * n_points
+
+
+def same_cost(a: float, b: float, rtol: float) -> bool:
+    # Minima are compared by their cost: symmetric solutions (phase + 2 pi,
+    # opposite amplitude and phase + pi...) are the same minimum
+    return abs(a - b) <= rtol * max(abs(a), abs(b)) + 1e-300
+
+
+def multi_start_fit(solver, x: np.ndarray, y: np.ndarray, n_starts: int = 32,
+                    sampling: str = "sobol", workers: int | None = None,
+                    agreement: int = 4, rtol: float = 1e-4, seed: int | None = 0,
+                    progress: Callable[[int, float, np.ndarray], None] | None = None,
+                    cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+    # Fits from the current starting point of the solver and from n_starts - 1
+    # sampled ones. Stops early when `agreement` fits found the best minimum.
+    # Returns the results of the best fit, with a "global" entry describing
+    # the other minima. The solver is not modified.
+    params_list = list(solver.get_params())
+    free = [param for param in params_list if not param.locked]
+    if not free:
+        return False, {}
+    # Sampled around the initial guess for the unbounded parameters
+    initial_guess, _ = solver.guess_initial_values_(x, y, params_list)
+    values = np.array([initial_guess.get(param.name, param.value) for param in free])
+    lower, upper = sampling_bounds(
+        values, np.array([param.min_value for param in free]),
+        np.array([param.max_value for param in free]))
+    starts = [{}]  # The current starting point (with the initial guess, if any)
+    for point in sample_starts(lower, upper, n_starts - 1, sampling, seed):
+        starts.append({param.name: float(value) for param, value in zip(free, point)})
+
+    workers = workers or default_workers()
+    if len(x) * n_starts < MIN_PARALLEL_SIZE:
+        workers = 1
+    fits = []  # Successful local fits: (cost, results)
+    n_done = 0
+    start_time = time.perf_counter()
+
+    def add_result(ok: bool, results: dict) -> bool:
+        # Returns True when enough fits agree on the best minimum
+        nonlocal n_done
+        n_done += 1
+        if ok:
+            fits.append((fit_cost(results, len(y)), results))
+            fits.sort(key=lambda fit: fit[0])
+        if progress is not None and fits:
+            best = fits[0][1]
+            progress(n_done, fits[0][0], np.array(list(best["params"].values())))
+        if not fits:
+            return False
+        n_agree = sum(1 for cost, _ in fits if same_cost(cost, fits[0][0], rtol))
+        return n_agree >= agreement
+
+    # The first start keeps the initial guess: fitted with the solver itself
+    solver_args = (solver.compiled_model_.expression, params_list, solver.fit_method)
+    if workers == 1:
+        local_solver = make_solver(*solver_args)
+        for start in starts:
+            if cancel_event is not None and cancel_event.is_set():
+                return False, {"cancelled": True}
+            if start:
+                ok, results = fit_from(local_solver, x, y, start, cancel_event)
+            else:
+                ok, results = solver.fit(x, y, update_params=False, cancel_event=cancel_event)
+            if add_result(ok, results):
+                break
+    else:
+        expression, params, fit_method = solver_args
+        executor = process_pool(min(workers, len(starts) - 1), init_worker,
+                                (expression, params, x, y, fit_method))
+        try:
+            pending = {executor.submit(fit_start, start) for start in starts[1:]}
+            stop = add_result(*solver.fit(x, y, update_params=False, cancel_event=cancel_event))
+            while pending and not stop:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False, {"cancelled": True}
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stop = add_result(*future.result()) or stop
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    if cancel_event is not None and cancel_event.is_set():
+        return False, {"cancelled": True}
+    if not fits:
+        return False, {}
+
+    best_cost, best = fits[0]
+    minima = []  # Distinct minima, best first
+    for cost, results in fits:
+        if not any(same_cost(cost, other, rtol) for other, _ in minima):
+            minima.append((cost, results))
+    all_params = np.array([list(results["params"].values()) for _, results in fits])
+    best = dict(best)
+    best["global"] = {
+        "n_starts": len(starts),
+        "n_fits": n_done,  # Fits run before stopping
+        "n_success": len(fits),
+        "n_agree": sum(1 for cost, _ in fits if same_cost(cost, best_cost, rtol)),
+        "minima": [{"cost": cost, "params": results["params"]} for cost, results in minima],
+        # Standard deviation of each parameter over all the local fits
+        "params_spread": dict(zip(best["params"], np.std(all_params, axis=0).tolist())),
+        "time": time.perf_counter() - start_time,
+    }
+    return True, best
+
@@ -2,48 +2,88 @@
 from PySide6 import QtGui
 from PySide6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, \
     QWidget, QPushButton, QLineEdit, QGridLayout, QLabel, QCheckBox, QComboBox, \
-    QGroupBox, QLayout, QSizePolicy
-from PySide6.QtCore import Qt, QTimer
+    QGroupBox, QLayout, QSizePolicy, QFileDialog, QSpinBox
+from PySide6.QtCore import Qt, QTimer, QSignalBlocker
 from qtrangeslider import QRangeSlider
 
 import sys
 import os
 from pathlib import Path
 from functools import partial
+from typing import TYPE_CHECKING
 import numpy as np
 
+from .coarse_to_fine import COARSE_MIN_POINTS
 from .csv_dialog import CSVDialog
-from .data_holder import DataHolder
-from .plot_widget import PlotWidget
+from .data_dialog import DataDialog
+from .data_holder import DataHolder, StreamingDataHolder
+from .fit_worker import FitWorker, UncertaintyWorker
+from .history import FitHistory, FitState, copy_params
+from .model_selection_dialog import ModelSelectionDialog, ModelSelectionWorker
+from .profiling import profiler
+from .stream_worker import StreamWorker
 from .solver import Param, Solver
+from .uncertainty import METHODS as UNCERTAINTY_METHODS
+from .model_families import model_families, find_family
 from .models_library import models_library, find_model
+from .loaders import loaders
 
 import importlib.resources
 
+if TYPE_CHECKING:
+    from .plot_widget import PlotWidget
+
 
 def get_icon():
     with importlib.resources.path("curvify.icons", "app_icon.png") as icon_path:
         return QtGui.QIcon(str(icon_path))
 
 
+# Minimum time between two automatic refits of a live stream (milliseconds)
+STREAM_REFIT_INTERVAL_MS = 500
+
+# Refresh period of the profiling readout (milliseconds)
+PROFILE_INTERVAL_MS = 500
+
+# Spans shown in the status bar when profiling, the tooltip lists them all
+PROFILE_SUMMARY = [
+    ("update_model", "model"), ("fit", "fit"), ("evaluate", "eval"),
+    ("data.selection", "select"), ("plot.draw", "draw"), ("plot.blit", "blit"),
+]
+
+
 class MainWindow(QMainWindow):
     def __init__(self,
                  x_array: np.ndarray | None,
                  y_array: np.ndarray | None,
                  default_function: str | None,
-                 csv_file: str | None):
+                 csv_file: str | None,
+                 data_file: str | None = None,
+                 stream: str | None = None,
+                 stream_window: int = 1_000_000,
+                 backend: str = "numpy",
+                 dtype: str = "float64"):
         super().__init__()
 
         self.solver = Solver()
-        self.data_holder = DataHolder(self.solver)
+        self.solver.set_backend(backend)
+        # dtype: storage of the data, "float32" halves the memory
+        if stream is not None:
+            self.data_holder = StreamingDataHolder(self.solver, stream_window, dtype)
+        else:
+            self.data_holder = DataHolder(self.solver, dtype)
 
         # QT
         self.setWindowTitle("Curvify")
         self.setGeometry(100, 100, 900, 600)
         self.setWindowIcon(get_icon())
 
-        self.plot_widget = PlotWidget(self, self.data_holder)
-        self.plot_widget.setMinimumSize(400, 400)
+        # The plot (matplotlib) is created once the window is shown, see
+        # create_plot_widget
+        self.plot_widget: "PlotWidget | None" = None
+        self.plot_placeholder = QLabel("Loading plot...")
+        self.plot_placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.plot_placeholder.setMinimumSize(400, 400)
         self.range_selection_slider = QRangeSlider(Qt.Orientation.Horizontal)
         self.range_selection_slider.setValue((0, 100))
         self.range_selection_slider.valueChanged.connect(
@@ -54,16 +94,83 @@ class MainWindow(QMainWindow):
         self.function_text_edit = QLineEdit()
         self.function_text_edit.setPlaceholderText("Enter your function here")
         self.function_text_edit.textChanged.connect(self.update_function_text)
+        self.function_text_edit.returnPressed.connect(self.apply_function_text)
+        # Waits for the user to stop typing before recompiling the model
+        self.model_update_timer = QTimer(self)
+        self.model_update_timer.setSingleShot(True)
+        self.model_update_timer.setInterval(300)
+        self.model_update_timer.timeout.connect(self.apply_function_text)
         self.model_combo = QComboBox()
         self.model_combo.addItems(models_library.keys())
-        self.model_combo.currentTextChanged.connect(
-            lambda text: self.function_text_edit.setText(
-                models_library[text]) if text != '' else None
-        )
+        self.model_combo.addItems(model_families.keys())
+        self.model_combo.currentTextChanged.connect(self.select_library_model)
+        # Order of the model families (degree, number of peaks...), shown
+        # when the function is a member of a family
+        self.order_label = QLabel()
+        self.order_spin = QSpinBox()
+        self.order_spin.valueChanged.connect(self.change_model_order)
+        self.auto_select_button = QPushButton("Auto-select model")
+        self.auto_select_button.setToolTip(
+            "Fit the models of the library to the selected data and rank "
+            "them by information criterion (AIC, BIC)")
+        self.auto_select_button.clicked.connect(self.auto_select_model)
+        self.auto_select_button.setEnabled(False)
 
         self.fit_button = QPushButton("Fit")
         self.fit_button.clicked.connect(self.fit)
         self.fit_button.setEnabled(False)
+        self.cancel_fit_button = QPushButton("Cancel")
+        self.cancel_fit_button.clicked.connect(self.cancel_fit)
+        self.cancel_fit_button.setEnabled(False)
+        self.live_preview_checkbox = QCheckBox("Live preview")
+        self.live_preview_checkbox.setToolTip(
+            "Plot the intermediate parameters while fitting")
+        self.global_fit_checkbox = QCheckBox("Global fit")
+        self.global_fit_checkbox.setToolTip(
+            "Fit from many starting points within the parameter bounds "
+            "and keep the best result (locked parameters are kept)")
+        self.coarse_to_fine_checkbox = QCheckBox("Coarse-to-fine")
+        self.coarse_to_fine_checkbox.setToolTip(
+            "Fit subsamples of the data first, then refine on all the points "
+            f"(selections of more than {COARSE_MIN_POINTS:,} points)")
+        self.fit_status_label = QLabel()
+        self.fit_worker: FitWorker | None = None
+
+        self.uncertainty_button = QPushButton("Uncertainty")
+        self.uncertainty_button.setToolTip(
+            "Refit resampled data around the fitted parameters to estimate "
+            "confidence intervals and the confidence band of the model")
+        self.uncertainty_button.clicked.connect(self.estimate_uncertainty)
+        self.uncertainty_button.setEnabled(False)
+        self.uncertainty_method_combo = QComboBox()
+        self.uncertainty_method_combo.addItems(UNCERTAINTY_METHODS)
+        self.uncertainty_worker: UncertaintyWorker | None = None
+        self.uncertainty_results: dict | None = None
+        self.fit_results: dict | None = None
+
+        # Undo/redo of the fits, without fitting again
+        self.history = FitHistory()
+        self.pre_fit_state_: FitState | None = None  # None: not recorded
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setShortcut(QtGui.QKeySequence.StandardKey.Undo)
+        self.undo_button.setToolTip("Back to the state before the last fit")
+        self.undo_button.clicked.connect(self.undo_fit)
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setShortcut(QtGui.QKeySequence.StandardKey.Redo)
+        self.redo_button.clicked.connect(self.redo_fit)
+        self.update_history_buttons()
+
+        # Live stream: the model is refitted as the data arrives, warm
+        # started from the previous parameters, at most every
+        # STREAM_REFIT_INTERVAL_MS and never while a fit is running
+        self.follow_stream_checkbox = QCheckBox("Refit as data arrives")
+        self.follow_stream_checkbox.setChecked(True)
+        self.follow_stream_checkbox.setVisible(stream is not None)
+        self.stream_worker: StreamWorker | None = None
+        self.stream_changed_ = False  # New points since the last refit
+        self.stream_refit_timer = QTimer(self)
+        self.stream_refit_timer.setInterval(STREAM_REFIT_INTERVAL_MS)
+        self.stream_refit_timer.timeout.connect(self.refit_stream)
 
         self.parameters_grid_layout = QGridLayout()
         self.parameters_grid_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
@@ -82,6 +189,7 @@ class MainWindow(QMainWindow):
         main_layout = QVBoxLayout()
         h_layout = QHBoxLayout()
         right_layout = QVBoxLayout()
+        self.right_layout = right_layout
         left_layout = QVBoxLayout()
 
         main_widget = QWidget()
@@ -103,11 +211,32 @@ class MainWindow(QMainWindow):
         left_panel.setFixedWidth(300)
 
         left_layout.addWidget(self.model_combo)
+        order_layout = QHBoxLayout()
+        order_layout.addWidget(self.order_label)
+        order_layout.addWidget(self.order_spin)
+        left_layout.addLayout(order_layout)
+        left_layout.addWidget(self.auto_select_button)
         left_layout.addWidget(parameters_grid)
         left_layout.addWidget(results_group_box)
-        left_layout.addWidget(self.fit_button)
-
-        right_layout.addWidget(self.plot_widget)
+        left_layout.addWidget(self.fit_status_label)
+        left_layout.addWidget(self.live_preview_checkbox)
+        left_layout.addWidget(self.global_fit_checkbox)
+        left_layout.addWidget(self.coarse_to_fine_checkbox)
+        left_layout.addWidget(self.follow_stream_checkbox)
+        fit_buttons_layout = QHBoxLayout()
+        fit_buttons_layout.addWidget(self.fit_button)
+        fit_buttons_layout.addWidget(self.cancel_fit_button)
+        left_layout.addLayout(fit_buttons_layout)
+        history_layout = QHBoxLayout()
+        history_layout.addWidget(self.undo_button)
+        history_layout.addWidget(self.redo_button)
+        left_layout.addLayout(history_layout)
+        uncertainty_layout = QHBoxLayout()
+        uncertainty_layout.addWidget(self.uncertainty_method_combo)
+        uncertainty_layout.addWidget(self.uncertainty_button)
+        left_layout.addLayout(uncertainty_layout)
+
+        right_layout.addWidget(self.plot_placeholder)
         right_layout.addWidget(self.range_selection_slider)
 
         # Drop event
@@ -117,19 +246,43 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(main_widget)
 
+        # Memory used by the data and the plot pyramid
+        self.memory_label = QLabel()
+        self.statusBar().addPermanentWidget(self.memory_label)
+
         self.model_combo.setCurrentIndex(0)
         self.function_text_edit.setText(models_library["Linear"])
         self.solver.update_model(models_library["Linear"])
+        self.update_model_combo(models_library["Linear"])
         self.build_parameters_grid()
         self.build_results_box()
 
+        QTimer.singleShot(0, self.create_plot_widget)
+
         # Initialize with data
         if x_array is not None and y_array is not None:
             self.set_data(x_array, y_array)
         if default_function is not None:
             self.function_text_edit.setText(default_function)
+            self.apply_function_text()
         if csv_file is not None:
             self.load_csv(csv_file)
+        if data_file is not None:
+            self.load_file(data_file)
+        if stream is not None:
+            self.start_stream(stream)
+
+        # Profiling readout, see profiling.py (curvify --profile)
+        self.profile_label = QLabel()
+        self.export_trace_button = QPushButton("Export trace")
+        self.export_trace_button.clicked.connect(self.export_trace)
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setInterval(PROFILE_INTERVAL_MS)
+        self.profile_timer.timeout.connect(self.update_profile_label)
+        if profiler.enabled:
+            self.statusBar().addPermanentWidget(self.profile_label)
+            self.statusBar().addPermanentWidget(self.export_trace_button)
+            self.profile_timer.start()
 
     def drag_enter_event(self, event: QtGui.QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -143,9 +296,19 @@ class MainWindow(QMainWindow):
         mime = event.mimeData()
         if mime.hasUrls():
             for url in mime.urls():
-                path = Path(url.toLocalFile())
-                if path.suffix == '.csv':
-                    self.load_csv(path)
+                self.load_file(url.toLocalFile())
+
+    def load_file(self, path: str | Path):
+        path = Path(path)
+        suffix = path.suffix.lower()
+        if suffix == '.csv':
+            self.load_csv(path)
+        elif suffix in loaders:
+            data_dialog = DataDialog(path, self)
+            data_dialog.data_selected.connect(self.set_data)
+            data_dialog.exec()
+        else:
+            print(f"Unsupported data format {suffix}")
 
     def load_csv(self, path: str | Path):
         csv_dialog = CSVDialog(path, self)
@@ -153,36 +316,225 @@ class MainWindow(QMainWindow):
         csv_dialog.exec()
 
     def set_data(self, x: np.ndarray, y: np.ndarray):
+        self.cancel_fit()
+        self.clear_uncertainty()
+        # The previous fits were done on other data
+        self.history.clear()
+        self.update_history_buttons()
         self.data_holder.set_data(x, y)
+        self.data_holder.update_curve()
+        if self.plot_widget is not None:
+            self.plot_widget.reset_view()
+        self.check_ready_to_fit()
+        self.update_memory_label()
+
+    def create_plot_widget(self):
+        # Runs from the event loop, after the window is shown: importing
+        # matplotlib and building the figure take most of the startup time
+        from .plot_widget import PlotWidget
+        self.plot_widget = PlotWidget(self, self.data_holder)
+        self.plot_widget.setMinimumSize(400, 400)
+        self.right_layout.replaceWidget(self.plot_placeholder, self.plot_widget)
+        self.plot_placeholder.deleteLater()
+        self.plot_widget.reset_view()
+        self.update_memory_label()
+
+    def start_stream(self, source: str):
+        worker = StreamWorker(source, self)
+        worker.points.connect(self.append_stream_data)
+        worker.failed.connect(self.stream_failed)
+        self.stream_worker = worker
+        self.stream_refit_timer.start()
+        self.statusBar().showMessage(f"Waiting for {source}")
+        worker.start()
+
+    def stream_failed(self, message: str):
+        print(message)
+        self.statusBar().showMessage(message)
+
+    def append_stream_data(self, x: np.ndarray, y: np.ndarray):
+        first_points = len(self.data_holder) == 0
+        self.data_holder.append(x, y)
+        self.stream_changed_ = True
         self.update_plot()
+        if first_points and self.plot_widget is not None:
+            self.plot_widget.reset_view()
         self.check_ready_to_fit()
+        parser = self.stream_worker.parser
+        self.statusBar().showMessage(
+            f"{parser.n_points} points received, {len(self.data_holder)} in the window"
+            + (f", {parser.n_skipped} lines skipped" if parser.n_skipped else ""))
+
+    def refit_stream(self):
+        if not self.stream_changed_ or not self.follow_stream_checkbox.isChecked():
+            return
+        if self.fit_worker is not None or self.uncertainty_worker is not None \
+                or not self.fit_button.isEnabled():
+            return
+        self.stream_changed_ = False
+        # The automatic refits are not recorded in the history
+        self.start_fit(record_history=False)
+
+    def update_profile_label(self):
+        stats, counters = profiler.snapshot()
+        parts = []
+        for name, label in PROFILE_SUMMARY:
+            if name in stats:
+                parts.append(f"{label} {1e3 * stats[name].last:.3g} ms")
+        if "evaluate.points" in counters:
+            parts.append(f"{counters["evaluate.points"]:.3g} points evaluated")
+        self.profile_label.setText(" | ".join(parts))
+        self.profile_label.setToolTip(profiler.summary())
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export trace", "curvify_trace.json", "Trace (*.json)")
+        if path:
+            profiler.export_chrome_trace(path)
 
     def check_ready_to_fit(self):
         self.fit_button.setEnabled(
             self.solver.is_valid() and len(self.data_holder) > 2)
+        self.auto_select_button.setEnabled(len(self.data_holder) > 2)
 
     def update_function_text(self):
+        self.model_update_timer.start()
+
+    def select_library_model(self, name: str):
+        if name == '':
+            return
+        if name in model_families:
+            family = model_families[name]
+            self.function_text_edit.setText(family.expression(family.default_order))
+        else:
+            self.function_text_edit.setText(models_library[name])
+        self.apply_function_text()
+
+    def change_model_order(self, order: int):
+        # The parameters that still exist keep their values
+        family = find_family(self.function_text_edit.text())
+        if family is None:
+            return
+        self.function_text_edit.setText(family[0].expression(order))
+        self.apply_function_text()
+
+    def apply_function_text(self):
+        self.model_update_timer.stop()
         text = self.function_text_edit.text()
-        self.solver.update_model(text)
-        self.update_plot()
+        if self.solver.update_model(text):
+            self.cancel_fit()
+            self.clear_uncertainty()
+            self.update_plot()
+            self.build_parameters_grid()
         self.check_ready_to_fit()
-        self.build_parameters_grid()
+        self.update_model_combo(text)
 
+    def update_model_combo(self, text: str):
         # Update combo box selection if the function is known
         model_index = find_model(text)
-        self.model_combo.setCurrentIndex(model_index)
+        family = find_family(text)
+        if model_index < 0 and family is not None:
+            model_index = len(models_library) + list(model_families).index(family[0].name)
+        with QSignalBlocker(self.model_combo):
+            self.model_combo.setCurrentIndex(model_index)
+        self.order_label.setVisible(family is not None)
+        self.order_spin.setVisible(family is not None)
+        if family is not None:
+            family, order = family
+            self.order_label.setText(family.order_label)
+            with QSignalBlocker(self.order_spin):
+                self.order_spin.setRange(family.min_order, family.max_order)
+                self.order_spin.setValue(order)
 
     def update_plot(self):
         self.data_holder.update_curve()  # Data_holder holds the solver
-        self.plot_widget.update_plot()
+        if self.plot_widget is not None:
+            self.plot_widget.update_plot()
+        self.update_memory_label()
+
+    def update_memory_label(self):
+        if len(self.data_holder) == 0:
+            self.memory_label.setText("")
+            return
+        data = self.data_holder.nbytes()
+        pyramid = self.plot_widget.decimator.nbytes() if self.plot_widget is not None else 0
+        self.memory_label.setText(
+            f"{len(self.data_holder):,} points ({self.data_holder.dtype}), "
+            f"{(data + pyramid) / 1e6:.1f} MB")
+        self.memory_label.setToolTip(
+            f"Data: {data / 1e6:.1f} MB"
+            + ("" if self.data_holder.owns_data else " (arrays used without a copy)")
+            + f"\nPlot decimation: {pyramid / 1e6:.1f} MB")
+
+    def update_model_plot(self):
+        # Same as update_plot when only the parameters changed
+        self.data_holder.update_curve()
+        if self.plot_widget is not None:
+            self.plot_widget.update_model_plot()
 
     def fit(self):
-        ok, results = self.solver.fit(*self.data_holder.get_selected_data())
+        self.start_fit(record_history=True)
+
+    def start_fit(self, record_history: bool):
+        # The fit runs in a worker thread, a new fit cancels the previous one
+        self.cancel_fit()
+        self.clear_uncertainty()
+        self.pre_fit_state_ = self.current_state() if record_history else None
+        self.solver.coarse_to_fine = self.coarse_to_fine_checkbox.isChecked()
+        worker = FitWorker(self.solver, *self.data_holder.get_selected_data(), self,
+                           global_fit=self.global_fit_checkbox.isChecked())
+        worker.progress.connect(partial(self.fit_progress, worker))
+        worker.fit_finished.connect(partial(self.fit_finished, worker))
+        worker.finished.connect(worker.deleteLater)
+        self.fit_worker = worker
+        self.cancel_fit_button.setEnabled(True)
+        self.fit_status_label.setText("Fitting...")
+        worker.start()
+
+    def cancel_fit(self):
+        self.cancel_uncertainty()
+        if self.fit_worker is None:
+            return
+        self.fit_worker.cancel()
+        self.fit_worker = None
+        self.cancel_fit_button.setEnabled(False)
+        self.fit_status_label.setText("")
+        if self.data_holder.curve_params is not None:
+            # Removes the live preview
+            self.update_plot()
+
+    def fit_progress(self, worker: FitWorker, model_calls: int, cost: float, params: np.ndarray):
+        if worker is not self.fit_worker:
+            return
+        if worker.global_fit:
+            self.fit_status_label.setText(f"{model_calls} local fits, best cost {cost:.5g}")
+        else:
+            self.fit_status_label.setText(f"{model_calls} evaluations, cost {cost:.5g}")
+        if self.live_preview_checkbox.isChecked():
+            names = [param.name for param in self.solver.get_params()]
+            self.data_holder.update_curve(dict(zip(names, params)))
+            if self.plot_widget is not None:
+                self.plot_widget.update_model_plot()
+
+    def fit_finished(self, worker: FitWorker, ok: bool, results: dict):
+        if worker is not self.fit_worker:
+            return  # Cancelled or replaced by a newer fit
+        self.fit_worker = None
+        self.cancel_fit_button.setEnabled(False)
+        self.fit_status_label.setText("")
         if ok:
+            self.solver.apply_fit_results(results)
+            self.fit_results = results
             self.update_plot()
             self.build_parameters_grid()
             self.build_results_box(results)
+            if self.pre_fit_state_ is not None:
+                self.history.push(self.pre_fit_state_)
+                self.history.push(self.current_state())
+                self.update_history_buttons()
+            self.uncertainty_button.setEnabled(True)
         else:
+            self.update_plot()
             self.fit_button.setText("Fit failed")
             self.fit_button.setStyleSheet("background-color: red;color: black")
             # reset text after 2 seconds
@@ -191,6 +543,133 @@ class MainWindow(QMainWindow):
                 self.fit_button.setStyleSheet("")
             ))
 
+    def estimate_uncertainty(self):
+        # Refits around the fitted parameters in a worker thread
+        self.cancel_fit()
+        self.clear_uncertainty()
+        worker = UncertaintyWorker(
+            self.solver, *self.data_holder.get_selected_data(), self,
+            method=self.uncertainty_method_combo.currentText())
+        worker.progress.connect(partial(self.uncertainty_progress, worker))
+        worker.uncertainty_finished.connect(partial(self.uncertainty_finished, worker))
+        worker.finished.connect(worker.deleteLater)
+        self.uncertainty_worker = worker
+        self.cancel_fit_button.setEnabled(True)
+        self.fit_status_label.setText("Estimating uncertainty...")
+        worker.start()
+
+    def cancel_uncertainty(self):
+        if self.uncertainty_worker is None:
+            return
+        self.uncertainty_worker.cancel()
+        self.uncertainty_worker = None
+        self.cancel_fit_button.setEnabled(False)
+        self.fit_status_label.setText("")
+
+    def clear_uncertainty(self):
+        # The samples are only valid for the fitted parameters and data
+        self.cancel_uncertainty()
+        self.uncertainty_button.setEnabled(False)
+        if self.uncertainty_results is None:
+            return
+        self.uncertainty_results = None
+        self.data_holder.set_uncertainty(None)
+        self.build_results_box(self.fit_results)
+
+    def uncertainty_progress(self, worker: UncertaintyWorker, n_done: int, n_samples: int):
+        if worker is self.uncertainty_worker:
+            self.fit_status_label.setText(f"{n_done}/{n_samples} samples")
+
+    def uncertainty_finished(self, worker: UncertaintyWorker, ok: bool, results: dict):
+        if worker is not self.uncertainty_worker:
+            return  # Cancelled
+        self.uncertainty_worker = None
+        self.cancel_fit_button.setEnabled(False)
+        self.fit_status_label.setText("")
+        self.uncertainty_button.setEnabled(True)
+        if not ok:
+            print("Uncertainty estimation failed")
+            return
+        self.uncertainty_results = results
+        self.data_holder.set_uncertainty(results["samples"])
+        self.update_model_plot()
+        self.build_results_box(self.fit_results)
+
+    def auto_select_model(self):
+        # The comparison is done on the current selection, which is restored
+        # with the model chosen in the dialog
+        selection = tuple(self.range_selection_slider.value())
+        dialog = ModelSelectionDialog(*self.data_holder.get_selected_data(), self)
+        dialog.model_selected.connect(partial(self.load_selected_model, selection))
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.show()
+
+    def load_selected_model(self, selection: tuple[int, int], result: dict):
+        # Model and fitted values of model_selection.compare_models, recorded
+        # in the history as a fit
+        self.cancel_fit()
+        previous_state = self.current_state()
+        solver = Solver()
+        solver.update_model(result["expression"])
+        solver.apply_fit_results(result["results"])
+        state = FitState(result["expression"], copy_params(solver.get_params()),
+                         selection, result["results"])
+        self.history.push(previous_state)
+        self.history.push(state)
+        self.restore_state(state)
+
+    def current_state(self) -> FitState:
+        return FitState(
+            self.solver.compiled_model_.expression, copy_params(self.solver.get_params()),
+            tuple(self.range_selection_slider.value()), self.fit_results)
+
+    def restore_state(self, state: FitState):
+        # Model, parameters, selection and results of a previous fit
+        self.cancel_fit()
+        self.clear_uncertainty()
+        self.model_update_timer.stop()
+        with QSignalBlocker(self.function_text_edit):
+            self.function_text_edit.setText(state.expression)
+        self.update_model_combo(state.expression)
+        self.solver.update_model(state.expression)
+        self.solver.params = copy_params(state.params)
+        with QSignalBlocker(self.range_selection_slider):
+            self.range_selection_slider.setValue(state.selection)
+        self.data_holder.set_selected_range(state.selection)
+        self.fit_results = state.results
+        self.update_plot()
+        self.build_parameters_grid()
+        self.build_results_box(state.results)
+        self.check_ready_to_fit()
+        self.uncertainty_button.setEnabled(state.results is not None)
+        self.update_history_buttons()
+
+    def undo_fit(self):
+        state = self.history.undo()
+        if state is not None:
+            self.restore_state(state)
+
+    def redo_fit(self):
+        state = self.history.redo()
+        if state is not None:
+            self.restore_state(state)
+
+    def update_history_buttons(self):
+        self.undo_button.setEnabled(self.history.can_undo())
+        self.redo_button.setEnabled(self.history.can_redo())
+
+    def closeEvent(self, event: QtGui.QCloseEvent):
+        self.cancel_fit()
+        self.stream_refit_timer.stop()
+        if self.stream_worker is not None:
+            self.stream_worker.stop()
+            self.stream_worker.wait()
+        for worker in self.findChildren(FitWorker) + self.findChildren(UncertaintyWorker) \
+                + self.findChildren(ModelSelectionWorker):
+            worker.cancel()
+            worker.wait()
+        super().closeEvent(event)
+
     def clear_layout(self, layout: QLayout):
         while layout.count():
             item = layout.takeAt(0)
@@ -232,7 +711,9 @@ class MainWindow(QMainWindow):
         try:
             val = float(value)
             param.value = val
-            self.update_plot()
+            param.initialized = True
+            self.clear_uncertainty()
+            self.update_model_plot()
         except:
             pass
 
@@ -246,14 +727,44 @@ class MainWindow(QMainWindow):
             self.results_group_layout.addWidget(QLabel(f"{results["R2"]:.5g}"), 0, 1)
             self.results_group_layout.addWidget(QLabel("Root Mean Square Error"), 1, 0)
             self.results_group_layout.addWidget(QLabel(f"{results["RMSE"]:.5g}"), 1, 1)
+            self.results_group_layout.addWidget(QLabel("Method"), 2, 0)
+            method_label = QLabel(results["method"])
+            if results.get("stages"):
+                method_label.setToolTip("\n".join(
+                    f"{stage["points"]:,} points ({stage["method"]}): "
+                    f"{stage["nfev"]} iterations, {stage["time"]:.2f} s"
+                    for stage in results["stages"]))
+            self.results_group_layout.addWidget(method_label, 2, 1)
+            if "global" in results:
+                summary = results["global"]
+                self.results_group_layout.addWidget(QLabel("Local fits"), 3, 0)
+                self.results_group_layout.addWidget(QLabel(
+                    f"{summary["n_agree"]}/{summary["n_fits"]} at the best, "
+                    f"{len(summary["minima"])} minima"), 3, 1)
+            if self.uncertainty_results is not None:
+                uncertainty = self.uncertainty_results
+                row = 4 if "global" in results else 3
+                self.results_group_layout.addWidget(QLabel(
+                    f"{uncertainty["confidence"]:.0%} interval ({uncertainty["method"]})"),
+                    row, 0, 1, 2)
+                for name, (low, high) in uncertainty["intervals"].items():
+                    row += 1
+                    self.results_group_layout.addWidget(QLabel(name), row, 0)
+                    self.results_group_layout.addWidget(QLabel(f"[{low:.5g}, {high:.5g}]"), row, 1)
 
 
 def curvify(
         x_array: np.ndarray | None = None,
         y_array: np.ndarray | None = None,
         default_function: str | None = None,
-        csv_file: str | None = None):
+        csv_file: str | None = None,
+        data_file: str | None = None,
+        stream: str | None = None,
+        stream_window: int = 1_000_000,
+        backend: str = "numpy",
+        dtype: str = "float64"):
     app = QApplication(sys.argv)
-    window = MainWindow(x_array, y_array, default_function, csv_file)
+    window = MainWindow(x_array, y_array, default_function, csv_file, data_file,
+                        stream, stream_window, backend, dtype)
     window.show()
     return app.exec()
@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field, replace
+
+from .solver import Param
+
+# Undo/redo of fits: the states of the interface (model, parameters and
+# selected range) before and after each fit. Going back to a state restores
+# it without fitting again.
+
+
+@dataclass
+class FitState:
+    expression: str
+    params: list[Param]
+    selection: tuple[int, int]  # Range of the selection slider
+    results: dict | None = field(default=None, compare=False)
+
+
+def copy_params(params: list[Param]) -> list[Param]:
+    return [replace(param) for param in params]
+
+
+class FitHistory:
+    def __init__(self, max_size: int = 100):
+        self.max_size = max_size
+        self.states: list[FitState] = []
+        self.index = -1  # Current state
+
+    def push(self, state: FitState):
+        # Drops the states that were undone. A state equal to the current
+        # one replaces it (e.g. the state before a fit is the previous fit).
+        del self.states[self.index + 1:]
+        if self.states and self.states[-1] == state:
+            self.states[-1] = state
+        else:
+            self.states.append(state)
+        if len(self.states) > self.max_size:
+            del self.states[0]
+        self.index = len(self.states) - 1
+
+    def current(self) -> FitState | None:
+        return self.states[self.index] if self.states else None
+
+    def can_undo(self) -> bool:
+        return self.index > 0
+
+    def can_redo(self) -> bool:
+        return self.index < len(self.states) - 1
+
+    def undo(self) -> FitState | None:
+        if not self.can_undo():
+            return None
+        self.index -= 1
+        return self.states[self.index]
+
+    def redo(self) -> FitState | None:
+        if not self.can_redo():
+            return None
+        self.index += 1
+        return self.states[self.index]
+
+    def clear(self):
+        self.states.clear()
+        self.index = -1
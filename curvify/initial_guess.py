@@ -0,0 +1,420 @@
+import time
+
+import numpy as np
+from typing import Callable
+
+from .model_families import find_family
+from .models_library import find_model, models_library
+
+# Starting points for the models of the library, computed from the data.
+# Each estimator takes the x and y arrays (x sorted, finite) and returns a
+# value for some or all of the parameters of the model. The estimates only
+# need to be close enough for the solver to converge.
+
+# Maximum number of points used by the estimators (evenly subsampled)
+MAX_POINTS = 65536
+
+
+def linear_fit(columns: list[np.ndarray], y: np.ndarray) -> np.ndarray:
+    coefs, _, _, _ = np.linalg.lstsq(np.column_stack(columns), y, rcond=None)
+    return coefs
+
+
+def cumulative_integral(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Trapezoidal integral of y from x[0]
+    result = np.zeros_like(y)
+    result[1:] = np.cumsum(np.diff(x) * (y[1:] + y[:-1]) / 2)
+    return result
+
+
+def smooth(y: np.ndarray) -> np.ndarray:
+    # Moving average over about 2% of the points
+    window = max(1, len(y) // 50)
+    if window == 1:
+        return y
+    kernel = np.ones(window) / window
+    return np.convolve(np.pad(y, (window // 2, window - 1 - window // 2), mode='edge'),
+                       kernel, mode='valid')
+
+
+def edge_levels(y: np.ndarray) -> tuple[float, float]:
+    # Mean values at the start and at the end of the curve
+    n = max(1, len(y) // 20)
+    return float(np.mean(y[:n])), float(np.mean(y[-n:]))
+
+
+def dominant_frequency(x: np.ndarray, y: np.ndarray) -> float:
+    # Frequency (cycles per unit of x) of the highest peak of the spectrum,
+    # resampled on a regular grid if needed
+    n = len(x)
+    grid = np.linspace(x[0], x[-1], n)
+    values = np.interp(grid, x, y) - np.mean(y)
+    spectrum = np.abs(np.fft.rfft(values, 4 * n))
+    frequencies = np.fft.rfftfreq(4 * n, grid[1] - grid[0])
+    peak = 1 + int(np.argmax(spectrum[1:]))
+    if 1 < peak < len(spectrum) - 1:
+        # Parabolic interpolation of the peak
+        left, center, right = np.log(spectrum[peak - 1:peak + 2] + 1e-300)
+        denominator = left - 2 * center + right
+        if denominator != 0:
+            offset = 0.5 * (left - right) / denominator
+            return float(frequencies[peak] + offset * (frequencies[1] - frequencies[0]))
+    return float(frequencies[peak])
+
+
+def crossing(x: np.ndarray, y: np.ndarray, level: float) -> float:
+    # First x where the (smoothed, monotonic-ish) curve crosses level
+    above = y >= level if y[-1] >= y[0] else y <= level
+    index = int(np.argmax(above))
+    if index == 0:
+        return float(x[0])
+    x0, x1, y0, y1 = x[index - 1], x[index], y[index - 1], y[index]
+    return float(x0 + (level - y0) * (x1 - x0) / (y1 - y0)) if y1 != y0 else float(x1)
+
+
+def peak(x: np.ndarray, y: np.ndarray) -> tuple[float, float, float, float]:
+    # Amplitude, position, full width at half maximum and baseline of the
+    # main peak (or dip)
+    smoothed = smooth(y)
+    # Baseline from the first and last 10% of the points
+    n = len(y) // 10 + 1
+    baseline = float(np.median(np.concatenate((smoothed[:n], smoothed[-n:]))))
+    high, low = smoothed.max() - baseline, baseline - smoothed.min()
+    index = int(np.argmax(smoothed) if high >= low else np.argmin(smoothed))
+    amplitude = float(smoothed[index] - baseline)
+    above = np.abs(smoothed - baseline) >= np.abs(amplitude) / 2
+    # Contiguous half maximum region around the peak
+    left = index - int(np.argmin(above[index::-1])) if not above[:index + 1].all() else 0
+    right = index + int(np.argmin(above[index:])) if not above[index:].all() else len(y) - 1
+    width = float(x[right] - x[left]) or float(x[-1] - x[0]) / 10
+    return amplitude, float(x[index]), width, baseline
+
+
+def polynomial(degree: int, names: str | list[str]) -> Callable:
+    def estimate(x, y):
+        return dict(zip(names, np.polyfit(x, y, degree)))
+    return estimate
+
+
+def exponential_rate(x: np.ndarray, y: np.ndarray) -> tuple[float, float]:
+    # y' = b * (y - c) integrated: y = b * int(y) - b * c * x + k
+    coefs = linear_fit([cumulative_integral(x, y), x, np.ones_like(x)], y)
+    rate = coefs[0]
+    offset = -coefs[1] / rate if rate != 0 else float(np.mean(y))
+    return float(rate), float(offset)
+
+
+def estimate_exponential(x, y):
+    b, c = exponential_rate(x, y)
+    a = linear_fit([np.exp(b * x)], y - c)[0]
+    return {"a": a, "b": b, "c": c}
+
+
+def estimate_exponential_offset(x, y):
+    b, d = exponential_rate(x, y)
+    c = float(x[0])
+    a = linear_fit([np.exp(b * (x - c))], y - d)[0]
+    return {"a": a, "b": b, "c": c, "d": d}
+
+
+def estimate_logarithmic(x, y):
+    b = 1.0
+    c = max(0.0, 1.0 - float(x[0]))  # b * x + c >= 1 on the data
+    a, d = linear_fit([np.log(b * x + c), np.ones_like(x)], y)
+    return {"a": a, "b": b, "c": c, "d": d}
+
+
+def estimate_power_law(x, y):
+    # x * y' = b * (y - c) integrated: x * y = (b + 1) * int(y) - b * c * x + k
+    positive = x > 0
+    x, y = x[positive], y[positive]
+    coefs = linear_fit([cumulative_integral(x, y), x, np.ones_like(x)], x * y)
+    b = coefs[0] - 1
+    c = -coefs[1] / b if b != 0 else 0.0
+    a = linear_fit([x ** b], y - c)[0]
+    return {"a": a, "b": b, "c": c}
+
+
+def estimate_sine(x, y):
+    b = 2 * np.pi * dominant_frequency(x, y)
+    sin_coef, cos_coef, d = linear_fit([np.sin(b * x), np.cos(b * x), np.ones_like(x)], y)
+    return {"a": np.hypot(sin_coef, cos_coef), "b": b,
+            "c": np.arctan2(cos_coef, sin_coef), "d": d}
+
+
+def estimate_damped_sine(x, y):
+    e = edge_levels(y)[1]
+    b = 2 * np.pi * dominant_frequency(x, y)
+    # Decay rate from the amplitude over each period
+    period = 2 * np.pi / b
+    segments = np.floor((x - x[0]) / period).astype(int)
+    counts = np.bincount(segments)
+    valid = counts > 2
+    c = 0.0
+    if np.count_nonzero(valid) >= 2:
+        power = np.bincount(segments, (y - e) ** 2)[valid] / counts[valid]
+        centers = x[0] + (np.flatnonzero(valid) + 0.5) * period
+        c = -linear_fit([centers, np.ones_like(centers)], 0.5 * np.log(power + 1e-300))[0]
+    envelope = np.exp(-c * x)
+    sin_coef, cos_coef = linear_fit([envelope * np.sin(b * x), envelope * np.cos(b * x)], y - e)
+    return {"a": np.hypot(sin_coef, cos_coef), "b": b, "c": c,
+            "d": np.arctan2(cos_coef, sin_coef), "e": e}
+
+
+def estimate_hyperbola(x, y):
+    # (y - c) * (x + b) = a  <=>  x * y = -b * y + c * x + (a + b * c)
+    coefs = linear_fit([y, x, np.ones_like(x)], x * y)
+    b, c = -coefs[0], coefs[1]
+    return {"a": coefs[2] - b * c, "b": b, "c": c}
+
+
+def estimate_rational(x, y):
+    # With d = 1: y = a * x + b - c * x * y
+    a, b, c = linear_fit([x, np.ones_like(x), -x * y], y)
+    return {"a": a, "b": b, "c": c, "d": 1.0}
+
+
+def estimate_logistic(x, y):
+    smoothed = smooth(y)
+    d, end = edge_levels(smoothed)
+    a = end - d
+    low = crossing(x, smoothed, d + 0.25 * a)
+    high = crossing(x, smoothed, d + 0.75 * a)
+    c = crossing(x, smoothed, d + 0.5 * a)
+    # y(c -+ ln(3) / b) = d + a / 4 and d + 3 * a / 4
+    b = 2 * np.log(3) / (high - low) if high != low else 10 / (x[-1] - x[0])
+    return {"a": a, "b": b, "c": c, "d": d}
+
+
+def estimate_gompertz(x, y):
+    smoothed = smooth(y)
+    d, end = edge_levels(smoothed)
+    a = end - d
+    # -ln(-ln((y - d) / a)) = c * x - ln(b)
+    ratio = (smoothed - d) / a
+    valid = (ratio > 0.05) & (ratio < 0.95)
+    if np.count_nonzero(valid) < 2:
+        return {"a": a, "d": d}
+    c, intercept = linear_fit(
+        [x[valid], np.ones(np.count_nonzero(valid))], -np.log(-np.log(ratio[valid])))
+    return {"a": a, "b": np.exp(-intercept), "c": c, "d": d}
+
+
+def estimate_gaussian(x, y):
+    a, b, width, d = peak(x, y)
+    return {"a": a, "b": b, "c": width / (2 * np.sqrt(2 * np.log(2))), "d": d}
+
+
+def estimate_lorentzian(x, y):
+    a, b, width, d = peak(x, y)
+    return {"a": a, "b": b, "c": width / 2, "d": d}
+
+
+def estimate_weibull(x, y):
+    a = edge_levels(y)[0]
+    b = float(x[0]) - 1e-3 * float(x[-1] - x[0])
+    # ln(-ln(y / a)) = d * ln(x - b) - d * ln(c)
+    ratio = y / a
+    valid = (ratio > 0.02) & (ratio < 0.98)
+    if np.count_nonzero(valid) < 2:
+        return {"a": a}
+    d, intercept = linear_fit(
+        [np.log(x[valid] - b), np.ones(np.count_nonzero(valid))], np.log(-np.log(ratio[valid])))
+    return {"a": a, "b": b, "c": np.exp(-intercept / d), "d": d}
+
+
+def fourier_coefficients(x, y, w0: float, n: int) -> tuple[dict[str, float], float]:
+    # Linear fit of a Fourier series of angular frequency w0, returns the
+    # coefficients and the sum of squared residuals
+    columns = [np.ones_like(x)]
+    names = ["a0"]
+    for i in range(1, n + 1):
+        columns += [np.cos(i * w0 * x), np.sin(i * w0 * x)]
+        names += [f"a{i}", f"b{i}"]
+    coefs = linear_fit(columns, y)
+    residuals = y - np.column_stack(columns) @ coefs
+    return dict(zip(names, coefs)), float(np.sum(residuals ** 2))
+
+
+def fourier_frequency(x, y, n: int) -> tuple[float, dict[str, float]]:
+    # The highest peak of the spectrum may be a harmonic of the fundamental:
+    # tries the peak frequency divided by 1 to n
+    frequency = dominant_frequency(x, y)
+    candidates = []
+    for k in range(1, n + 1):
+        coefs, cost = fourier_coefficients(x, y, 2 * np.pi * frequency / k, n)
+        candidates.append((cost, frequency / k, coefs))
+    # Prefers the highest frequency among the (almost) equally good ones
+    best_cost = min(cost for cost, _, _ in candidates)
+    for cost, frequency, coefs in candidates:
+        if cost <= 1.01 * best_cost:
+            return frequency, coefs
+
+
+def estimate_fourier_series(x, y):
+    # f0 is an angular frequency in this model
+    frequency, coefs = fourier_frequency(x, y, 2)
+    return coefs | {"f0": 2 * np.pi * frequency}
+
+
+def estimate_fourier(x, y):
+    frequency, coefs = fourier_frequency(x, y, 5)
+    return coefs | {"f0": frequency}
+
+
+def estimate_polynomial_family(degree: int) -> Callable:
+    return polynomial(degree, [f"c{i}" for i in range(degree, -1, -1)])
+
+
+def estimate_fourier_family(order: int) -> Callable:
+    def estimate(x, y):
+        frequency, coefs = fourier_frequency(x, y, order)
+        return coefs | {"f0": frequency}
+    return estimate
+
+
+def estimate_peaks_family(n: int, width_to_c: float) -> Callable:
+    # Peaks found one by one, each one subtracted (as a triangle of the same
+    # height and width) before looking for the next
+    def estimate(x, y):
+        values = {"d": peak(x, y)[3]}
+        residual = y - values["d"]
+        for i in range(1, n + 1):
+            a, b, width, _ = peak(x, residual + values["d"])
+            values |= {f"a{i}": a, f"b{i}": b, f"c{i}": width * width_to_c}
+            residual = residual - a * np.clip(1 - np.abs(x - b) / width, 0, None)
+        return values
+    return estimate
+
+
+def estimate_exponentials_family(n: int) -> Callable:
+    # Rates spread around the rate of a single exponential, the amplitudes
+    # are then a linear fit
+    def estimate(x, y):
+        rate, c = exponential_rate(x, y)
+        rates = [rate * 2.0 ** (i - (n - 1) / 2) for i in range(n)]
+        amplitudes = linear_fit([np.exp(b * x) for b in rates], y - c)
+        values = {"c": c}
+        for i, (a, b) in enumerate(zip(amplitudes, rates), start=1):
+            values |= {f"a{i}": a, f"b{i}": b}
+        return values
+    return estimate
+
+
+# Estimators of the model families (see model_families.py), by order
+family_estimators: dict[str, Callable[[int], Callable]] = {
+    "Polynomial (degree n)": estimate_polynomial_family,
+    "Fourier (order n)": estimate_fourier_family,
+    "Gaussians (sum of n)": lambda n: estimate_peaks_family(n, 1 / (2 * np.sqrt(2 * np.log(2)))),
+    "Lorentzians (sum of n)": lambda n: estimate_peaks_family(n, 1 / 2),
+    "Exponentials (sum of n)": estimate_exponentials_family,
+}
+
+
+estimators: dict[str, Callable[[np.ndarray, np.ndarray], dict[str, float]]] = {
+    "Linear": polynomial(1, "ab"),
+    "Quadratic": polynomial(2, "abc"),
+    "Cubic": polynomial(3, "abcd"),
+    "Polynomial": polynomial(4, "abcde"),
+    "Exponential": estimate_exponential,
+    "Exponential with offset": estimate_exponential_offset,
+    "Logarithmic": estimate_logarithmic,
+    "Power Law": estimate_power_law,
+    "Sine": estimate_sine,
+    "Damped Sine": estimate_damped_sine,
+    "Hyperbola": estimate_hyperbola,
+    "Rational": estimate_rational,
+    "Logistic": estimate_logistic,
+    "Gompertz": estimate_gompertz,
+    "Gaussian": estimate_gaussian,
+    "Lorentzian": estimate_lorentzian,
+    "Weibull": estimate_weibull,
+    "Fourier Series (n=2)": estimate_fourier_series,
+    "Fourier (general)": estimate_fourier,
+}
+
+
+def find_estimator(expression: str) -> Callable | None:
+    index = find_model(expression)
+    if index >= 0:
+        return estimators.get(list(models_library)[index])
+    family = find_family(expression)
+    if family is not None:
+        family, order = family
+        return family_estimators[family.name](order)
+    return None
+
+
+def guess_initial_values(estimator: Callable, x: np.ndarray,
+                         y: np.ndarray) -> dict[str, float]:
+    # Runs the estimator on the finite, sorted (and subsampled if large)
+    # data. Returns only the finite estimates, {} if the estimator failed.
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    if not np.all(valid):
+        x, y = x[valid], y[valid]
+    if len(x) > MAX_POINTS:
+        step = len(x) // MAX_POINTS
+        x, y = x[::step], y[::step]
+    if len(x) < 5:
+        return {}
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], y[order]
+    try:
+        with np.errstate(all='ignore'):
+            values = estimator(x, y)
+    except (ValueError, ZeroDivisionError, IndexError, np.linalg.LinAlgError):
+        return {}
+    return {name: float(value) for name, value in values.items() if np.isfinite(value)}
+
+
+def compare_initial_guess(solver, x: np.ndarray, y: np.ndarray) -> dict:
+    # Fits with and without the estimator, from the current parameters of
+    # the solver (left unchanged). Reports iterations, time and success.
+    saved = [(param.value, param.initialized) for param in solver.get_params()]
+    report = {}
+    for label, use_initial_guess in (("default", False), ("guess", True)):
+        for param, (value, initialized) in zip(solver.get_params(), saved):
+            param.value, param.initialized = value, initialized
+        use_initial_guess_, solver.use_initial_guess = solver.use_initial_guess, use_initial_guess
+        start_time = time.perf_counter()
+        ok, results = solver.fit(x, y, update_params=False)
+        elapsed = time.perf_counter() - start_time
+        solver.use_initial_guess = use_initial_guess_
+        report[label] = {"ok": ok, "nfev": results.get("nfev"), "time": elapsed,
+                         "R2": results.get("R2")}
+    for param, (value, initialized) in zip(solver.get_params(), saved):
+        param.value, param.initialized = value, initialized
+    if report["default"]["ok"] and report["guess"]["ok"]:
+        report["iterations_saved"] = report["default"]["nfev"] - report["guess"]["nfev"]
+        report["time_saved"] = report["default"]["time"] - report["guess"]["time"]
+    return report
+
+
+if __name__ == "__main__":
+    from .solver import Solver
+    rng = np.random.default_rng(0)
+    x = np.linspace(0.5, 10, 5000)
+    examples = {
+        "Exponential": {"a": 2, "b": -0.4, "c": 1},
+        "Sine": {"a": 2, "b": 3, "c": 0.5, "d": 1},
+        "Damped Sine": {"a": 3, "b": 2, "c": 0.3, "d": 0.5, "e": 1},
+        "Logistic": {"a": 3, "b": 2, "c": 5, "d": 1},
+        "Gompertz": {"a": 3, "b": 2, "c": 0.8, "d": 1},
+        "Gaussian": {"a": 3, "b": 4, "c": 0.7, "d": 1},
+        "Lorentzian": {"a": 3, "b": 4, "c": 0.7, "d": 1},
+        "Power Law": {"a": 2, "b": 1.5, "c": 1},
+        "Hyperbola": {"a": 2, "b": 0.3, "c": 1},
+        "Fourier Series (n=2)": {"a0": 1, "a1": 0.5, "b1": 0.3, "a2": 0.2, "b2": 1.5, "f0": 2},
+    }
+    for name, values in examples.items():
+        solver = Solver()
+        solver.update_model(models_library[name])
+        y = solver.evaluate(x, values) + rng.normal(scale=0.02, size=x.size)
+        report = compare_initial_guess(solver, x, y)
+        default, guess = report["default"], report["guess"]
+        print(f"{name:22s} default: {'ok' if default['ok'] else 'failed':6s} "
+              f"R2={default['R2'] or 0:.4f} {default['nfev']} it {1e3 * default['time']:6.1f} ms | "
+              f"guess: {'ok' if guess['ok'] else 'failed':6s} "
+              f"R2={guess['R2'] or 0:.4f} {guess['nfev']} it {1e3 * guess['time']:6.1f} ms")
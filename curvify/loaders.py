@@ -0,0 +1,154 @@
+from pathlib import Path
+
+import numpy as np
+
+from .csv_reader import read_cache, sniff_format
+
+# Data files readers, selected by the file suffix. Each loader lists the
+# columns of a file and loads two of them. Whenever possible the arrays are
+# read-only views on a memory map of the file instead of copies.
+
+
+def array_columns(name: str, shape: tuple[int, ...]) -> list[str]:
+    # Columns of an array: itself if 1-D, name[i] for each column if 2-D
+    if len(shape) == 1:
+        return [name]
+    if len(shape) == 2:
+        return [f"{name}[{i}]" for i in range(shape[1])]
+    return []
+
+
+def array_column(array: np.ndarray, column: str, name: str) -> np.ndarray:
+    if column == name:
+        return array
+    return array[:, int(column[len(name) + 1:-1])]
+
+
+class CsvLoader:
+    # Delimiter and header guessed from the file (see csv_reader)
+    def list_columns(self, path: str) -> list[str]:
+        return sniff_format(path).columns
+
+    def load(self, path: str, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+        csv_format = sniff_format(path)
+        indices = [csv_format.columns.index(column) for column in (x_column, y_column)]
+        x, y = read_cache.read(path, csv_format, indices)
+        return x, y
+
+
+class NpyLoader:
+    # Memory mapped. A 1-D array gives the y values, the x values are the
+    # indices. 2-D arrays give one column per column, structured arrays one
+    # column per field.
+    def open_(self, path: str) -> np.ndarray:
+        return np.load(path, mmap_mode="r")
+
+    def list_columns(self, path: str) -> list[str]:
+        array = self.open_(path)
+        if array.dtype.names is not None:
+            return list(array.dtype.names)
+        if array.ndim == 1:
+            return ["index", "values"]
+        return array_columns("column", array.shape)
+
+    def load(self, path: str, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+        array = self.open_(path)
+        return self.column_(array, x_column), self.column_(array, y_column)
+
+    def column_(self, array: np.ndarray, column: str) -> np.ndarray:
+        if array.dtype.names is not None:
+            return array[column]
+        if array.ndim == 1:
+            return np.arange(len(array), dtype=float) if column == "index" else array
+        return array_column(array, column, "column")
+
+
+class NpzLoader:
+    # Each 1-D array is a column, each 2-D array gives name[i] columns. The
+    # members of a .npz file are loaded in memory (no memory map possible).
+    def list_columns(self, path: str) -> list[str]:
+        columns = []
+        with np.load(path) as npz:
+            for name in npz.files:
+                columns += array_columns(name, npz[name].shape)
+        return columns
+
+    def load(self, path: str, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+        with np.load(path) as npz:
+            arrays = {}
+            columns = []
+            for column in (x_column, y_column):
+                name = column if column in npz.files else column[:column.rfind("[")]
+                if name not in arrays:
+                    arrays[name] = npz[name]
+                columns.append(array_column(arrays[name], column, name))
+        return columns[0], columns[1]
+
+
+class ParquetLoader:
+    # Only the two chosen columns are read
+    def list_columns(self, path: str) -> list[str]:
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+
+    def load(self, path: str, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+        import pyarrow.parquet as pq
+        columns = list(dict.fromkeys((x_column, y_column)))
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        x, y = (table.column(column).to_numpy() for column in (x_column, y_column))
+        return x, y
+
+
+class Hdf5Loader:
+    # Numeric datasets of the file, named by their path. Contiguous
+    # uncompressed datasets are memory mapped, the others are read.
+    def list_columns(self, path: str) -> list[str]:
+        import h5py
+        columns = []
+
+        def visit(name, item):
+            if isinstance(item, h5py.Dataset) and item.dtype.kind in "iuf":
+                columns.extend(array_columns(name, item.shape))
+
+        with h5py.File(path, "r") as file:
+            file.visititems(visit)
+        return columns
+
+    def load(self, path: str, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+        import h5py
+        with h5py.File(path, "r") as file:
+            x, y = (self.column_(file, path, column) for column in (x_column, y_column))
+        return x, y
+
+    def column_(self, file, path: str, column: str) -> np.ndarray:
+        name = column if column in file else column[:column.rfind("[")]
+        return array_column(self.read_dataset_(file[name], path), column, name)
+
+    def read_dataset_(self, dataset, path: str) -> np.ndarray:
+        offset = dataset.id.get_offset()
+        if dataset.chunks is None and dataset.compression is None and offset is not None:
+            return np.memmap(path, dtype=dataset.dtype, mode="r",
+                             offset=offset, shape=dataset.shape)
+        return dataset[()]
+
+
+loaders = {
+    ".csv": CsvLoader,
+    ".npy": NpyLoader,
+    ".npz": NpzLoader,
+    ".parquet": ParquetLoader,
+    ".h5": Hdf5Loader,
+    ".hdf5": Hdf5Loader,
+}
+
+
+def get_loader(path: str | Path):
+    suffix = Path(path).suffix.lower()
+    if suffix not in loaders:
+        raise ValueError(f"Unsupported data format {suffix}, "
+                         f"use one of {', '.join(loaders)}")
+    return loaders[suffix]()
+
+
+def load_data(path: str | Path, x_column: str, y_column: str) -> tuple[np.ndarray, np.ndarray]:
+    return get_loader(path).load(str(path), x_column, y_column)
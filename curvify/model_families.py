@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+
+from .models_library import normalize_model
+
+# Models of variable order, generated on demand: polynomial of degree n,
+# Fourier series of order n, sums of n peaks or exponentials. The
+# expressions only use parameter names of the Param grid (a1, b1, c0...) and
+# array operations, their derivatives are built by derivatives.py like for
+# any other model. The Fourier series uses the fourier kernel below, with
+# the derivatives taken from fourier_basis (see derivatives.py).
+
+
+def fourier(x, f0, coefs: list[float]):
+    # a0 + sum(ak cos(k w0 x) + bk sin(k w0 x)), w0 = 2 pi f0. The harmonics
+    # are computed by recurrence from the first one: two trigonometric
+    # evaluations whatever the order
+    n = len(coefs) // 2
+    if n == 0:
+        return coefs[0] + 0 * x
+    angle = 2 * np.pi * f0 * x
+    cos_1, sin_1 = np.cos(angle), np.sin(angle)
+    cos_k, sin_k = cos_1, sin_1
+    result = coefs[0] + coefs[1] * cos_1 + coefs[2] * sin_1
+    for k in range(2, n + 1):
+        cos_k, sin_k = cos_k * cos_1 - sin_k * sin_1, sin_k * cos_1 + cos_k * sin_1
+        result += coefs[2 * k - 1] * cos_k
+        result += coefs[2 * k] * sin_k
+    return result
+
+
+def fourier_basis(x, f0, n: int) -> np.ndarray:
+    # Rows 1, cos(w0 x), sin(w0 x), ..., cos(n w0 x), sin(n w0 x): the
+    # derivatives of fourier with respect to its coefficients
+    angle = 2 * np.pi * np.asarray(f0) * np.asarray(x)
+    basis = np.empty((2 * n + 1,) + angle.shape)
+    basis[0] = 1
+    if n == 0:
+        return basis
+    np.cos(angle, out=basis[1])
+    np.sin(angle, out=basis[2])
+    for k in range(2, n + 1):
+        cos_k, sin_k = basis[2 * k - 3], basis[2 * k - 2]
+        basis[2 * k - 1] = cos_k * basis[1] - sin_k * basis[2]
+        basis[2 * k] = sin_k * basis[1] + cos_k * basis[2]
+    return basis
+
+
+@dataclass(frozen=True)
+class ModelFamily:
+    name: str
+    make_expression: Callable[[int], str]
+    min_order: int
+    max_order: int
+    default_order: int
+    order_label: str = "Order"
+
+    def expression(self, order: int) -> str:
+        return family_expression(self.name, order)
+
+
+def polynomial_expression(degree: int) -> str:
+    # c0 + c1 * x + ... + cn * x**n, evaluated by Horner's scheme
+    coefs = ", ".join(f"c{i}" for i in range(degree, -1, -1))
+    return f"np.polyval([{coefs}], x)"
+
+
+def fourier_expression(order: int) -> str:
+    coefs = ", ".join(["a0"] + [f"a{k}, b{k}" for k in range(1, order + 1)])
+    return f"fourier(x, f0, [{coefs}])"
+
+
+def gaussians_expression(n: int) -> str:
+    terms = [f"a{i} * np.exp(-((x - b{i})**2) / (2 * c{i}**2))" for i in range(1, n + 1)]
+    return " + ".join(terms + ["d"])
+
+
+def lorentzians_expression(n: int) -> str:
+    terms = [f"a{i} / (1 + ((x - b{i}) / c{i})**2)" for i in range(1, n + 1)]
+    return " + ".join(terms + ["d"])
+
+
+def exponentials_expression(n: int) -> str:
+    terms = [f"a{i} * np.exp(b{i} * x)" for i in range(1, n + 1)]
+    return " + ".join(terms + ["c"])
+
+
+model_families: dict[str, ModelFamily] = {
+    family.name: family for family in [
+        ModelFamily("Polynomial (degree n)", polynomial_expression, 1, 15, 4, "Degree"),
+        ModelFamily("Fourier (order n)", fourier_expression, 1, 30, 5),
+        ModelFamily("Gaussians (sum of n)", gaussians_expression, 1, 10, 2, "Peaks"),
+        ModelFamily("Lorentzians (sum of n)", lorentzians_expression, 1, 10, 2, "Peaks"),
+        ModelFamily("Exponentials (sum of n)", exponentials_expression, 1, 5, 2, "Terms"),
+    ]
+}
+
+
+@lru_cache(maxsize=None)
+def family_expression(name: str, order: int) -> str:
+    return model_families[name].make_expression(order)
+
+
+def find_family(expression: str) -> tuple[ModelFamily, int] | None:
+    # Family and order of an expression, None if it is not a member of a family
+    expression = normalize_model(expression)
+    for family in model_families.values():
+        for order in range(family.min_order, family.max_order + 1):
+            if normalize_model(family.expression(order)) == expression:
+                return family, order
+    return None
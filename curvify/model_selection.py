@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+
+from .models_library import models_library
+from .parallel import default_workers, process_context
+from .solver import Solver
+
+# Fits several models of the library to the same data and ranks them by
+# information criterion. With n points, k free parameters and the residual
+# sum of squares RSS (gaussian errors):
+#   AIC = n ln(RSS / n) + 2 k
+#   BIC = n ln(RSS / n) + k ln(n)
+# Each fit has a time budget: the fit is cancelled when it is exceeded, and
+# a worker process that does not return within STALL_MARGIN more is
+# abandoned (and terminated at the end). The time is counted from the start
+# of the fit in the worker, the fits queued in the pool wait for a worker.
+
+# Below this number of points times models, the fits run in this process
+MIN_PARALLEL_SIZE = 500_000
+
+# Extra time given to a cancelled fit before its worker is abandoned
+STALL_MARGIN = 2.0  # Seconds
+
+
+def information_criteria(rss: float, n_points: int, n_params: int) -> tuple[float, float]:
+    with np.errstate(divide='ignore'):
+        log_likelihood_term = n_points * np.log(rss / n_points)
+    return (float(log_likelihood_term + 2 * n_params),
+            float(log_likelihood_term + n_params * np.log(n_points)))
+
+
+class FitDeadline:
+    # Cancels a fit (see Solver.fit) once the time budget is exceeded or
+    # when the comparison is cancelled
+    def __init__(self, time_budget: float | None, cancel_event: threading.Event | None = None):
+        self.end = time.perf_counter() + time_budget if time_budget is not None else np.inf
+        self.cancel_event = cancel_event
+
+    def is_set(self) -> bool:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return True
+        return time.perf_counter() > self.end
+
+
+def fit_model(name: str, expression: str, x: np.ndarray, y: np.ndarray,
+              time_budget: float | None,
+              cancel_event: threading.Event | None = None) -> dict:
+    result = {"name": name, "expression": expression, "ok": False}
+    solver = Solver()
+    # Candidate fits are not kept, they would push the user's fits out of
+    # the fit cache
+    solver.use_fit_cache = False
+    if not solver.update_model(expression):
+        return {**result, "status": "invalid model"}
+    start_time = time.perf_counter()
+    ok, results = solver.fit(x, y, update_params=False,
+                             cancel_event=FitDeadline(time_budget, cancel_event))
+    result["time"] = time.perf_counter() - start_time
+    if not ok and results.get("cancelled"):
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        return {**result, "status": "cancelled" if cancelled else "timeout"}
+    if not ok:
+        return {**result, "status": "failed"}
+    if not np.isfinite(results["RMSE"]):
+        return {**result, "status": "failed"}
+    n_params = sum(1 for param in solver.get_params() if not param.locked)
+    rss = float(results["RMSE"]) ** 2 * len(y)
+    aic, bic = information_criteria(rss, len(y), n_params)
+    # results: the full results of Solver.fit, to load the fitted model
+    return {**result, "ok": True, "status": "ok", "params": results["params"],
+            "R2": float(results["R2"]), "RMSE": float(results["RMSE"]),
+            "AIC": aic, "BIC": bic, "n_params": n_params, "results": results}
+
+
+# State of a worker process, set once by init_worker
+worker_state = {}
+
+
+def init_worker(x: np.ndarray, y: np.ndarray, started):
+    # started: queue receiving the index of each task as its fit starts
+    worker_state.update(x=x, y=y, started=started)
+
+
+def fit_model_task(index: int, name: str, expression: str, time_budget: float | None) -> dict:
+    worker_state["started"].put(index)
+    return fit_model(name, expression, worker_state["x"], worker_state["y"], time_budget)
+
+
+def rank(results: list[dict], criterion: str = "AIC") -> list[dict]:
+    # Successful fits first, best (lowest) criterion first
+    return sorted(results, key=lambda result: (
+        not result["ok"], result.get(criterion, np.inf)))
+
+
+def compare_models(x: np.ndarray, y: np.ndarray, models: list[str] | None = None,
+                   time_budget: float | None = 10.0, workers: int | None = None,
+                   criterion: str = "AIC",
+                   progress: Callable[[dict], None] | None = None,
+                   cancel_event: threading.Event | None = None) -> list[dict]:
+    # Fits the models (names of the library, all by default) and returns
+    # one result per model, ranked by criterion ("AIC" or "BIC").
+    # progress(result) is called as each fit ends.
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    names = list(models_library) if models is None else list(models)
+    unknown = [name for name in names if name not in models_library]
+    if unknown:
+        raise ValueError(f"Unknown models: {', '.join(unknown)}")
+    workers = min(workers or default_workers(), len(names))
+    if len(x) * len(names) < MIN_PARALLEL_SIZE:
+        workers = 1
+
+    results = []
+
+    def add_result(result: dict):
+        results.append(result)
+        if progress is not None:
+            progress(result)
+
+    def cancelled() -> bool:
+        return cancel_event is not None and cancel_event.is_set()
+
+    if workers <= 1:
+        for name in names:
+            if cancelled():
+                break
+            add_result(fit_model(name, models_library[name], x, y, time_budget, cancel_event))
+        return rank(results, criterion)
+
+    # A multiprocessing pool rather than a ProcessPoolExecutor: its workers
+    # can be terminated (Pool.terminate) when a fit stalls
+    context = process_context()
+    started_queue = context.Queue()
+    finished = queue.Queue()  # (index, result, error), from the callbacks of the pool
+    pool = context.Pool(workers, init_worker, (x, y, started_queue))
+    stalled = False
+    try:
+        for index, name in enumerate(names):
+            pool.apply_async(
+                fit_model_task, (index, name, models_library[name], time_budget),
+                callback=lambda result, index=index: finished.put((index, result, None)),
+                error_callback=lambda error, index=index: finished.put((index, None, error)))
+        pending = set(range(len(names)))
+        started: dict[int, float] = {}  # Time at which each fit was reported started
+        while pending and not cancelled():
+            try:
+                index, result, error = finished.get(timeout=0.1)
+                if index in pending:
+                    pending.discard(index)
+                    name = names[index]
+                    add_result(result if error is None else {
+                        "name": name, "expression": models_library[name],
+                        "ok": False, "status": f"failed: {error}"})
+            except queue.Empty:
+                pass
+            now = time.perf_counter()
+            while True:
+                try:
+                    started.setdefault(started_queue.get_nowait(), now)
+                except queue.Empty:
+                    break
+            for index in sorted(pending):
+                if time_budget is not None and index in started \
+                        and now - started[index] > time_budget + STALL_MARGIN:
+                    # The worker did not return after the fit was cancelled
+                    pending.discard(index)
+                    stalled = True
+                    name = names[index]
+                    add_result({"name": name, "expression": models_library[name],
+                                "ok": False, "status": "timeout",
+                                "time": now - started[index]})
+    finally:
+        # Terminated so that a stalled fit does not keep running in the background
+        if stalled or cancelled():
+            pool.terminate()
+        else:
+            pool.close()
+    return rank(results, criterion)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    x_data = np.linspace(0.1, 10, 5000)
+    y_data = 3 * np.exp(-0.5 * x_data) * np.sin(2 * x_data + 0.3) + 1 \
+        + rng.normal(0, 0.05, x_data.size)
+    print(f"{'Model':<26} {'AIC':>12} {'BIC':>12} {'RMSE':>10} {'Time (s)':>9}  Status")
+    for result in compare_models(x_data, y_data, time_budget=5.0):
+        print(f"{result['name']:<26} {result.get('AIC', np.nan):>12.1f} "
+              f"{result.get('BIC', np.nan):>12.1f} {result.get('RMSE', np.nan):>10.4g} "
+              f"{result.get('time', np.nan):>9.3f}  {result['status']}")
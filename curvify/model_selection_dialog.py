@@ -0,0 +1,183 @@
+import sys
+import threading
+import numpy as np
+from PySide6.QtWidgets import (
+    QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QProgressBar, QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem,
+    QDoubleSpinBox, QHeaderView, QAbstractItemView
+)
+from PySide6.QtCore import Qt, Signal, QThread
+
+from .model_selection import compare_models
+from .models_library import models_library
+
+COLUMNS = ["Model", "AIC", "BIC", "RMSE", "Time (s)", "Status"]
+
+
+class ModelSelectionWorker(QThread):
+    # Runs model_selection.compare_models outside of the Qt main thread
+    model_fitted = Signal(object)  # Result of one model, as each fit ends
+    comparison_finished = Signal()
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, models: list[str],
+                 time_budget: float, parent=None):
+        super().__init__(parent)
+        self.x = x
+        self.y = y
+        self.models = models
+        self.time_budget = time_budget
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        compare_models(self.x, self.y, self.models, time_budget=self.time_budget,
+                       progress=self.model_fitted.emit, cancel_event=self.cancel_event)
+        self.comparison_finished.emit()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class ModelSelectionDialog(QDialog):
+    # Fits the checked models of the library to the data and lists them by
+    # AIC as the results arrive. Clicking on a row emits its result (see
+    # model_selection.fit_model), to load the model with its fitted values.
+    model_selected = Signal(object)
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, parent=None):
+        super().__init__(parent)
+        self.x = x
+        self.y = y
+        self.worker: ModelSelectionWorker | None = None
+        self.results: list[dict] = []  # In the order of arrival
+        self.setWindowTitle("Model selection")
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        layout.addWidget(QLabel(f"{len(self.x)} points. Models to fit:"))
+        self.models_list = QListWidget()
+        for name in models_library:
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            self.models_list.addItem(item)
+        self.models_list.setMaximumHeight(150)
+        layout.addWidget(self.models_list)
+
+        budget_layout = QHBoxLayout()
+        budget_layout.addWidget(QLabel("Time budget per model (s):"))
+        self.time_budget_spin = QDoubleSpinBox()
+        self.time_budget_spin.setRange(0.1, 600)
+        self.time_budget_spin.setValue(10)
+        budget_layout.addWidget(self.time_budget_spin)
+        layout.addLayout(budget_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.compare_button = QPushButton("Compare")
+        self.compare_button.clicked.connect(self.compare)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel)
+        self.cancel_button.setEnabled(False)
+        buttons_layout.addWidget(self.compare_button)
+        buttons_layout.addWidget(self.cancel_button)
+        layout.addLayout(buttons_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        # Lower AIC (or BIC) is better, the columns can be sorted by clicking
+        # on their header
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSortIndicator(1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.cellClicked.connect(self.row_clicked)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+        self.resize(600, 600)
+
+    def checked_models(self) -> list[str]:
+        items = (self.models_list.item(i) for i in range(self.models_list.count()))
+        return [item.text() for item in items if item.checkState() == Qt.CheckState.Checked]
+
+    def compare(self):
+        models = self.checked_models()
+        if not models:
+            return
+        self.cancel()
+        self.table.setRowCount(0)
+        self.results = []
+        self.progress_bar.setRange(0, len(models))
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.worker = ModelSelectionWorker(
+            self.x, self.y, models, self.time_budget_spin.value(), self)
+        self.worker.model_fitted.connect(self.add_result)
+        self.worker.comparison_finished.connect(self.comparison_finished)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.compare_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.worker.start()
+
+    def cancel(self):
+        if self.worker is None:
+            return
+        self.worker.model_fitted.disconnect(self.add_result)
+        self.worker.comparison_finished.disconnect(self.comparison_finished)
+        self.worker.cancel()
+        self.worker = None
+        self.comparison_finished()
+
+    def comparison_finished(self):
+        self.worker = None
+        self.compare_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.setVisible(False)
+
+    def add_result(self, result: dict):
+        self.progress_bar.setValue(self.progress_bar.value() + 1)
+        # Sorting is suspended while the row is filled
+        self.table.setSortingEnabled(False)
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        name_item = QTableWidgetItem(result["name"])
+        name_item.setData(Qt.ItemDataRole.UserRole, len(self.results))
+        self.results.append(result)
+        self.table.setItem(row, 0, name_item)
+        for column, key in enumerate(["AIC", "BIC", "RMSE", "time"], start=1):
+            item = QTableWidgetItem()
+            # Failed fits last
+            value = result.get(key, np.inf if key != "time" else np.nan)
+            item.setData(Qt.ItemDataRole.DisplayRole, float(f"{value:.6g}"))
+            self.table.setItem(row, column, item)
+        self.table.setItem(row, 5, QTableWidgetItem(result["status"]))
+        self.table.setSortingEnabled(True)
+
+    def row_clicked(self, row: int, column: int):
+        result = self.results[self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)]
+        if result["ok"]:
+            self.model_selected.emit(result)
+
+    def done(self, result: int):
+        # Closing the dialog stops the fits that are not finished
+        self.cancel()
+        super().done(result)
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+
+    rng = np.random.default_rng(0)
+    x_data = np.linspace(0.1, 10, 1000)
+    y_data = 3 * np.exp(-0.5 * x_data) + 1 + rng.normal(0, 0.05, x_data.size)
+
+    dialog = ModelSelectionDialog(x_data, y_data)
+    dialog.model_selected.connect(lambda result: print(result["expression"], result["params"]))
+    dialog.exec()
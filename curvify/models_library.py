@@ -39,19 +39,15 @@ models_library: dict[str, str] = {
     "Fourier (general)": "fourier(x, f0, [a0, a1, b1, a2, b2, a3, b3, a4, b4, a5, b5])"
 }
 
+# Normalized form of a model expression, used to compare and cache models
+def normalize_model(model: str) -> str:
+    return model.replace(" ", "")
+
 # This function tries to recognize a known model. 
 # If it does, it returns the index of the model in the list.
 # If not, returns -1
 def find_model(model: str) -> int:
     for i, (_, known_model) in enumerate(models_library.items()):
-        if known_model.replace(" ", "") == model.replace(" ", ""):
+        if normalize_model(known_model) == normalize_model(model):
             return i
     return -1
-
-def fourier(x, f0, coefs: list[float]):
-    n = len(coefs) // 2
-    w0 = 2 * np.pi * f0
-    result = coefs[0]
-    for i in range(1, n + 1):
-        result += coefs[2 * i - 1] * np.cos(i * w0 * x) + coefs[2 * i] * np.sin(i * w0 * x)
-    return result
\ No newline at end of file
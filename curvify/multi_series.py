@@ -0,0 +1,209 @@
+import numpy as np
+
+from .compiled_model import CompiledModel
+
+# Fits one model to many series at once. The parameters of the N series are
+# stored in a (N, n_params) array and passed to the model as (N, 1) columns,
+# so that a single model evaluation broadcasts over all the series.
+
+# Maximum number of float64 in a batched jacobian (N * n_points * n_params)
+MAX_JACOBIAN_SIZE = 20_000_000
+
+
+def param_columns(params: np.ndarray) -> list[np.ndarray]:
+    return [params[:, i:i + 1] for i in range(params.shape[1])]
+
+
+def evaluate_batch(model: CompiledModel, x: np.ndarray, params: np.ndarray) -> np.ndarray:
+    # x of shape (n_points,) or (N, n_points), returns (N, n_points)
+    x = np.broadcast_to(x, (params.shape[0], np.shape(x)[-1]))
+    return model.function(x, *param_columns(params))
+
+
+def jacobian_batch(model: CompiledModel, x: np.ndarray, params: np.ndarray,
+                   free: list[int], y_model: np.ndarray | None = None) -> np.ndarray:
+    # Jacobian with respect to the free parameters, shape (N, n_free, n_points)
+    x = np.broadcast_to(x, (params.shape[0], np.shape(x)[-1]))
+    jacobian = np.empty((params.shape[0], len(free), x.shape[1]))
+    gradient = model.get_gradient()
+    if gradient is not None:
+        columns = gradient(x, *param_columns(params))
+        for j, i in enumerate(free):
+            jacobian[:, j] = columns[i]
+        return jacobian
+    # Forward finite differences
+    if y_model is None:
+        y_model = model.function(x, *param_columns(params))
+    for j, i in enumerate(free):
+        step = 1.49e-8 * np.maximum(np.abs(params[:, i]), 1.0)
+        shifted_params = params.copy()
+        shifted_params[:, i] += step
+        jacobian[:, j] = (model.function(x, *param_columns(shifted_params))
+                          - y_model) / step[:, None]
+    return jacobian
+
+
+def solve_batch(matrices: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    try:
+        return np.linalg.solve(matrices, vectors[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # At least one singular system
+        return (np.linalg.pinv(matrices) @ vectors[..., None])[..., 0]
+
+
+def covariance_diagonal(jacobian: np.ndarray) -> np.ndarray:
+    # diag((J^T J)^-1) for a (N, n_free, n_points) jacobian
+    normal_matrices = jacobian @ jacobian.transpose(0, 2, 1)
+    try:
+        inverse = np.linalg.inv(normal_matrices)
+    except np.linalg.LinAlgError:
+        inverse = np.linalg.pinv(normal_matrices)
+    return np.diagonal(inverse, axis1=1, axis2=2)
+
+
+def fit_linear_batch(model: CompiledModel, x: np.ndarray, y: np.ndarray,
+                     params: np.ndarray, free: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    # Closed form least squares for a model linear in its free parameters:
+    # y = offset(x) + sum_j params_j * phi_j(x). Returns the parameters and
+    # their squared standard errors divided by the residual variance.
+    params = params.copy()
+    params[:, free] = 0.0
+    shared_design = np.ndim(x) == 1 and np.all(params == params[:1])
+    if shared_design:
+        # Same design matrix for every series: a single lstsq call
+        offset = evaluate_batch(model, x, params[:1])[0]
+        design = jacobian_batch(model, x, params[:1], free)[0].T
+        coefs, _, _, _ = np.linalg.lstsq(design, (y - offset).T, rcond=None)
+        params[:, free] = coefs.T
+        variances = np.diagonal(np.linalg.pinv(design.T @ design))
+        return params, np.broadcast_to(variances, (len(y), len(free)))
+    offset = evaluate_batch(model, x, params)
+    design = jacobian_batch(model, x, params, free)
+    q, r = np.linalg.qr(design.transpose(0, 2, 1))
+    params[:, free] = solve_batch(r, (q.transpose(0, 2, 1) @ (y - offset)[..., None])[..., 0])
+    return params, covariance_diagonal(design)
+
+
+def fit_nonlinear_batch(model: CompiledModel, x: np.ndarray, y: np.ndarray,
+                        params: np.ndarray, free: list[int],
+                        lower_bounds: np.ndarray, upper_bounds: np.ndarray,
+                        max_iterations: int = 200, ftol: float = 1.49012e-08,
+                        xtol: float = 1.49012e-08) -> tuple[np.ndarray, np.ndarray, int]:
+    # Levenberg-Marquardt steps stacked over all the series. Only the series
+    # that have not converged yet are updated. Returns the parameters, a
+    # convergence mask and the number of iterations.
+    n_series = len(y)
+    params = params.copy()
+    damping = np.full(n_series, 1e-3)
+    converged = np.zeros(n_series, dtype=bool)
+    with np.errstate(all='ignore'):
+        y_model = evaluate_batch(model, x, params)
+        cost = np.sum((y - y_model) ** 2, axis=1)
+        active = np.flatnonzero(np.isfinite(cost))
+        iteration = 0
+        for iteration in range(1, max_iterations + 1):
+            if len(active) == 0:
+                break
+            x_active = x if np.ndim(x) == 1 else x[active]
+            residuals = y[active] - y_model[active]
+            jacobian = jacobian_batch(model, x_active, params[active], free, y_model[active])
+            normal_matrices = jacobian @ jacobian.transpose(0, 2, 1)
+            gradients = (jacobian @ residuals[..., None])[..., 0]
+            diagonal = np.diagonal(normal_matrices, axis1=1, axis2=2)
+            damped = normal_matrices + (damping[active, None] * diagonal)[..., None] \
+                * np.eye(len(free))
+            steps = solve_batch(damped, gradients)
+
+            new_params = params[active].copy()
+            new_params[:, free] += steps
+            new_params = np.clip(new_params, lower_bounds, upper_bounds)
+            new_y_model = evaluate_batch(model, x_active, new_params)
+            new_cost = np.sum((y[active] - new_y_model) ** 2, axis=1)
+
+            improved = np.isfinite(new_cost) & (new_cost <= cost[active])
+            accepted = active[improved]
+            step_size = np.abs(new_params - params[active])[:, free].max(axis=1)
+            param_size = np.abs(params[active])[:, free].max(axis=1)
+            done = improved & (
+                (cost[active] - new_cost <= ftol * cost[active])
+                | (step_size <= xtol * (param_size + xtol)))
+            # Too much damping: no further progress possible
+            done |= damping[active] > 1e12
+
+            params[accepted] = new_params[improved]
+            y_model[accepted] = new_y_model[improved]
+            cost[accepted] = new_cost[improved]
+            damping[accepted] /= 10
+            damping[active[~improved]] *= 10
+            converged[active[done]] = True
+            active = active[~done]
+    return params, converged, iteration
+
+
+def goodness_of_fit(y: np.ndarray, y_model: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ss_res = np.sum((y - y_model) ** 2, axis=1)
+    ss_tot = np.sum((y - np.mean(y, axis=1, keepdims=True)) ** 2, axis=1)
+    with np.errstate(all='ignore'):
+        r_squared = 1 - ss_res / ss_tot
+    rmse = np.sqrt(ss_res / y.shape[1])
+    return ss_res, r_squared, rmse
+
+
+def fit_batch(model: CompiledModel, x: np.ndarray, y: np.ndarray, params: np.ndarray,
+              locked: np.ndarray, lower_bounds: np.ndarray, upper_bounds: np.ndarray) -> dict:
+    # x of shape (n_points,) or (N, n_points), y of shape (N, n_points),
+    # params of shape (N, n_params) holding the starting values
+    n_series, n_points = y.shape
+    free = [i for i in range(params.shape[1]) if not locked[i]]
+    free_names = [model.param_names[i] for i in free]
+    finite = np.all(np.isfinite(y), axis=1) & np.all(np.isfinite(x), axis=-1)
+    success = finite.copy()
+    params = params.astype(float, copy=True)
+    iterations = 0
+
+    unbounded = np.all(np.isinf(lower_bounds[free])) and np.all(np.isinf(upper_bounds[free]))
+    if model.is_linear_in(free_names) and unbounded:
+        method = "linear"
+        x_finite = x if np.ndim(x) == 1 else x[finite]
+        params[finite], variances = fit_linear_batch(
+            model, x_finite, y[finite], params[finite], free)
+        iterations = 1
+    else:
+        method = "levenberg-marquardt"
+        # Processes the series by chunks to bound the size of the jacobian
+        chunk_size = max(1, MAX_JACOBIAN_SIZE // max(1, n_points * len(free)))
+        indices = np.flatnonzero(finite)
+        variances = np.empty((len(indices), len(free)))
+        for start in range(0, len(indices), chunk_size):
+            chunk = indices[start:start + chunk_size]
+            x_chunk = x if np.ndim(x) == 1 else x[chunk]
+            params[chunk], converged, chunk_iterations = fit_nonlinear_batch(
+                model, x_chunk, y[chunk], params[chunk], free, lower_bounds, upper_bounds)
+            success[chunk] &= converged
+            iterations = max(iterations, chunk_iterations)
+            with np.errstate(all='ignore'):
+                variances[start:start + chunk_size] = covariance_diagonal(
+                    jacobian_batch(model, x_chunk, params[chunk], free))
+
+    with np.errstate(all='ignore'):
+        y_model = evaluate_batch(model, x, params)
+        ss_res, r_squared, rmse = goodness_of_fit(y, y_model)
+        degrees_of_freedom = max(1, n_points - len(free))
+        errors = np.zeros_like(params)
+        errors[np.ix_(finite, free)] = np.sqrt(
+            variances * (ss_res[finite] / degrees_of_freedom)[:, None])
+    success &= np.all(np.isfinite(params), axis=1)
+    params[~finite] = np.nan
+    errors[~finite] = np.nan
+    r_squared[~finite] = np.nan
+    rmse[~finite] = np.nan
+
+    return {
+        "params": {name: params[:, i] for i, name in enumerate(model.param_names)},
+        "params_error": errors,
+        "R2": r_squared,
+        "RMSE": rmse,
+        "success": success,
+        "method": method,
+        "iterations": iterations,
+    }
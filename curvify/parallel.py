@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def process_context():
+    # Forking a process that runs Qt (event loop, threads) is unsafe: new
+    # interpreters are spawned instead when PySide6 is loaded
+    return multiprocessing.get_context("spawn" if "PySide6" in sys.modules else None)
+
+
+def process_pool(workers: int | None = None, initializer: Callable | None = None,
+                 initargs: tuple = ()) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers or default_workers(), mp_context=process_context(),
+        initializer=initializer, initargs=initargs)
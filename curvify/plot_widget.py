@@ -1,29 +1,64 @@
-from PySide6.QtCore import Slot
+import os
+
+os.environ['QT_API'] = 'pyside6'
+
+from PySide6.QtCore import Slot, QTimer
 from PySide6.QtWidgets import QWidget, QVBoxLayout
-from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
-import matplotlib
+from matplotlib.backends.backend_qtagg import NavigationToolbar2QT as NavigationToolbar
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.axes import Axes  # For typing
-from matplotlib.figure import Figure  # For typing
-import os
+from matplotlib.figure import Figure
 import numpy as np
 from .data_holder import DataHolder
+from .decimation import Decimator
+from .profiling import profiled, profiler
 
-os.environ['QT_API'] = 'pyside6'
-matplotlib.use('QtAgg')
+# Redraws requested within this delay are merged into one (~display rate)
+REDRAW_INTERVAL_MS = 16
+
+
+def stems(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Vertical segments from 0 to y, as a single NaN separated polyline
+    stems_x = np.empty(3 * len(x))
+    stems_y = np.empty(3 * len(x))
+    stems_x[0::3] = x
+    stems_x[1::3] = x
+    stems_x[2::3] = np.nan
+    stems_y[0::3] = 0
+    stems_y[1::3] = y
+    stems_y[2::3] = np.nan
+    return stems_x, stems_y
+
+
+def contains(axes: Axes, x: np.ndarray, y: np.ndarray) -> bool:
+    # True if all the finite points are inside the current view of the axes
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not np.any(finite):
+        return True
+    x_min, x_max = sorted(axes.get_xlim())
+    y_min, y_max = sorted(axes.get_ylim())
+    x, y = x[finite], y[finite]
+    return x.min() >= x_min and x.max() <= x_max \
+        and y.min() >= y_min and y.max() <= y_max
 
 
 class PlotWidget(QWidget):
+    # The artists are created once and updated with set_data. The model
+    # curve and the residuals are animated: when only the model changes and
+    # the view limits still fit, they are blitted over a cached background
+    # instead of redrawing the whole figure.
+    # Points are decimated to the current view and canvas width, and
+    # refined when the view changes (zoom, pan).
     def __init__(self, parent, data_holder: DataHolder):
         super().__init__(parent)
         self.data_holder = data_holder
+        self.decimator = Decimator(data_holder)
         # Create a Matplotlib figure with two subplots
-        self.figure: Figure
+        self.figure = Figure(figsize=(8, 6))
         self.ax: Axes
         self.ax_res: Axes
-        self.figure, (self.ax, self.ax_res) = plt.subplots(
-            2, 1, figsize=(8, 6), gridspec_kw={'height_ratios': [3, 1]})
+        self.ax, self.ax_res = self.figure.subplots(
+            2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
         self.canvas = FigureCanvas(self.figure)
         self.toolbar = NavigationToolbar(self.canvas, self)
         layout = QVBoxLayout()
@@ -31,39 +66,136 @@ class PlotWidget(QWidget):
         layout.addWidget(self.canvas)
         self.setLayout(layout)
 
-    @Slot()
-    def update_plot(self):
-        # Clear both axes
-        self.ax.clear()
-        self.ax_res.clear()
-
-        # Plot main data
-        self.ax.plot(*self.data_holder.get_selected_data(), '.', label="Data points")
-        self.ax.plot(*self.data_holder.get_not_selected_data(),
-                     '+', color='lightgray')
-        self.ax.plot(*self.data_holder.get_curve_data(),
-                     '--', color='red', label="Model")
+        # Main plot
+        self.selected_line, = self.ax.plot([], [], '.', label="Data points")
+        self.not_selected_line, = self.ax.plot([], [], '+', color='lightgray')
+        self.curve_line, = self.ax.plot(
+            [], [], '--', color='red', label="Model", animated=True)
+        # Confidence band of the model, see DataHolder.set_uncertainty
+        self.curve_band = self.ax.fill_between(
+            [], [], [], color='red', alpha=0.2, linewidth=0, animated=True)
         self.ax.set_ylabel('Y')
         self.ax.legend()
         self.ax.grid(True)
 
-        # Plot residuals
-        x_residuals, y_residuals = self.data_holder.get_residuals()
+        # Residuals
+        self.ax_res.axhline(y=0, color='black', linestyle='--', linewidth=0.7)
+        self.residual_baseline, = self.ax_res.plot([], [], color='black')
+        self.residual_stems, = self.ax_res.plot(
+            [], [], color='black', animated=True)
+        self.residual_markers, = self.ax_res.plot(
+            [], [], 'ko', markersize=3, animated=True)
+        self.ax_res.set_xlabel('X')
+        self.ax_res.set_ylabel('Residual')
+        self.ax_res.grid(True)
+
+        self.animated_artists = [
+            self.curve_band, self.curve_line, self.residual_stems, self.residual_markers]
+        self.background_ = None
+        self.canvas.mpl_connect('draw_event', self.on_draw_)
+
+        self.redrawing_ = False
+        self.ax.callbacks.connect('xlim_changed', self.on_xlim_changed_)
+
+        self.full_redraw_pending_ = False
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(REDRAW_INTERVAL_MS)
+        self.redraw_timer.timeout.connect(self.redraw_)
+
+    @Slot()
+    def update_plot(self):
+        # Data, selection and model changed
+        self.full_redraw_pending_ = True
+        self.schedule_redraw_()
+
+    @Slot()
+    def update_model_plot(self):
+        # Only the model changed (curve and residuals)
+        self.schedule_redraw_()
+
+    def reset_view(self):
+        # Back to automatic limits, e.g. when new data is loaded
+        self.ax.set_autoscale_on(True)
+        self.ax_res.set_autoscale_on(True)
+        self.update_plot()
+
+    def schedule_redraw_(self):
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
+    def on_xlim_changed_(self, axes: Axes):
+        # Zoom or pan with the navigation toolbar: refine the decimation
+        if not self.redrawing_:
+            self.update_plot()
+
+    def redraw_(self):
+        full_redraw = self.full_redraw_pending_
+        self.full_redraw_pending_ = False
+        self.redrawing_ = True
+        try:
+            if full_redraw:
+                self.update_data_artists_()
+            model_in_view = self.update_model_artists_()
+            if full_redraw or not model_in_view or self.background_ is None:
+                with profiler.span("plot.draw", points=len(self.data_holder)):
+                    for axes in (self.ax, self.ax_res):
+                        axes.relim()
+                        axes.autoscale_view()
+                    self.canvas.draw()
+            else:
+                with profiler.span("plot.blit"):
+                    self.blit_()
+        finally:
+            self.redrawing_ = False
+
+    def view_(self) -> tuple[tuple[float, float], int]:
+        # x range to display and number of pixel columns
+        if self.ax.get_autoscalex_on():
+            x_range = self.data_holder.x_range()
+        else:
+            x_range = tuple(sorted(self.ax.get_xlim()))
+        return x_range, max(1, int(self.ax.bbox.width))
+
+    @profiled("plot.data_artists")
+    def update_data_artists_(self):
+        x_range, width = self.view_()
+        self.selected_line.set_data(
+            *self.decimator.get_selected_data(x_range, width))
+        self.not_selected_line.set_data(
+            *self.decimator.get_not_selected_data(x_range, width))
+
+    @profiled("plot.model_artists")
+    def update_model_artists_(self) -> bool:
+        # Returns True if the new curve and residuals fit in the current view
+        curve_x, curve_y = self.data_holder.get_curve_data()
+        self.curve_line.set_data(curve_x, curve_y)
+        band_x, band_lower, band_upper = self.data_holder.get_curve_band()
+        self.curve_band.set_data(band_x, band_lower, band_upper)
+        x_residuals, y_residuals = self.decimator.get_residuals(*self.view_())
+        self.residual_stems.set_data(*stems(x_residuals, y_residuals))
+        self.residual_markers.set_data(x_residuals, y_residuals)
         if len(x_residuals) > 0:
-            self.ax_res.axhline(y=0, color='black',
-                                linestyle='--', linewidth=0.7)
-            stemline = self.ax_res.stem(
-                x_residuals, y_residuals,
-                linefmt='black',
-                markerfmt='ko',
-                basefmt='black',
-            )
-            stemline.markerline.set_markersize(3)
-            self.ax_res.set_xlabel('X')
-            self.ax_res.set_ylabel('Residual')
-            self.ax_res.set_xlim(self.ax.get_xlim())
-            self.ax_res.grid(True)
-            # self.ax_res.legend()
-
-        # Redraw the canvas
-        self.canvas.draw()
+            self.residual_baseline.set_data(
+                [x_residuals.min(), x_residuals.max()], [0, 0])
+        else:
+            self.residual_baseline.set_data([], [])
+        return contains(self.ax, curve_x, curve_y) \
+            and contains(self.ax, band_x, band_lower) \
+            and contains(self.ax, band_x, band_upper) \
+            and contains(self.ax_res, x_residuals, y_residuals)
+
+    def on_draw_(self, event):
+        # Called after each full draw: caches the background without the
+        # animated artists, then draws them on top
+        self.background_ = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated_()
+
+    def draw_animated_(self):
+        for artist in self.animated_artists:
+            artist.axes.draw_artist(artist)
+
+    def blit_(self):
+        self.canvas.restore_region(self.background_)
+        self.draw_animated_()
+        self.canvas.blit(self.figure.bbox)
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable
+
+# Lightweight instrumentation of the hot paths: timed spans (count, total,
+# max and last duration), counters (points evaluated, optimizer iterations...)
+# and a timeline that can be exported for chrome://tracing or Perfetto.
+# Disabled by default: a disabled span or counter costs one attribute check.
+# Only this process is recorded, not the worker processes of the pools.
+
+# Maximum number of events kept in the timeline (the oldest are dropped)
+MAX_EVENTS = 1_000_000
+
+
+@dataclass
+class SpanStats:
+    count: int = 0
+    total: float = 0.0  # Seconds
+    max: float = 0.0
+    last: float = 0.0
+
+
+class Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def set(self, **args):
+        # Values shown with the span in the timeline (e.g. results)
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start, self.args)
+
+
+class NullSpan:
+    def set(self, **args):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.lock_ = threading.Lock()
+        self.stats: dict[str, SpanStats] = {}
+        self.counters: dict[str, float] = {}
+        self.events: deque[dict] = deque(maxlen=MAX_EVENTS)
+        self.origin_ = time.perf_counter()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock_:
+            self.stats.clear()
+            self.counters.clear()
+            self.events.clear()
+            self.origin_ = time.perf_counter()
+
+    def span(self, name: str, **args) -> Span | NullSpan:
+        # with profiler.span("fit") as span: ...; span.set(nfev=12)
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def record(self, name: str, start: float, duration: float, args: dict | None = None):
+        with self.lock_:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+            stats.last = duration
+            self.events.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": (start - self.origin_) * 1e6, "dur": duration * 1e6,
+                "args": args or {},
+            })
+
+    def add(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self.lock_:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            self.events.append({
+                "name": name, "ph": "C", "pid": os.getpid(), "tid": threading.get_ident(),
+                "ts": (time.perf_counter() - self.origin_) * 1e6, "args": {"value": total},
+            })
+
+    def snapshot(self) -> tuple[dict[str, SpanStats], dict[str, float]]:
+        with self.lock_:
+            stats = {name: SpanStats(**vars(stats)) for name, stats in self.stats.items()}
+            return stats, dict(self.counters)
+
+    def summary(self, names: list[str] | None = None) -> str:
+        # One line per span: count, mean and last duration
+        stats, counters = self.snapshot()
+        lines = []
+        for name in names if names is not None else sorted(stats):
+            if name not in stats:
+                continue
+            span = stats[name]
+            lines.append(f"{name}: {span.count} × {1e3 * span.total / span.count:.3g} ms "
+                         f"(last {1e3 * span.last:.3g} ms)")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name}: {value:.4g}")
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path: str):
+        # Trace Event Format, opened by chrome://tracing and ui.perfetto.dev
+        with self.lock_:
+            events = list(self.events)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+profiler = Profiler()
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    # Decorator timing each call of a function as a span
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with Span(profiler, name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,9 +1,28 @@
-from scipy.optimize import curve_fit
 import numpy as np
-import re
+import threading
+import time
 from dataclasses import dataclass
+from typing import Callable
 
-from .models_library import fourier
+from .backends import available_backends
+from .compiled_model import CompiledModel, compile_model
+from .fit_cache import fit_cache, fit_key, start_key
+from .global_fit import multi_start_fit
+from .initial_guess import find_estimator, guess_initial_values
+from .models_library import normalize_model
+from .multi_series import fit_batch
+from .profiling import profiled, profiler
+from .coarse_to_fine import COARSE_MIN_POINTS, refine, stage_sizes, subsample_stages
+from .uncertainty import estimate_uncertainty
+from .variable_projection import covariance_errors, find_linear_params, fit_separable
+
+
+# Minimum time between two progress reports during a fit (seconds)
+PROGRESS_INTERVAL = 0.1
+
+
+class FitCancelled(Exception):
+    pass
 
 
 @dataclass
@@ -14,34 +33,91 @@ class Param:
     min_value: float = -float('inf')
     max_value: float = float('inf')
     error: float | None = None
+    # True once the value was set by hand or by a fit, otherwise the
+    # initial guess of the model (if any) is used as the starting point
+    initialized: bool = False
 
 class Solver:
     def __init__(self):
         self.is_valid_ = False
+        self.compiled_model_: CompiledModel | None = None
+        self.evaluation_mode_: str | None = None
+        self.params: list[Param] = []
+        # Set to False to let curve_fit estimate the jacobian by finite differences
+        self.use_analytic_jacobian = True
+        # "auto": linear least squares or variable projection when the model
+        # is linear in some parameters, curve_fit otherwise.
+        # "curve_fit": always the general iterative solver.
+        self.fit_method = "auto"
+        # Estimates the starting point of the parameters that are not
+        # initialized, for the models of the library
+        self.use_initial_guess = True
+        self.estimator_: Callable | None = None
+        # Returns the stored results when the same fit was already done (see
+        # fit_cache.py), restores the last fitted values of a model when
+        # coming back to it
+        self.use_fit_cache = True
+        # Last fitted values of each model fitted by this solver:
+        # {normalized expression: {name: value}}
+        self.last_params_: dict[str, dict[str, float]] = {}
+        # Evaluation of the model on large arrays, see backends.py and
+        # set_backend: "numpy", "numexpr" or "threads"
+        self.backend = "numpy"
+        # Fits stratified subsamples of large data first, then refines on the
+        # full data until the steps are below coarse_to_fine_tolerance times
+        # the standard errors (see coarse_to_fine.py)
+        self.coarse_to_fine = False
+        self.coarse_to_fine_tolerance = 0.01
 
-    def update_model(self, function_str: str):
-        # TODO checks : nb of params, execution ?
-        # Find params
-        param_names: list[str] = re.findall(r'\b([a-wyz]\d*)\b', function_str)
-        param_names = list(dict.fromkeys(param_names)) # Makes the params unique
-
-        function_str = "lambda x, " + \
-            ", ".join(param_names) + ": " + function_str
-        
-        try:
-            model = eval(function_str)
-        except:
+    @profiled("update_model")
+    def update_model(self, function_str: str) -> bool:
+        # Returns True if the model changed
+        compiled_model = compile_model(function_str)
+        if compiled_model is None:
+            changed = self.is_valid_
             self.is_valid_ = False
-            return
-        self.model = model
+            return changed
+        if compiled_model is self.compiled_model_ and self.is_valid_:
+            return False
+        self.compiled_model_ = compiled_model
+        self.model = compiled_model.get_function(self.backend)
+        self.evaluation_mode_ = compiled_model.evaluation_mode
+        self.estimator_ = find_estimator(function_str)
         self.is_valid_ = True
 
-        #TODO keep existing parameters ?
-        self.params = [Param(name, 1.0) for name in param_names]
+        # Keep the values and locks of the parameters that still exist. The
+        # new ones, and those still at their default, start from the last
+        # fit of the model by this solver if any.
+        old_params = {param.name: param for param in self.params}
+        last_fit = {}
+        if self.use_fit_cache:
+            last_fit = self.last_params_.get(normalize_model(function_str), {})
+        self.params = []
+        for name in compiled_model.param_names:
+            param = old_params.get(name, Param(name, 1.0))
+            param.error = None
+            if name in last_fit and not param.locked and not param.initialized:
+                param.value, param.initialized = last_fit[name], True
+            self.params.append(param)
+        return True
+
+    def set_backend(self, backend: str) -> bool:
+        if backend not in available_backends():
+            print(f"Unavailable evaluation backend: {backend}")
+            return False
+        self.backend = backend
+        if self.compiled_model_ is not None:
+            self.model = self.compiled_model_.get_function(backend)
+        return True
 
     def is_valid(self) -> bool:
         return self.is_valid_
 
+    def get_evaluation_mode(self) -> str | None:
+        # "array" when the model is evaluated on whole arrays,
+        # "scalar" when it falls back to a point by point evaluation
+        return self.evaluation_mode_
+
     def get_params(self) -> list[Param]:
         return self.params
 
@@ -50,40 +126,345 @@ class Solver:
             param.name: param.value for param in self.params
         }
 
-    def evaluate(self, x: float) -> float:
-        params_dict = self.get_params_dict()
-        # return self.model(x, **params_dict)
-        vectorized_model = np.vectorize(lambda xi: self.model(xi, **params_dict))
-        return vectorized_model(x)
+    @profiled("evaluate")
+    def evaluate(self, x: float, params: dict[str, float] | None = None) -> float:
+        if profiler.enabled:
+            profiler.add("evaluate.points", np.size(x))
+        if params is None:
+            params = self.get_params_dict()
+        return self.model(x, **params)
 
-    def fit(self, x_data: np.ndarray, y_data: np.ndarray) -> tuple[bool, dict]:
+    def apply_fit_results(self, results: dict):
+        # Copies the fitted values into the parameters
+        for i, param in enumerate(self.params):
+            param.value = float(results["params"][param.name])
+            param.error = float(results["params_error"][i])
+            param.initialized = True
+        expression = normalize_model(self.compiled_model_.expression)
+        self.last_params_[expression] = dict(results["params"])
+
+    def fit(self, x_data: np.ndarray, y_data: np.ndarray,
+            update_params: bool = True,
+            progress: Callable[[int, float, np.ndarray], None] | None = None,
+            cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+        # progress(model calls, cost, current parameters) is called at most
+        # every PROGRESS_INTERVAL seconds. Setting cancel_event aborts the fit.
+        # With update_params=False the solver is left untouched, the fitted
+        # values are only returned in the results (see apply_fit_results).
         # TODO: check the nb of points vs the number of parmaeters
-        p0 = [param.value for param in self.params]
-        upper_bounds = [p.value+1e-15 if p.locked else p.max_value for p in self.params]
-        lower_bounds = [p.value if p.locked else p.min_value for p in self.params]
+        cache_key = fit_key(self, x_data, y_data) if self.use_fit_cache else None
+        if cache_key is not None:
+            results = fit_cache.get(cache_key)
+            if results is not None:
+                results["cached"] = True
+                if update_params:
+                    self.apply_fit_results(results)
+                return True, results
+        # The data may be stored in float32 (DataHolder), the fit is always
+        # computed in float64
+        x_data = np.asarray(x_data, dtype=float)
+        y_data = np.asarray(y_data, dtype=float)
+        model = self.model
+        params_list = list(self.params)
+        upper_bounds = [p.value+1e-15 if p.locked else p.max_value for p in params_list]
+        lower_bounds = [p.value if p.locked else p.min_value for p in params_list]
+        jacobian = None
+        if self.use_analytic_jacobian:
+            jacobian = self.compiled_model_.get_jacobian()
+
+        free = [i for i, param in enumerate(params_list) if not param.locked]
+        linear = []
+        if self.fit_method == "auto" and jacobian is not None:
+            linear = find_linear_params(
+                self.compiled_model_, free, lower_bounds, upper_bounds)
+        nonlinear = [i for i in free if i not in linear]
+
+        # Coarse-to-fine: subsamples of the data are fitted first, the
+        # starting point is estimated on the smallest one
+        stages = []
+        if self.coarse_to_fine and nonlinear and len(y_data) >= COARSE_MIN_POINTS:
+            stages = subsample_stages(x_data, y_data, stage_sizes(len(y_data)))
+        x_start, y_start = (x_data[stages[0]], y_data[stages[0]]) if stages else (x_data, y_data)
+        initial_guess, guess_time = self.guess_initial_values_(x_start, y_start, params_list)
+        seed = fit_cache.seed(cache_key) if cache_key is not None else None
+        initial_guess, seeded = self.seed_start_(x_start, y_start, params_list, initial_guess, seed)
+        p0 = [initial_guess.get(param.name, param.value) for param in params_list]
+
+        model_calls = 0
+        last_report = time.perf_counter()
+
+        def solve(x, y, p0):
+            # Fit of (x, y) from p0: parameters, errors, iterations, method
+            def counted_model(x, *args):
+                nonlocal model_calls, last_report
+                if cancel_event is not None and cancel_event.is_set():
+                    raise FitCancelled()
+                model_calls += 1
+                y_model = model(x, *args)
+                if progress is not None and time.perf_counter() - last_report > PROGRESS_INTERVAL:
+                    last_report = time.perf_counter()
+                    progress(model_calls, float(np.sum((y - y_model) ** 2)), np.array(args))
+                return y_model
+
+            def check(params, residuals):
+                nonlocal model_calls, last_report
+                if cancel_event is not None and cancel_event.is_set():
+                    raise FitCancelled()
+                model_calls += 1
+                if progress is not None and time.perf_counter() - last_report > PROGRESS_INTERVAL:
+                    last_report = time.perf_counter()
+                    progress(model_calls, float(np.sum(residuals ** 2)), params.copy())
+
+            if linear:
+                method = "linear" if not nonlinear else "variable projection"
+                params, nfev, _ = fit_separable(
+                    self.compiled_model_, x, y, p0, linear, nonlinear,
+                    lower_bounds, upper_bounds, check)
+                error = covariance_errors(self.compiled_model_, x, y, params, free)
+            else:
+                from scipy.optimize import curve_fit  # Imported on first use (startup time)
+                method = "curve_fit"
+                params, covariance, infodict, _, _ = curve_fit(
+                    counted_model, x, y, p0=p0,
+                    bounds=(lower_bounds, upper_bounds),
+                    jac=jacobian, full_output=True)
+                error = np.sqrt(np.diag(covariance))
+                nfev = infodict["nfev"]
+            return np.asarray(params, dtype=float), error, nfev, method
+
+        def check_cost(params, cost):
+            nonlocal model_calls, last_report
+            if cancel_event is not None and cancel_event.is_set():
+                raise FitCancelled()
+            model_calls += 1
+            if progress is not None and time.perf_counter() - last_report > PROGRESS_INTERVAL:
+                last_report = time.perf_counter()
+                progress(model_calls, cost, params)
+
+        start_time = time.perf_counter()
+        stage_results = []
         try:
-            params, covariance = curve_fit(self.model, x_data, y_data, p0=p0, bounds=(lower_bounds, upper_bounds))
-            error = np.sqrt(np.diag(covariance))
-        except (RuntimeError, TypeError) as e:
+            refined = None
+            previous_errors = None
+            for indices in stages:
+                stage_start = time.perf_counter()
+                try:
+                    params, error, nfev, method = solve(x_data[indices], y_data[indices], p0)
+                except (RuntimeError, ValueError, np.linalg.LinAlgError):
+                    break  # Continued from the last stage that worked
+                stage_results.append({"points": len(indices), "method": method,
+                                      "nfev": int(nfev),
+                                      "time": time.perf_counter() - stage_start})
+                # A larger subsample no longer moving the parameters beyond
+                # the standard errors of the previous one: on to the full data
+                converged = previous_errors is not None and np.all(
+                    np.abs(params - p0) <= previous_errors)
+                p0, previous_errors = list(params), error
+                if converged:
+                    break
+            stage_start = time.perf_counter()
+            if stage_results and jacobian is not None:
+                refined = refine(
+                    model, jacobian, x_data, y_data, p0, free, lower_bounds, upper_bounds,
+                    self.coarse_to_fine_tolerance, check_cost)
+            if refined is not None:
+                params, error, nfev = refined
+                final_method = "gauss-newton"
+            else:
+                # Direct fit, or full fit from the last subsample when the
+                # refinement is not possible (fallback)
+                params, error, nfev, method = solve(x_data, y_data, p0)
+                final_method = method
+            if stage_results:
+                stage_results.append({"points": len(y_data), "method": final_method,
+                                      "nfev": int(nfev), "fallback": refined is None,
+                                      "time": time.perf_counter() - stage_start})
+                method = f"coarse-to-fine ({stage_results[0]["method"]})"
+                nfev = sum(stage["nfev"] for stage in stage_results)
+        except FitCancelled:
+            return False, {"cancelled": True}
+        except (RuntimeError, TypeError, ValueError, np.linalg.LinAlgError) as e:
             print(f"Error during fitting: {e}")
             return False, {}
-        for i, param in enumerate(self.params):
-            param.value = float(params[i])
-            param.error = float(error[i])
+        fit_time = time.perf_counter() - start_time
+        if profiler.enabled:
+            profiler.record("fit", start_time, fit_time, {
+                "method": method, "nfev": int(nfev), "model_calls": model_calls,
+                "points": len(y_data), "stages": len(stage_results)})
+            profiler.add("fit.nfev", int(nfev))
+            profiler.add("fit.model_calls", model_calls)
 
         results = {}
-        results["params"] = self.get_params_dict()
+        results["params"] = {
+            param.name: float(params[i]) for i, param in enumerate(params_list)
+        }
         results["params_error"] = error
-        y_pred = self.evaluate(x_data)  
+        if update_params:
+            self.apply_fit_results(results)
+        y_pred = model(x_data, *params)
         ss_res = np.sum((y_data - y_pred) ** 2)
         ss_tot = np.sum((y_data - np.mean(y_data)) ** 2)
         r_squared = 1 - (ss_res / ss_tot)
         results["R2"] = r_squared
         rmse = np.sqrt(np.mean((y_data - y_pred) ** 2))
         results["RMSE"] = rmse
-        
+        results["evaluation_mode"] = self.evaluation_mode_
+        # "linear", "variable projection" or "curve_fit", or "coarse-to-fine
+        # (<method of the subsamples>)", see results["stages"]
+        results["method"] = method
+        results["jacobian"] = "analytic" if jacobian is not None else "finite differences"
+        results["nfev"] = int(nfev)  # Iterations of the optimizer, of all the stages
+        results["model_calls"] = model_calls  # Including finite differences
+        results["fit_time"] = fit_time
+        results["initial_guess"] = initial_guess  # Estimated starting values
+        results["initial_guess_time"] = guess_time
+        results["seeded"] = seeded  # Started from a cached fit of the same data
+        # Coarse-to-fine: the fits of the subsamples, then the last stage on
+        # the full data, Gauss-Newton steps ("gauss-newton") or a full fit
+        # when they are not possible ("fallback"). Empty for a direct fit.
+        results["stages"] = stage_results
+        results["cached"] = False
+        if cache_key is not None:
+            fit_cache.put([cache_key, start_key(cache_key, self, results["params"])], results)
+
         return True, results
 
+    def fit_global(self, x_data: np.ndarray, y_data: np.ndarray,
+                   update_params: bool = True, n_starts: int = 32,
+                   sampling: str = "sobol", workers: int | None = None,
+                   progress: Callable[[int, float, np.ndarray], None] | None = None,
+                   cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+        # Multi-start version of fit: local fits from n_starts points sampled
+        # ("sobol" or "lhs") within the bounds of the free parameters, run in
+        # a process pool. The best fit is returned, results["global"] holds
+        # the other minima. progress(fits done, best cost, best parameters).
+        x_data, y_data = np.asarray(x_data, dtype=float), np.asarray(y_data, dtype=float)
+        ok, results = multi_start_fit(
+            self, x_data, y_data, n_starts=n_starts, sampling=sampling,
+            workers=workers, progress=progress, cancel_event=cancel_event)
+        if ok and update_params:
+            self.apply_fit_results(results)
+        return ok, results
+
+    def estimate_uncertainty(self, x_data: np.ndarray, y_data: np.ndarray,
+                             method: str = "residuals", n_samples: int = 500,
+                             confidence: float = 0.95, workers: int | None = None,
+                             progress: Callable[[int, int], None] | None = None,
+                             cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+        # Bootstrap ("residuals", "pairs") or Monte-Carlo ("monte_carlo")
+        # uncertainty around the current parameters, which should be fitted
+        # to the same data. results["intervals"] holds the confidence interval
+        # of each parameter, results["samples"] the refitted parameters.
+        # progress(samples done, n_samples).
+        x_data, y_data = np.asarray(x_data, dtype=float), np.asarray(y_data, dtype=float)
+        return estimate_uncertainty(
+            self, x_data, y_data, method=method, n_samples=n_samples,
+            confidence=confidence, workers=workers, progress=progress,
+            cancel_event=cancel_event)
+
+    @profiled("initial_guess")
+    def guess_initial_values_(self, x_data: np.ndarray, y_data: np.ndarray,
+                              params_list: list[Param]) -> tuple[dict[str, float], float]:
+        # Estimated values for the free parameters that are not initialized
+        names = {param.name for param in params_list
+                 if not param.initialized and not param.locked}
+        if not self.use_initial_guess or self.estimator_ is None or not names:
+            return {}, 0.0
+        start_time = time.perf_counter()
+        values = guess_initial_values(self.estimator_, x_data, y_data)
+        initial_guess = {
+            param.name: min(max(values[param.name], param.min_value), param.max_value)
+            for param in params_list if param.name in names and param.name in values}
+        return initial_guess, time.perf_counter() - start_time
+
+    def seed_start_(self, x_data: np.ndarray, y_data: np.ndarray, params_list: list[Param],
+                    initial_guess: dict[str, float],
+                    seed: dict[str, float] | None) -> tuple[dict[str, float], bool]:
+        # Starts the free parameters from a previous solution on the same
+        # data (seed) when it fits better than the starting values. Returns
+        # the starting values that differ from the parameters, and whether
+        # the seed is used.
+        if not seed:
+            return initial_guess, False
+        start = {param.name: initial_guess.get(param.name, param.value) for param in params_list}
+        seeded = {param.name: seed[param.name] if not param.locked else param.value
+                  for param in params_list}
+        with np.errstate(all='ignore'):
+            costs = [np.sum((y_data - self.model(x_data, **values)) ** 2)
+                     for values in (seeded, start)]
+        if not costs[0] < costs[1]:
+            return initial_guess, False
+        return seeded, True
+
+    @profiled("fit_batch")
+    def fit_batch(self, x_data: np.ndarray, y_data: np.ndarray,
+                  p0: np.ndarray | None = None) -> tuple[bool, dict]:
+        # Fits the model to every row of y_data (N series sharing the x_data
+        # grid, or one x row per series) in a single batched solve.
+        # Each series starts from the parameters of the solver, with the
+        # initial guess of the model on that series for the parameters that
+        # are not initialized (like fit), unless p0 (n_params,) or
+        # (N, n_params) is given. The parameters are not modified.
+        y_data = np.atleast_2d(np.asarray(y_data, dtype=float))
+        x_data = np.asarray(x_data, dtype=float)
+        n_series = len(y_data)
+        if p0 is None:
+            p0 = np.array([[param.value for param in self.params]] * n_series)
+            for i in range(n_series):
+                x_series = x_data if x_data.ndim == 1 else x_data[i]
+                initial_guess, _ = self.guess_initial_values_(x_series, y_data[i], self.params)
+                for j, param in enumerate(self.params):
+                    p0[i, j] = initial_guess.get(param.name, param.value)
+        params = np.broadcast_to(
+            np.asarray(p0, dtype=float), (n_series, len(self.params))).copy()
+        locked = np.array([param.locked for param in self.params], dtype=bool)
+        if np.all(locked):
+            print("Error during fitting: no free parameter")
+            return False, {}
+
+        start_time = time.perf_counter()
+        if self.evaluation_mode_ == "array":
+            lower_bounds = np.array([param.min_value for param in self.params])
+            upper_bounds = np.array([param.max_value for param in self.params])
+            results = fit_batch(self.compiled_model_, x_data, y_data, params,
+                                locked, lower_bounds, upper_bounds)
+        else:
+            results = self.fit_batch_loop_(x_data, y_data, params)
+        results["fit_time"] = time.perf_counter() - start_time
+        return bool(np.any(results["success"])), results
+
+    def fit_batch_loop_(self, x_data: np.ndarray, y_data: np.ndarray,
+                        params: np.ndarray) -> dict:
+        # Scalar-only models can't be batched: one curve_fit per series
+        saved_params = [(param.value, param.error) for param in self.params]
+        n_series = len(y_data)
+        errors = np.full(params.shape, np.nan)
+        r_squared = np.full(n_series, np.nan)
+        rmse = np.full(n_series, np.nan)
+        success = np.zeros(n_series, dtype=bool)
+        for i in range(n_series):
+            for param, value in zip(self.params, params[i]):
+                param.value = float(value)
+            x_series = x_data if x_data.ndim == 1 else x_data[i]
+            ok, results = self.fit(x_series, y_data[i])
+            if ok:
+                params[i] = [param.value for param in self.params]
+                errors[i] = results["params_error"]
+                r_squared[i], rmse[i], success[i] = results["R2"], results["RMSE"], True
+            else:
+                params[i] = np.nan
+        for param, (value, error) in zip(self.params, saved_params):
+            param.value, param.error = value, error
+        return {
+            "params": {param.name: params[:, i] for i, param in enumerate(self.params)},
+            "params_error": errors,
+            "R2": r_squared,
+            "RMSE": rmse,
+            "success": success,
+            "method": "loop",
+            "iterations": n_series,
+        }
+
 
 if __name__ == "__main__":
     solver = Solver()
@@ -98,3 +479,17 @@ if __name__ == "__main__":
     print(solver.get_params_dict())
     y_hat_data = solver.evaluate(x_data)
     print(y_hat_data - y_data)
+
+    # Analytic vs finite differences jacobian
+    solver.update_model("a * np.exp(-c * x) * np.sin(b * x + d) + e")
+    x_data = np.linspace(0, 10, 1_000_000)
+    y_data = 3 * np.exp(-0.3 * x_data) * np.sin(2 * x_data + 0.5) + 1
+    for fit_method, use_analytic_jacobian in (
+            ("curve_fit", True), ("curve_fit", False), ("auto", True)):
+        for param, value in zip(solver.get_params(), [2.5, 2.1, 0.2, 0.4, 0.8]):
+            param.value = value
+        solver.fit_method = fit_method
+        solver.use_analytic_jacobian = use_analytic_jacobian
+        ok, results = solver.fit(x_data, y_data)
+        print(f"{results['method']}, {results['jacobian']}: {results['fit_time']:.3f} s, "
+              f"{results['nfev']} iterations, {results['model_calls']} model calls")
@@ -0,0 +1,45 @@
+import threading
+import time
+
+import numpy as np
+from PySide6.QtCore import QThread, Signal
+
+from .streaming import StreamParser, open_source
+
+# Minimum time between two batches of points sent to the interface (seconds)
+BATCH_INTERVAL = 0.05
+
+
+class StreamWorker(QThread):
+    # Reads a live source (see streaming.open_source) and sends the parsed
+    # points by batches, so that the interface is updated at most every
+    # BATCH_INTERVAL whatever the rate of the source
+    points = Signal(object, object)  # x, y
+    failed = Signal(str)
+
+    def __init__(self, source: str, parent=None, delimiter: str | None = None):
+        super().__init__(parent)
+        self.source = source
+        self.parser = StreamParser(delimiter)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        x_parts, y_parts = [], []
+        last_emit = time.perf_counter()
+        try:
+            for chunk in open_source(self.source, self.stop_event):
+                x, y = self.parser.feed(chunk)
+                if len(x):
+                    x_parts.append(x)
+                    y_parts.append(y)
+                if x_parts and time.perf_counter() - last_emit >= BATCH_INTERVAL:
+                    self.points.emit(np.concatenate(x_parts), np.concatenate(y_parts))
+                    x_parts, y_parts = [], []
+                    last_emit = time.perf_counter()
+        except (OSError, ValueError) as e:
+            self.failed.emit(f"Stream {self.source}: {e}")
+        if x_parts:
+            self.points.emit(np.concatenate(x_parts), np.concatenate(y_parts))
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,156 @@
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from typing import Iterator
+
+import numpy as np
+
+# Live data sources. A source yields chunks of bytes as they arrive, or an
+# empty chunk every POLL_INTERVAL when idle, and returns when stop_event is
+# set.
+# StreamParser splits the chunks into lines of "x<delimiter>y" values.
+#   -                   standard input (a pipe)
+#   udp://host:port     datagrams received on a local port
+#   tcp://host:port     connections accepted on a local port
+#   any other path      a file, followed as it grows (like tail -f)
+
+POLL_INTERVAL = 0.05  # Seconds
+READ_SIZE = 1 << 16
+
+
+def tail_file(path: str, stop_event: threading.Event,
+              from_start: bool = True) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        if not from_start:
+            file.seek(0, os.SEEK_END)
+        while not stop_event.is_set():
+            chunk = file.read(READ_SIZE)
+            if chunk:
+                yield chunk
+            else:
+                if os.path.getsize(path) < file.tell():
+                    file.seek(0)  # Truncated (e.g. rewritten by the producer)
+                time.sleep(POLL_INTERVAL)
+                yield b""
+
+
+def read_pipe(file, stop_event: threading.Event) -> Iterator[bytes]:
+    # select does not support pipes on Windows: blocking reads there
+    fd = file.fileno()
+    can_poll = sys.platform != "win32"
+    while not stop_event.is_set():
+        if can_poll:
+            ready, _, _ = select.select([fd], [], [], POLL_INTERVAL)
+            if not ready:
+                yield b""
+                continue
+        chunk = os.read(fd, READ_SIZE)
+        if not chunk:
+            return  # End of the stream
+        yield chunk
+
+
+def receive_udp(host: str, port: int, stop_event: threading.Event) -> Iterator[bytes]:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, port))
+        sock.settimeout(POLL_INTERVAL)
+        while not stop_event.is_set():
+            try:
+                datagram = sock.recv(READ_SIZE)
+            except socket.timeout:
+                yield b""
+                continue
+            # A datagram holds whole lines
+            yield datagram if datagram.endswith(b"\n") else datagram + b"\n"
+
+
+def receive_tcp(host: str, port: int, stop_event: threading.Event) -> Iterator[bytes]:
+    # One producer at a time, the next connection is accepted when it closes
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        server.settimeout(POLL_INTERVAL)
+        while not stop_event.is_set():
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                yield b""
+                continue
+            with connection:
+                connection.settimeout(POLL_INTERVAL)
+                while not stop_event.is_set():
+                    try:
+                        chunk = connection.recv(READ_SIZE)
+                    except socket.timeout:
+                        yield b""
+                        continue
+                    if not chunk:
+                        break
+                    yield chunk
+            yield b"\n"  # Ends a last line without newline
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise ValueError(f"Invalid address {address}, expected host:port")
+
+
+def open_source(spec: str, stop_event: threading.Event) -> Iterator[bytes]:
+    if spec == "-":
+        return read_pipe(sys.stdin, stop_event)
+    if spec.startswith("udp://"):
+        return receive_udp(*parse_address(spec[len("udp://"):]), stop_event)
+    if spec.startswith("tcp://"):
+        return receive_tcp(*parse_address(spec[len("tcp://"):]), stop_event)
+    if not os.path.exists(spec):
+        raise ValueError(f"No such file: {spec}")
+    return tail_file(spec, stop_event)
+
+
+class StreamParser:
+    # Splits chunks of bytes into lines and parses the x and y columns.
+    # A line with a single value is y, x is then the index of the point.
+    # Lines that can't be parsed (header, comments) are counted and skipped.
+    def __init__(self, delimiter: str | None = None, x_column: int = 0, y_column: int = 1):
+        self.delimiter = delimiter  # None: comma, semicolon, tab or spaces
+        self.x_column = x_column
+        self.y_column = y_column
+        self.pending_ = b""  # Incomplete last line
+        self.n_points = 0
+        self.n_skipped = 0
+
+    def split_(self, line: str) -> list[str]:
+        if self.delimiter is not None:
+            return line.split(self.delimiter)
+        for delimiter in (",", ";", "\t"):
+            if delimiter in line:
+                return line.split(delimiter)
+        return line.split()
+
+    def feed(self, chunk: bytes) -> tuple[np.ndarray, np.ndarray]:
+        lines = (self.pending_ + chunk).split(b"\n")
+        self.pending_ = lines.pop()
+        x, y = [], []
+        for line in lines:
+            if not line.strip():
+                continue
+            fields = self.split_(line.decode(errors="replace").strip())
+            try:
+                if len(fields) == 1 and fields[0]:
+                    values = (float(self.n_points), float(fields[0]))
+                else:
+                    values = (float(fields[self.x_column]), float(fields[self.y_column]))
+            except (ValueError, IndexError):
+                self.n_skipped += 1
+                continue
+            x.append(values[0])
+            y.append(values[1])
+            self.n_points += 1
+        return np.array(x, dtype=float), np.array(y, dtype=float)
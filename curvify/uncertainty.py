@@ -0,0 +1,166 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable
+
+import numpy as np
+
+from .global_fit import make_solver
+from .multi_series import evaluate_batch
+from .parallel import default_workers, process_pool
+
+# Parameter uncertainty by refitting resampled data sets, warm started from
+# the current (fitted) parameters:
+# - "residuals": bootstrap of the residuals, y* = y_model + resampled residuals
+# - "pairs": bootstrap of the (x, y) points
+# - "monte_carlo": y* = y_model + gaussian noise of the residual RMSE
+# The refits of a chunk of samples are done in one batched solve
+# (Solver.fit_batch), the chunks are spread over a process pool.
+
+METHODS = ("residuals", "pairs", "monte_carlo")
+
+# Maximum number of values of a chunk of resampled data sets
+MAX_CHUNK_VALUES = 4_000_000
+
+# Below this number of points times samples, the refits run in this process
+MIN_PARALLEL_SIZE = 2_000_000
+
+
+def resample(method: str, x: np.ndarray, y_model: np.ndarray, residuals: np.ndarray,
+             n_samples: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    # Returns x, shared (n_points,) or (n_samples, n_points), and y (n_samples, n_points)
+    n_points = len(x)
+    if method == "residuals":
+        indices = rng.integers(0, n_points, (n_samples, n_points))
+        return x, y_model + residuals[indices]
+    if method == "pairs":
+        indices = rng.integers(0, n_points, (n_samples, n_points))
+        return x[indices], (y_model + residuals)[indices]
+    if method == "monte_carlo":
+        scale = np.sqrt(np.mean(residuals ** 2))
+        return x, y_model + rng.normal(0.0, scale, (n_samples, n_points))
+    raise ValueError(f"Unknown method {method}, use one of {', '.join(METHODS)}")
+
+
+def refit_chunk(solver, x: np.ndarray, y: np.ndarray, method: str,
+                n_samples: int, seed: np.random.SeedSequence) -> tuple[np.ndarray, np.ndarray]:
+    # Refits n_samples resampled data sets, returns the parameters
+    # (n_samples, n_params) and the success mask
+    p0 = [param.value for param in solver.params]
+    y_model = solver.evaluate(x)
+    residuals = y - y_model
+    x_samples, y_samples = resample(
+        method, x, y_model, residuals, n_samples, np.random.default_rng(seed))
+    ok, results = solver.fit_batch(x_samples, y_samples, p0=p0)
+    params = np.column_stack([results["params"][param.name] for param in solver.params]) \
+        if results else np.full((n_samples, len(p0)), np.nan)
+    success = results["success"] if results else np.zeros(n_samples, dtype=bool)
+    return params, success
+
+
+# State of a worker process, set once by init_worker
+worker_state = {}
+
+
+def init_worker(expression: str, params: list, x: np.ndarray, y: np.ndarray):
+    worker_state.update(solver=make_solver(expression, params, "auto"), x=x, y=y)
+
+
+def refit_task(method: str, n_samples: int,
+               seed: np.random.SeedSequence) -> tuple[np.ndarray, np.ndarray]:
+    return refit_chunk(worker_state["solver"], worker_state["x"], worker_state["y"],
+                       method, n_samples, seed)
+
+
+def summarize(names: list[str], samples: np.ndarray, confidence: float) -> dict:
+    tail = 100 * (1 - confidence) / 2
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    with np.errstate(all='ignore'):
+        # Locked parameters have no spread, their correlations are NaN
+        correlation = np.corrcoef(samples, rowvar=False) if len(samples) > 1 \
+            else np.full((len(names), len(names)), np.nan)
+    return {
+        "intervals": {name: (float(low[i]), float(high[i])) for i, name in enumerate(names)},
+        "std": dict(zip(names, np.std(samples, axis=0, ddof=1).tolist()))
+        if len(samples) > 1 else {},
+        "correlation": np.atleast_2d(correlation),
+    }
+
+
+def estimate_uncertainty(solver, x: np.ndarray, y: np.ndarray, method: str = "residuals",
+                         n_samples: int = 500, confidence: float = 0.95,
+                         workers: int | None = None, seed: int | None = 0,
+                         progress: Callable[[int, int], None] | None = None,
+                         cancel_event: threading.Event | None = None) -> tuple[bool, dict]:
+    # Resamples around the current parameters of the solver, which should be
+    # the result of a fit on (x, y). progress(samples done, n_samples).
+    # Results: "samples" (n_ok, n_params), "intervals" {name: (low, high)},
+    # "std", "correlation" (n_params, n_params), "n_failed", "time".
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, use one of {', '.join(METHODS)}")
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    names = [param.name for param in solver.get_params()]
+    chunk_size = int(max(1, min(64, MAX_CHUNK_VALUES // max(1, len(x)))))
+    chunks = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = workers or default_workers()
+    if len(x) * n_samples < MIN_PARALLEL_SIZE:
+        workers = 1
+
+    all_params, all_success = [], []
+    n_done = 0
+    start_time = time.perf_counter()
+
+    def add_chunk(params: np.ndarray, success: np.ndarray):
+        nonlocal n_done
+        all_params.append(params)
+        all_success.append(success)
+        n_done += len(params)
+        if progress is not None:
+            progress(n_done, n_samples)
+
+    solver_args = (solver.compiled_model_.expression, solver.get_params())
+    if workers == 1:
+        local_solver = make_solver(*solver_args, "auto")
+        for size, chunk_seed in zip(chunks, seeds):
+            if cancel_event is not None and cancel_event.is_set():
+                return False, {"cancelled": True}
+            add_chunk(*refit_chunk(local_solver, x, y, method, size, chunk_seed))
+    else:
+        executor = process_pool(min(workers, len(chunks)), init_worker, (*solver_args, x, y))
+        try:
+            pending = {executor.submit(refit_task, method, size, chunk_seed)
+                       for size, chunk_seed in zip(chunks, seeds)}
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    return False, {"cancelled": True}
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    add_chunk(*future.result())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    params = np.concatenate(all_params)
+    success = np.concatenate(all_success) & np.all(np.isfinite(params), axis=1)
+    samples = params[success]
+    if len(samples) < 2:
+        return False, {}
+    results = summarize(names, samples, confidence)
+    results.update(
+        method=method, confidence=confidence, samples=samples,
+        n_failed=int(np.count_nonzero(~success)), time=time.perf_counter() - start_time)
+    return True, results
+
+
+def confidence_band(solver, x: np.ndarray, samples: np.ndarray,
+                    confidence: float = 0.95) -> tuple[np.ndarray, np.ndarray]:
+    # Pointwise interval of the model curve over the parameter samples
+    if solver.get_evaluation_mode() == "array":
+        curves = evaluate_batch(solver.compiled_model_, x, samples)
+    else:
+        names = [param.name for param in solver.get_params()]
+        curves = np.array([solver.evaluate(x, dict(zip(names, params))) for params in samples])
+    tail = 100 * (1 - confidence) / 2
+    low, high = np.nanpercentile(curves, [tail, 100 - tail], axis=0)
+    return low, high
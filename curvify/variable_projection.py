@@ -0,0 +1,142 @@
+import numpy as np
+from typing import Callable
+
+from .compiled_model import CompiledModel
+
+# Separable least squares. A model that is linear in some of its parameters
+# can be written y = offset(x, nl) + sum_j lin_j * phi_j(x, nl). For given
+# nonlinear parameters nl, the best linear parameters are the solution of a
+# linear least squares problem, so only nl is searched by the optimizer
+# (variable projection). Models without nonlinear parameters are solved in
+# a single lstsq step.
+# scipy is imported on first use, it takes most of the import time of the
+# solver.
+
+# Residual of the points where the model can't be evaluated
+OUT_OF_DOMAIN_RESIDUAL = 1e100
+
+
+def find_linear_params(model: CompiledModel, free: list[int],
+                       lower_bounds: list[float], upper_bounds: list[float]) -> list[int]:
+    # Greedy selection of free, unbounded parameters in which the model is
+    # jointly linear (e.g. a and b but not c, d for (a * x + b) / (c * x + d))
+    if model.get_gradient() is None:
+        return []
+    linear = []
+    for i in free:
+        if np.isfinite(lower_bounds[i]) or np.isfinite(upper_bounds[i]):
+            continue
+        names = [model.param_names[j] for j in linear + [i]]
+        if model.is_linear_in(names):
+            linear.append(i)
+    return linear
+
+
+class SeparableProblem:
+    # Residuals and Kaufman's approximation of the jacobian of the
+    # projected problem, as functions of the nonlinear parameters only
+    def __init__(self, model: CompiledModel, x: np.ndarray, y: np.ndarray,
+                 params: np.ndarray, linear: list[int], nonlinear: list[int],
+                 check: Callable[[np.ndarray, np.ndarray], None] | None = None):
+        self.model = model
+        # Basis functions and derivatives with respect to the nonlinear parameters
+        self.design = model.get_partial_jacobian(linear)
+        self.derivatives = model.get_partial_jacobian(nonlinear)
+        self.x = x
+        self.y = y
+        self.params = np.array(params, dtype=float)  # Current full parameters
+        self.linear = linear
+        self.nonlinear = nonlinear
+        self.check = check  # check(params, residuals), may raise to abort
+        self.model_calls = 0
+        self.q_ = None  # Orthonormal basis of the basis functions
+
+    def solve_linear(self, nonlinear_params: np.ndarray) -> np.ndarray:
+        # Updates the linear parameters for the given nonlinear ones and
+        # returns the residuals
+        self.params[self.nonlinear] = nonlinear_params
+        # The basis functions do not depend on the linear parameters
+        design = self.design(self.x, *self.params)
+        offset_params = self.params.copy()
+        offset_params[self.linear] = 0.0
+        offset = np.broadcast_to(self.model.function(self.x, *offset_params), self.y.shape)
+        self.model_calls += 1
+        from scipy.linalg import qr, solve_triangular
+        if not (np.all(np.isfinite(design)) and np.all(np.isfinite(offset))):
+            # Outside of the domain of the model (e.g. log of a negative
+            # number): large residuals make the optimizer reject the step
+            self.q_ = None
+            return np.full(self.y.shape, OUT_OF_DOMAIN_RESIDUAL)
+        self.q_, r = qr(design, mode='economic', check_finite=False)
+        target = self.q_.T @ (self.y - offset)
+        diagonal = np.abs(np.diagonal(r))
+        if diagonal.min() > 1e-12 * diagonal.max():
+            coefs = solve_triangular(r, target)
+        else:
+            # Degenerate basis (e.g. a frequency at 0), minimum norm solution
+            coefs, _, _, _ = np.linalg.lstsq(r, target, rcond=None)
+        self.params[self.linear] = coefs
+        residuals = self.y - offset - self.q_ @ target
+        if self.check is not None:
+            self.check(self.params, residuals)
+        return residuals
+
+    def residuals(self, nonlinear_params: np.ndarray) -> np.ndarray:
+        return self.solve_linear(nonlinear_params)
+
+    def projected_jacobian(self, nonlinear_params: np.ndarray) -> np.ndarray:
+        # -(I - P) df/dnl, P the projection on the basis functions
+        if not np.array_equal(self.params[self.nonlinear], nonlinear_params):
+            self.solve_linear(nonlinear_params)
+        derivatives = self.derivatives(self.x, *self.params)
+        return self.q_ @ (self.q_.T @ derivatives) - derivatives
+
+
+def fit_separable(model: CompiledModel, x: np.ndarray, y: np.ndarray,
+                  params: np.ndarray, linear: list[int], nonlinear: list[int],
+                  lower_bounds: np.ndarray, upper_bounds: np.ndarray,
+                  check: Callable[[np.ndarray, np.ndarray], None] | None = None
+                  ) -> tuple[np.ndarray, int, int]:
+    # Returns the fitted parameters, the number of iterations and the number
+    # of model calls. Raises RuntimeError if the optimizer fails.
+    from scipy.optimize import least_squares
+    problem = SeparableProblem(model, x, y, params, linear, nonlinear, check)
+    if not nonlinear:
+        problem.solve_linear(np.zeros(0))
+        return problem.params, 1, problem.model_calls
+    lower_bounds = np.asarray(lower_bounds, dtype=float)[nonlinear]
+    upper_bounds = np.asarray(upper_bounds, dtype=float)[nonlinear]
+    bounded = np.any(np.isfinite(lower_bounds)) or np.any(np.isfinite(upper_bounds))
+    start = np.clip(problem.params[nonlinear], lower_bounds, upper_bounds)
+    problem.solve_linear(start)
+    if problem.q_ is None:
+        # The jacobian is evaluated at the start, it can't be projected there
+        raise ValueError("The model can't be evaluated at the initial values")
+    result = least_squares(
+        problem.residuals, start, jac=problem.projected_jacobian,
+        bounds=(lower_bounds, upper_bounds), method="trf" if bounded else "lm")
+    if not result.success:
+        raise RuntimeError(f"Optimal parameters not found: {result.message}")
+    problem.solve_linear(result.x)
+    return problem.params, int(result.nfev), problem.model_calls
+
+
+def covariance_errors(model: CompiledModel, x: np.ndarray, y: np.ndarray,
+                      params: np.ndarray, free: list[int]) -> np.ndarray:
+    # Standard errors from the jacobian at the solution, scaled by the
+    # residual variance like curve_fit. Locked parameters get 0.
+    jacobian = model.get_jacobian()(x, *params)[:, free]
+    residuals = y - model.function(x, *params)
+    errors = np.zeros(len(params))
+    degrees_of_freedom = len(y) - len(free)
+    if degrees_of_freedom <= 0:
+        errors[free] = np.inf
+        return errors
+    # Same pseudo inverse as curve_fit
+    _, s, vt = np.linalg.svd(jacobian, full_matrices=False)
+    threshold = np.finfo(float).eps * max(jacobian.shape) * s[0]
+    s, vt = s[s > threshold], vt[:s[s > threshold].size]
+    covariance = (vt.T / s ** 2) @ vt
+    covariance *= np.sum(residuals ** 2) / degrees_of_freedom
+    errors[free] = np.sqrt(np.diag(covariance))
+    return errors
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name="curvify",
     version="0.1.0",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     package_data={
         "curvify": ["icons/*.png"],
     },
@@ -17,6 +17,11 @@ setup(
         "pyside6_essentials",
         "QtRangeSlider",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "hdf5": ["h5py"],
+        "numexpr": ["numexpr"],
+    },
     entry_points={
         "console_scripts": [
             "curvify=curvify.cli:main",
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pytest
+
+from curvify.batch import JsonlWriter, batch_fit, fit_file, fit_series
+from curvify.models_library import models_library
+from curvify.solver import Solver
+
+
+def make_sine_series(n_series: int = 5, n_points: int = 500):
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 10, n_points)
+    y = np.array([
+        (1 + 0.5 * i) * np.sin((1.2 + 0.3 * i) * x + 0.2 * i) + 0.5
+        + rng.normal(0, 0.05, n_points)
+        for i in range(n_series)])
+    return x, y
+
+
+def sine_solver() -> Solver:
+    solver = Solver()
+    solver.use_fit_cache = False
+    solver.update_model(models_library["Sine"])
+    return solver
+
+
+def test_fit_batch_starts_each_series_from_its_initial_guess():
+    x, y = make_sine_series()
+    ok, results = sine_solver().fit_batch(x, y)
+    assert ok
+    for i in range(len(y)):
+        single_ok, single = sine_solver().fit(x, y[i], update_params=False)
+        assert single_ok and results["success"][i]
+        assert results["R2"][i] > 0.99
+        np.testing.assert_allclose(
+            [results["params"][name][i] for name in "abcd"],
+            [single["params"][name] for name in "abcd"], rtol=1e-4, atol=1e-6)
+
+
+def test_batched_columns_match_per_series_fits(tmp_path):
+    x, y = make_sine_series()
+    path = tmp_path / "series.csv"
+    names = [f"s{i}" for i in range(len(y))]
+    np.savetxt(path, np.column_stack([x, *y]), delimiter=",",
+               header=",".join(["x"] + names), comments="")
+
+    records = fit_file(str(path), models_library["Sine"], "x", None, ",", {})
+    assert [record["series"] for record in records] == names
+    for record, y_series in zip(records, y):
+        single = fit_series(sine_solver(), {}, x, y_series)
+        assert record["ok"] and single["ok"]
+        assert record["R2"] > 0.99
+        np.testing.assert_allclose(
+            [record[name] for name in "abcd"], [single[name] for name in "abcd"],
+            rtol=1e-4, atol=1e-6)
+
+
+def test_jsonl_writer_writes_failed_values_as_null(tmp_path):
+    path = tmp_path / "results.jsonl"
+    writer = JsonlWriter(str(path), ["ok", "R2", "a"])
+    writer.write({"ok": False, "R2": float("nan"), "a": float("inf")})
+    writer.close()
+    assert json.loads(path.read_text()) == {"ok": False, "R2": None, "a": None}
+
+
+def test_invalid_number_of_workers_is_reported(tmp_path):
+    path = tmp_path / "series.csv"
+    np.savetxt(path, [[0, 1], [1, 3]], delimiter=",", header="x,y", comments="")
+    with pytest.raises(ValueError, match="workers"):
+        batch_fit("a * x + b", [str(path)], "x", output=str(tmp_path / "out.jsonl"),
+                  workers=-1)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from curvify.models_library import models_library
+from curvify.solver import Solver
+
+
+def fit(expression: str, x: np.ndarray, y: np.ndarray, coarse_to_fine: bool) -> dict:
+    solver = Solver()
+    solver.use_fit_cache = False
+    solver.coarse_to_fine = coarse_to_fine
+    solver.update_model(expression)
+    ok, results = solver.fit(x, y, update_params=False)
+    assert ok
+    return results
+
+
+def test_coarse_to_fine_matches_the_direct_fit():
+    rng = np.random.default_rng(0)
+    x = np.linspace(0.1, 10, 300_000)
+    y = 3 * np.exp(-0.2 * x) * np.sin(2 * x + 0.5) + 1 + rng.normal(0, 0.05, x.size)
+    expression = models_library["Damped Sine"]
+    direct = fit(expression, x, y, coarse_to_fine=False)
+    staged = fit(expression, x, y, coarse_to_fine=True)
+
+    assert staged["method"] == f"coarse-to-fine ({direct["method"]})"
+    final = staged["stages"][-1]
+    assert final["points"] == len(x) and final["method"] == "gauss-newton"
+    assert not final["fallback"]
+    assert staged["nfev"] == sum(stage["nfev"] for stage in staged["stages"])
+    errors = np.asarray(direct["params_error"])
+    difference = [staged["params"][name] - direct["params"][name] for name in direct["params"]]
+    assert np.all(np.abs(difference) <= 0.01 * errors)
+    np.testing.assert_allclose(staged["params_error"], errors, rtol=1e-3)
+
+
+def test_coarse_to_fine_falls_back_to_a_full_fit():
+    # Not identifiable: (a * x + b) / (c * x + d) is unchanged by scaling
+    rng = np.random.default_rng(0)
+    x = np.linspace(0.1, 10, 300_000)
+    y = (2 * x + 1) / (0.5 * x + 3) + rng.normal(0, 0.05, x.size)
+    staged = fit(models_library["Rational"], x, y, coarse_to_fine=True)
+    assert staged["stages"][-1]["fallback"]
+    assert staged["stages"][-1]["points"] == len(x)
+    assert staged["R2"] > 0.9
@@ -0,0 +1,87 @@
+import numpy as np
+
+from curvify.fit_cache import fit_cache
+from curvify.solver import Solver
+
+
+def test_update_model_keeps_values_set_by_hand():
+    fit_cache.clear()
+    x = np.linspace(0, 10, 200)
+    solver = Solver()
+    solver.update_model("a * x + b")
+    assert solver.fit(x, 2 * x + 1)[0]
+
+    solver.update_model("a * x**2 + b")
+    solver.params[0].value, solver.params[0].initialized = 5.0, True
+    solver.update_model("a * x + b")
+    # a was set by hand, b still holds the last fitted value
+    assert solver.get_params_dict()["a"] == 5.0
+    assert np.isclose(solver.get_params_dict()["b"], 1.0)
+
+
+def test_update_model_restores_the_last_fit_of_new_parameters():
+    fit_cache.clear()
+    x = np.linspace(0, 10, 200)
+    solver = Solver()
+    solver.update_model("a * x + b")
+    assert solver.fit(x, 2 * x + 1)[0]
+    solver.update_model("a * x**2 + c")
+    solver.update_model("a * x + b")
+    assert np.isclose(solver.get_params_dict()["b"], 1.0)
+
+
+def test_fresh_solver_is_not_affected_by_earlier_fits():
+    fit_cache.clear()
+    x = np.linspace(0, 10, 200)
+    solver = Solver()
+    solver.update_model("a * x + b")
+    assert solver.fit(x, 2 * x + 1)[0]
+
+    other = Solver()
+    other.update_model("a * x + b")
+    assert other.get_params_dict() == {"a": 1.0, "b": 1.0}
+    assert not any(param.initialized for param in other.get_params())
+
+
+def test_array_hash_follows_in_place_changes_of_a_writable_base():
+    from curvify.fit_cache import ArrayHashes
+    hashes = ArrayHashes()
+    data = np.arange(100.0)
+    view = data.view()
+    view.flags.writeable = False
+    digest = hashes.get(view[10:50])
+    data[20] = -1.0  # Same memory, new content
+    assert hashes.get(view[10:50]) != digest
+
+
+def test_data_holder_copy_is_hashed_once():
+    from curvify.data_holder import DataHolder
+    from curvify.fit_cache import ArrayHashes
+    holder = DataHolder(Solver())
+    holder.set_data(np.arange(100.0)[::-1], np.arange(100.0))
+    hashes = ArrayHashes()
+    x, _ = holder.get_selected_data()
+    digest = hashes.get(x)
+    assert list(hashes.hashes_.values())[0][1] == digest
+
+
+def test_large_writable_data_is_not_hashed():
+    from curvify.fit_cache import HASH_MAX_BYTES, fit_key
+    fit_cache.clear()
+    x = np.linspace(0, 10, HASH_MAX_BYTES // 8 + 1)
+    solver = Solver()
+    solver.update_model("a * x + b")
+    assert fit_key(solver, x, 2 * x + 1) is None
+    assert solver.fit(x, 2 * x + 1)[0]
+    assert len(fit_cache) == 0
+
+
+def test_refit_from_the_solution_is_a_cache_hit():
+    fit_cache.clear()
+    x = np.linspace(0, 10, 200)
+    solver = Solver()
+    solver.update_model("a * x + b")
+    assert not solver.fit(x, 2 * x + 1)[1]["cached"]
+    assert solver.fit(x, 2 * x + 1)[1]["cached"]
+    solver.coarse_to_fine_tolerance = 0.1
+    assert not solver.fit(x, 2 * x + 1)[1]["cached"]
@@ -0,0 +1,30 @@
+import numpy as np
+
+from curvify.models_library import models_library
+from curvify.solver import Solver
+
+
+def test_logarithmic_model_fits_from_its_initial_guess():
+    # Variable projection steps outside of the domain of the log on the way
+    rng = np.random.default_rng(0)
+    x = np.linspace(0.1, 10, 10_000)
+    y = 2 * np.log(1.5 * x + 1) + 0.5 + rng.normal(0, 0.05, x.size)
+    solver = Solver()
+    solver.use_fit_cache = False
+    solver.update_model(models_library["Logarithmic"])
+    ok, results = solver.fit(x, y, update_params=False)
+    assert ok
+    assert results["method"] == "variable projection"
+    assert results["R2"] > 0.99
+
+
+def test_start_outside_of_the_domain_fails_without_raising():
+    x = np.linspace(-10, 10, 50)
+    y = np.log(x + 11)
+    solver = Solver()
+    solver.use_fit_cache = False
+    solver.use_initial_guess = False
+    solver.update_model("a * np.log(b * x + c) + d")
+    ok, results = solver.fit(x, y, update_params=False)
+    assert not ok
+    assert results == {}